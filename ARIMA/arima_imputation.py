@@ -5,12 +5,17 @@ from statsmodels.tsa.stattools import adfuller
 from statsmodels.graphics.tsaplots import plot_acf, plot_pacf
 from statsmodels.tsa.seasonal import seasonal_decompose
 import warnings
+from utils.timestamps import ensure_datetime
+from utils.metrics import record_arima_fit
+from utils.logging import get_task_logger
 warnings.filterwarnings('ignore')
 
 
-def arima_imputation_single_column(series, max_p=5, max_d=2, max_q=5, ic='aic'):
+def arima_imputation_single_column(series, max_p=5, max_d=2, max_q=5, ic='aic', order=None):
     """
     对单个时间序列进行ARIMA插补
+
+    order为已知的(p, d, q)时直接使用，不再搜索参数
     """
     # 平稳性检验
     def check_stationarity(ts):
@@ -51,6 +56,7 @@ def arima_imputation_single_column(series, max_p=5, max_d=2, max_q=5, ic='aic'):
             for q in range(max_q + 1):
                 try:
                     model = ARIMA(ts_clean, order=(p, d, q))
+                    record_arima_fit()
                     fitted_model = model.fit()
                     
                     if ic == 'aic':
@@ -106,6 +112,7 @@ def arima_imputation_single_column(series, max_p=5, max_d=2, max_q=5, ic='aic'):
                 
                 if len(before_data) >= 10:
                     model = ARIMA(before_data, order=params)
+                    record_arima_fit()
                     fitted_model = model.fit()
                     
                     n_missing = end_idx - start_idx + 1
@@ -115,6 +122,7 @@ def arima_imputation_single_column(series, max_p=5, max_d=2, max_q=5, ic='aic'):
                 elif len(after_data) >= 10:
                     reversed_data = after_data.iloc[::-1]
                     model = ARIMA(reversed_data, order=params)
+                    record_arima_fit()
                     fitted_model = model.fit()
                     
                     n_missing = end_idx - start_idx + 1
@@ -149,7 +157,10 @@ def arima_imputation_single_column(series, max_p=5, max_d=2, max_q=5, ic='aic'):
         data_mean = 50
     
     try:
-        optimal_params = auto_arima_params(series, max_p, max_d, max_q, ic)
+        if order is not None:
+            optimal_params = tuple(order)
+        else:
+            optimal_params = auto_arima_params(series, max_p, max_d, max_q, ic)
         filled_series = interpolate_missing_segments(series, optimal_params)
         
         # 检查插补结果的合理性
@@ -158,7 +169,7 @@ def arima_imputation_single_column(series, max_p=5, max_d=2, max_q=5, ic='aic'):
         unreasonable_mask = (filled_values < reasonable_lower) | (filled_values > reasonable_upper)
         
         if unreasonable_mask.any():
-            print(f"  警告: 检测到{unreasonable_mask.sum()}个不合理的插补值 (范围: {reasonable_lower:.2f} - {reasonable_upper:.2f})，使用线性插值替代")
+            get_task_logger().warning(f"  检测到{unreasonable_mask.sum()}个不合理的插补值 (范围: {reasonable_lower:.2f} - {reasonable_upper:.2f})，使用线性插值替代")
             # 对不合理的值使用更保守的插值方法
             conservative_filled = series.interpolate(method='linear')
             # 如果线性插值也有缺失，进一步处理
@@ -172,6 +183,7 @@ def arima_imputation_single_column(series, max_p=5, max_d=2, max_q=5, ic='aic'):
         
         # 模型验证
         final_model = ARIMA(filled_series, order=optimal_params)
+        record_arima_fit()
         fitted_final = final_model.fit()
         
         residuals = fitted_final.resid
@@ -192,7 +204,7 @@ def arima_imputation_single_column(series, max_p=5, max_d=2, max_q=5, ic='aic'):
         return filled_series, result_info
         
     except Exception as e:
-        print(f"  ARIMA插补失败: {str(e)}, 使用线性插值")
+        get_task_logger().warning(f"  ARIMA插补失败: {str(e)}, 使用线性插值")
         filled_series = series.interpolate(method='linear')
         # 如果线性插值仍有缺失值，用前后值填充
         if filled_series.isna().any():
@@ -210,7 +222,8 @@ def arima_imputation_single_column(series, max_p=5, max_d=2, max_q=5, ic='aic'):
 
 
 def arima_imputation_multicolumn(df, time_col='record_time', value_cols=None, 
-                                max_p=3, max_d=1, max_q=3, ic='aic', time_freq='30min', keep_original=False):
+                                max_p=3, max_d=1, max_q=3, ic='aic', time_freq='30min', keep_original=False,
+                                orders=None):
     """
     使用ARIMA模型对多列时间序列数据进行缺失值插补
     
@@ -224,73 +237,79 @@ def arima_imputation_multicolumn(df, time_col='record_time', value_cols=None,
     ic: str - 信息准则 ('aic', 'bic', 'hqic') (默认: 'aic')
     time_freq: str - 时间间隔 (默认: '30min')
     keep_original: bool - 是否保留原始列并创建新的填充列 (默认: False)
+    orders: dict - 各列已知的ARIMA阶数，有记录的列不再搜索参数，插补后写入本次使用的阶数 (默认: None)
     
     返回:
     pandas.DataFrame - 插补后的完整数据
     dict - 各列的模型信息和统计结果
     """
     
-    # 数据预处理
-    df_work = df.copy()
-    
     # 检查时间列是否存在
-    if time_col not in df_work.columns:
-        raise ValueError(f"时间列 '{time_col}' 不存在于数据中。可用的列: {list(df_work.columns)}")
-    
-    df_work[time_col] = pd.to_datetime(df_work[time_col])
-    df_work = df_work.sort_values(time_col).reset_index(drop=True)
+    if time_col not in df.columns:
+        raise ValueError(f"时间列 '{time_col}' 不存在于数据中。可用的列: {list(df.columns)}")
     
+    logger = get_task_logger()
+
     # 自动识别数值列
     if value_cols is None:
-        value_cols = [col for col in df_work.columns if col != time_col and df_work[col].dtype in ['float64', 'int64', 'float32', 'int32']]
+        value_cols = [col for col in df.columns if col != time_col and df[col].dtype in ['float64', 'int64', 'float32', 'int32']]
     
-    print(f"检测到需要插补的列: {value_cols}")
+    logger.info(f"检测到需要插补的列: {value_cols}")
     
-    # 设置时间索引
-    df_work.set_index(time_col, inplace=True)
+    # 设置时间索引（drop生成的新表即工作副本，不修改输入数据；已按时间排序时不再排序复制）
+    df_work = df.drop(columns=[time_col])
+    df_work.index = pd.DatetimeIndex(ensure_datetime(df[time_col]), name=time_col)
+    if not df_work.index.is_monotonic_increasing:
+        df_work = df_work.sort_index()
     
-    # 创建完整的时间索引，使用传入的时间间隔
+    # 创建完整的时间索引，使用传入的时间间隔；时间已连续时不再reindex复制
     full_index = pd.date_range(start=df_work.index.min(), 
                               end=df_work.index.max(), 
                               freq=time_freq)
-    df_full = df_work.reindex(full_index)
+    if df_work.index.equals(full_index):
+        df_full = df_work
+    else:
+        df_full = df_work.reindex(full_index)
     
     # 存储各列的插补结果信息
     imputation_results = {}
     
     # 对每一列进行插补
     for col in value_cols:
-        print(f"\n正在处理列: {col}")
+        logger.info(f"正在处理列: {col}")
         missing_before = df_full[col].isna().sum()
-        print(f"  缺失值数量: {missing_before}")
+        logger.info(f"  缺失值数量: {missing_before}")
         
         if missing_before > 0:
+            known_order = orders.get(col) if orders is not None else None
             filled_series, col_info = arima_imputation_single_column(
-                df_full[col], max_p, max_d, max_q, ic
+                df_full[col], max_p, max_d, max_q, ic, order=known_order
             )
+            if orders is not None and col_info.get('arima_params') is not None:
+                orders[col] = [int(v) for v in col_info['arima_params']]
             
             if keep_original:
                 # 保留原始列，创建新的填充列
                 filled_col_name = f"{col}_filled"
                 df_full[filled_col_name] = filled_series
-                print(f"  创建插补列: {filled_col_name}")
+                logger.info(f"  创建插补列: {filled_col_name}")
             else:
                 # 覆盖原始列
                 df_full[col] = filled_series
             
-            print(f"  插补状态: {col_info['status']}")
+            logger.info(f"  插补状态: {col_info['status']}")
             if col_info['status'] == 'success':
-                print(f"  最优参数: {col_info['arima_params']}")
-                print(f"  模型AIC: {col_info['model_aic']:.2f}")
+                logger.info(f"  最优参数: {col_info['arima_params']}")
+                logger.info(f"  模型AIC: {col_info['model_aic']:.2f}")
             
             imputation_results[col] = col_info
         else:
-            print(f"  无缺失值，跳过")
+            logger.info("  无缺失值，跳过")
             if keep_original:
                 # 即使没有缺失值，也创建filled列以保持一致性
                 filled_col_name = f"{col}_filled"
                 df_full[filled_col_name] = df_full[col]
-                print(f"  创建副本列: {filled_col_name}")
+                logger.info(f"  创建副本列: {filled_col_name}")
             imputation_results[col] = {"status": "complete", "missing_count": 0}
     
     # 返回原始索引范围的数据
@@ -321,7 +340,7 @@ def arima_imputation_multicolumn(df, time_col='record_time', value_cols=None,
         result_df = result_df[result_df[time_col].isin(original_times)]
     except (KeyError, TypeError) as e:
         # 如果过滤失败，记录警告并返回完整结果
-        print(f"警告: 无法按时间范围过滤数据 ({e})，返回完整插补结果")
+        logger.warning(f"无法按时间范围过滤数据 ({e})，返回完整插补结果")
         pass
     
     # 汇总信息
@@ -339,7 +358,8 @@ def arima_imputation_multicolumn(df, time_col='record_time', value_cols=None,
 
 
 # 简化版本的入口函数（多列）
-def fill_missing_values_multicolumn(df, time_col='record_time', value_cols=None, time_freq='30min', keep_original=False):
+def fill_missing_values_multicolumn(df, time_col='record_time', value_cols=None, time_freq='30min', keep_original=False,
+                                    orders=None):
     """
     简化的多列插补调用接口
     
@@ -349,6 +369,7 @@ def fill_missing_values_multicolumn(df, time_col='record_time', value_cols=None,
     value_cols: list - 需要插补的列名列表，None时自动识别数值列
     time_freq: str - 时间间隔 (默认: '30min')
     keep_original: bool - 是否保留原始列并创建新的填充列 (默认: False)
+    orders: dict - 各列已知的ARIMA阶数（见 arima_imputation_multicolumn）
     
     返回:
     pandas.DataFrame - 插补后的数据
@@ -356,11 +377,13 @@ def fill_missing_values_multicolumn(df, time_col='record_time', value_cols=None,
     # 对于环境数据使用更保守的ARIMA参数
     result_df, _ = arima_imputation_multicolumn(df, time_col, value_cols, 
                                                max_p=3, max_d=1, max_q=3, ic='aic', 
-                                               time_freq=time_freq, keep_original=keep_original)
+                                               time_freq=time_freq, keep_original=keep_original,
+                                               orders=orders)
     return result_df
 
 
-def fill_environmental_data(df, time_col='record_time', value_cols=None, time_freq='30min', keep_original=False):
+def fill_environmental_data(df, time_col='record_time', value_cols=None, time_freq='30min', keep_original=False,
+                            orders=None):
     """
     专门针对环境数据的插补函数（AQI、气象数据等）
     使用更保守的参数和更严格的数值检查
@@ -371,27 +394,30 @@ def fill_environmental_data(df, time_col='record_time', value_cols=None, time_fr
     value_cols: list - 需要插补的列名列表，None时自动识别数值列
     time_freq: str - 时间间隔 (默认: '30min')
     keep_original: bool - 是否保留原始列并创建新的填充列 (默认: False)
+    orders: dict - 各列已知的ARIMA阶数（见 arima_imputation_multicolumn）
     
     返回:
     pandas.DataFrame - 插补后的数据
     """
-    print("使用环境数据专用插补策略")
+    logger = get_task_logger()
+    logger.info("使用环境数据专用插补策略")
     
     # 使用非常保守的ARIMA参数，减少模型复杂度
     result_df, info = arima_imputation_multicolumn(
         df, time_col, value_cols, 
-        max_p=2, max_d=1, max_q=2, ic='aic', time_freq=time_freq, keep_original=keep_original
+        max_p=2, max_d=1, max_q=2, ic='aic', time_freq=time_freq, keep_original=keep_original,
+        orders=orders
     )
     
-    # 打印插补信息
+    # 输出插补信息
     if 'column_details' in info:
         for col, col_info in info['column_details'].items():
             if col_info['status'] == 'success':
                 corrections = col_info.get('unreasonable_corrections', 0)
                 if corrections > 0:
-                    print(f"  {col}: 已纠正 {corrections} 个异常插补值")
+                    logger.info(f"  {col}: 已纠正 {corrections} 个异常插补值")
                 else:
-                    print(f"  {col}: 插补正常")
+                    logger.info(f"  {col}: 插补正常")
     
     return result_df
 
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+"""
+多站点批量处理程序
+
+读取任务清单（每行一个站点：site, file, data_type, longitude, latitude, is_strg, despiking_z），
+在进程池中执行各站点的质量控制。每个工作进程只在启动时导入一次pandas、statsmodels、
+DataQc等模块（以及按需初始化R），之后连续处理分配到的多个站点，最后输出各站点耗时和失败信息
+"""
+import os
+import sys
+import time
+import argparse
+import datetime
+import concurrent.futures
+import pandas as pd
+from core.jobs import read_manifest, load_qc_indicators, run_qc_job, init_worker
+from utils.result_io import OUTPUT_FORMATS
+from utils.result_store import ResultStore
+from utils.logging import LOG_FORMATS, setup_logger, close_logger
+from config.constants import OUTPUT_PROFILES
+
+
+def default_workers(n_jobs):
+    """进程数默认为CPU核数，且不超过任务数"""
+    return max(1, min(os.cpu_count() or 1, n_jobs))
+
+
+def format_summary(results):
+    """
+    生成各站点处理结果汇总表
+
+    Args:
+        results: run_qc_job 返回的结果列表
+
+    Returns:
+        汇总表文本行列表
+    """
+    lines = [f"{'站点':<16}{'数据类型':<20}{'状态':<8}{'耗时(s)':>10}{'行数':>10}  说明"]
+    for r in results:
+        note = r["output"] if r["status"] == "ok" else r["error"]
+        lines.append(
+            f"{r['site']:<16}{r['data_type']:<20}{r['status']:<8}"
+            f"{r['seconds']:>10.1f}{r['rows']:>10}  {note}"
+        )
+    failed = sum(1 for r in results if r["status"] != "ok")
+    lines.append(f"共{len(results)}个任务，成功{len(results) - failed}个，失败{failed}个")
+    return lines
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="多站点批量数据质量控制")
+    parser.add_argument("--manifest", "-m", type=str, required=True, help="任务清单文件（csv或json）")
+    parser.add_argument(
+        "--workers", "-w", type=int, default=0, help="进程数，0表示按CPU核数（不超过任务数）"
+    )
+    parser.add_argument("--output-dir", "-o", type=str, default=".", help="结果文件目录")
+    parser.add_argument(
+        "--output-format", type=str, default="csv", choices=list(OUTPUT_FORMATS),
+        help="结果文件格式：csv、parquet（zstd压缩）或feather（Arrow IPC）",
+    )
+    parser.add_argument(
+        "--output-profile", type=str, default="full", choices=OUTPUT_PROFILES,
+        help="输出方案：final只输出最终结果，audit额外输出中间列，full输出全部列",
+    )
+    parser.add_argument(
+        "--backend", type=str, default="r", choices=["r", "replay"],
+        help="flux插补后端：r调用REddyProc，replay读取录制的输出",
+    )
+    parser.add_argument(
+        "--fixture-dir", type=str, default=None, help="replay后端读取录制输出的目录"
+    )
+    parser.add_argument(
+        "--store-dir", type=str, default=None,
+        help="结果库目录，指定时各站点结果写入结果库，全部完成后合并增量文件",
+    )
+    parser.add_argument(
+        "--low-memory", action="store_true",
+        help="低内存模式：测量值使用float32，适合多进程同时处理多年数据",
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="对各站点的每个处理阶段执行cProfile和tracemalloc，报告写入各站点日志旁",
+    )
+    parser.add_argument(
+        "--metrics-dir", type=str, default=None,
+        help="运行指标目录，指定时各站点写入JSON文件和Prometheus textfile（*.prom）",
+    )
+    parser.add_argument("--log-dir", type=str, default="../logs", help="日志目录")
+    parser.add_argument(
+        "--log-format", type=str, default="text", choices=LOG_FORMATS,
+        help="日志文件格式：text为文本，json为JSON lines（各进程经队列由后台线程写入）",
+    )
+    args = parser.parse_args()
+
+    logger = setup_logger(ftp="batch", log_dir=args.log_dir, log_format=args.log_format)
+    success = False
+    try:
+        jobs = read_manifest(args.manifest)
+        if not jobs:
+            logger.error(f"任务清单 {args.manifest} 为空")
+            return []
+        qc_indicators = load_qc_indicators()
+        os.makedirs(args.output_dir, exist_ok=True)
+
+        workers = args.workers or default_workers(len(jobs))
+        preload_r = args.backend == "r" and any(job["data_type"] == "flux" for job in jobs)
+        logger.info(f"共{len(jobs)}个任务，使用{workers}个进程")
+
+        start = time.perf_counter()
+        results = [None] * len(jobs)
+        store = ResultStore(args.store_dir, logger=logger) if args.store_dir else None
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, initializer=init_worker, initargs=(preload_r,)
+        ) as executor:
+            futures = {
+                executor.submit(
+                    run_qc_job,
+                    job,
+                    qc_indicators,
+                    output_dir=args.output_dir,
+                    output_format=args.output_format,
+                    output_profile=args.output_profile,
+                    backend_name=args.backend,
+                    fixture_dir=args.fixture_dir,
+                    log_dir=args.log_dir,
+                    low_memory=args.low_memory,
+                    profile=args.profile,
+                    metrics_dir=args.metrics_dir,
+                    log_format=args.log_format,
+                    # 结果库只由主进程写入，避免多个进程同时修改索引
+                    keep_data=store is not None,
+                ): i
+                for i, job in enumerate(jobs)
+            }
+            for future in concurrent.futures.as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    # 工作进程异常退出等run_qc_job之外的错误
+                    results[i] = {
+                        "site": jobs[i]["site"], "data_type": jobs[i]["data_type"],
+                        "file": jobs[i]["file"], "status": "failed", "seconds": 0.0,
+                        "rows": 0, "output": None, "error": str(e), "pid": None,
+                    }
+                r = results[i]
+                data = r.pop("data", None)
+                if store is not None and r["status"] == "ok":
+                    try:
+                        store.upsert(data, r["site"], r["data_type"])
+                    except Exception as e:
+                        r.update(status="failed", error=f"写入结果库出错: {str(e)}")
+                del data
+                logger.info(f"[{r['site']}/{r['data_type']}] {r['status']} {r['seconds']:.1f}s")
+
+        if store is not None:
+            store.compact()
+
+        logger.info(f"批量处理完成，总耗时{time.perf_counter() - start:.1f}s")
+        for line in format_summary(results):
+            logger.info(line)
+        summary_path = os.path.join(
+            args.output_dir, f"batch_summary_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}.csv"
+        )
+        pd.DataFrame(results).to_csv(summary_path, index=False, encoding="utf-8-sig")
+        logger.info(f"汇总表已保存至: {summary_path}")
+
+        success = all(r["status"] == "ok" for r in results)
+        return results
+    except Exception as e:
+        logger.error(f"批量处理出错: {str(e)}")
+        return []
+    finally:
+        close_logger(logger, success=success)
+
+
+if __name__ == "__main__":
+    results = main()
+    sys.exit(0 if results and all(r["status"] == "ok" for r in results) else 1)
@@ -5,9 +5,6 @@
 # 站点信息
 CAMPBELL_SITES = ['aosen', 'badaling']
 
-# 数据类型
-VALID_DATA_TYPES = ["flux", "aqi", "sapflow", "nai", "micro_meteorology"]
-
 # 不需要转换为float的列
 NOT_CONVERT_LIST = ['record_time']
 
@@ -39,4 +36,43 @@ DEL_LIST = [
     'NEE_orig', 'H2O_orig', 'LE_orig', 'H_orig', 
     'Tair_orig', 'Tsoil_orig', 'VPD_orig', 'Rg_orig', 
     'rH', 'Rg', 'Tair', 'VPD'
-]
\ No newline at end of file
+]
+
+# 输出方案：final 只输出最终结果，audit 额外输出各处理步骤的中间列便于核查，full 输出全部列
+OUTPUT_PROFILES = ["final", "audit", "full"]
+
+# 各数据类型的输出列（支持通配符，{inputs} 表示质量控制用到的原始输入列）
+# audit 在 final 的基础上追加
+OUTPUT_COLUMNS = {
+    "flux": {
+        "final": [
+            "{inputs}", "*_threshold_limit", "*_despiking",
+            "*_f", "*_fqc", "gpp_*", "reco_*", "ustar_*",
+        ],
+        "audit": [
+            "*_filter_label", "*_add_strg", "*_old", "is_day_night",
+            "*_fsd", "*_fall", "*_fnum", "*_fmeth", "*_fwin",
+        ],
+    },
+    "default": {
+        "final": ["{inputs}", "*_filled"],
+        "audit": ["*_threshold_limit", "*_old"],
+    },
+}
+
+# flux中间列最后一次被使用的阶段，输出方案不包含这些列时在该阶段结束后立即删除
+FLUX_INTERMEDIATE_LAST_USE = {
+    "add_strg": ["*_filter_label"],
+    "threshold_limit": ["*_add_strg"],
+    "del_abnormal_value": ["*_old", "is_day_night"],
+}
+
+# 增量处理时在新数据之前附加的上下文天数，需覆盖依赖前后文的阶段：
+# flux的despiking按13天窗口计算（末尾不足一个窗口时并入前一窗口，最多26天），
+# REddyProc的MDS插补和u*估计需要更长的数据，与按年拆分的最短段一致取90天；
+# sapflow的标准差筛选窗口为480个点（10天）；其它类型为ARIMA建模保留7天
+INCREMENTAL_CONTEXT_DAYS = {
+    "flux": 90,
+    "sapflow": 10,
+    "default": 7,
+}
@@ -0,0 +1,191 @@
+"""
+数据类型注册模块
+
+每种数据类型在这里声明一次：预处理之后依次执行的处理阶段、质量控制需要读取的列、
+阈值处理函数和插补方法。参数验证、读取列、阈值处理和插补都从这里取得对应配置，
+增加数据类型只需注册一个 DataTypeSpec，阶段的具体实现见 DataQc。
+
+阈值处理函数和插补函数以 "模块:函数名" 注册，使用时才导入，读取数据、参数验证等
+只需要列信息的模块导入本模块时不会导入statsmodels等处理模块
+"""
+import importlib
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Callable, Optional, Tuple, Union
+from config.constants import NEEDED_INDICES
+
+# flux处理流程（预处理之后），前四个阶段只依赖当前行
+FLUX_CHAIN = (
+    "filter_by_quality",
+    "add_strg",
+    "remove_unnecessary_columns",
+    "threshold_limit",
+    "gap_fill_par",
+    "despiking",
+    "del_abnormal_value",
+    "ustar_fill_partition",
+)
+
+# ARIMA插补的数据类型的处理流程
+ARIMA_CHAIN = ("threshold_limit", "gap_fill")
+
+# flux数据中不在qc_indicators里但流程会用到的列
+FLUX_EXTRA_COLUMNS = (
+    "co2_flux", "h2o_flux", "le", "h",
+    "co2_flux_strg", "h2o_flux_strg", "le_strg", "h_strg",
+)
+
+
+def _resolve(target):
+    """将 "模块:函数名" 解析为函数，已经是函数时原样返回"""
+    if not isinstance(target, str):
+        return target
+    module_name, _, attr = target.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+@dataclass(frozen=True)
+class DataTypeSpec:
+    """
+    数据类型的处理配置
+
+    Attributes:
+        name: 数据类型名称
+        chain: 预处理之后按执行顺序排列的阶段名称
+        threshold: 阈值处理函数（"模块:函数名"或函数），参数为 (data, qc_indicators)
+        threshold_kwargs: 调用阈值处理函数时附加的关键字参数
+        imputer: ARIMA插补函数（"模块:函数名"或函数，参数同 fill_missing_values_multicolumn），
+            flux为None（由R插补）
+        impute_columns: 插补的列，为空时插补全部数值列
+        extra_columns: qc_indicators之外需要读取的列
+        indicator_name: 指标在数据文件中的列名来源，"code"或"en_name"（规范化后）
+        global_threshold: 阈值处理是否需要前后文（重采样、滑动窗口），为True时不能分块执行
+        row_local_stages: 只依赖当前行、可分块执行的阶段，为None时按global_threshold确定
+        threshold_outputs: 阈值处理阶段写入的列
+        only_needed: 输出方案不是full时是否只读取需要的列；插补全部数值列的类型
+            会用到文件中的所有数值列，为False
+    """
+    name: str
+    chain: Tuple[str, ...]
+    threshold: Union[str, Callable]
+    threshold_kwargs: dict = field(default_factory=dict, hash=False)
+    imputer: Optional[Union[str, Callable]] = None
+    impute_columns: Tuple[str, ...] = ()
+    extra_columns: Tuple[str, ...] = ()
+    indicator_name: str = "code"
+    global_threshold: bool = False
+    row_local_stages: Optional[Tuple[str, ...]] = None
+    threshold_outputs: Tuple[str, ...] = ("*",)
+    only_needed: bool = False
+
+    def threshold_func(self):
+        """阈值处理函数，参数为 (data, qc_indicators)"""
+        func = _resolve(self.threshold)
+        return partial(func, **self.threshold_kwargs) if self.threshold_kwargs else func
+
+    def imputer_func(self):
+        """ARIMA插补函数，没有时为None"""
+        return None if self.imputer is None else _resolve(self.imputer)
+
+    def chunkable_stages(self):
+        """只依赖当前行、可分块执行的阶段名称"""
+        if self.row_local_stages is not None:
+            return list(self.row_local_stages)
+        if self.global_threshold:
+            return ["preprocess_data"]
+        return ["preprocess_data", "threshold_limit"]
+
+
+DATA_TYPES = {}
+
+
+def register_data_type(spec):
+    """
+    注册数据类型
+
+    Args:
+        spec: DataTypeSpec
+
+    Returns:
+        spec
+    """
+    DATA_TYPES[spec.name] = spec
+    return spec
+
+
+def get_data_type(name):
+    """
+    获取数据类型的处理配置
+
+    Args:
+        name: 数据类型名称
+
+    Returns:
+        DataTypeSpec
+    """
+    spec = DATA_TYPES.get(name)
+    if spec is None:
+        raise ValueError(f"不支持的数据类型: {name}，可选: {', '.join(DATA_TYPES)}")
+    return spec
+
+
+def read_only_needed(data_type, output_profile):
+    """
+    是否只读取质量控制需要的列：full方案输出全部原始列，其它方案不输出未使用的列，
+    这些列不需要读取
+
+    Args:
+        data_type: 数据类型
+        output_profile: 输出方案
+
+    Returns:
+        bool
+    """
+    spec = DATA_TYPES.get(data_type)
+    return spec is not None and spec.only_needed and output_profile != "full"
+
+
+register_data_type(DataTypeSpec(
+    name="flux",
+    chain=FLUX_CHAIN,
+    threshold="processors.thresholds:threshold_limit_flux",
+    extra_columns=tuple(NEEDED_INDICES) + FLUX_EXTRA_COLUMNS,
+    row_local_stages=("preprocess_data",) + FLUX_CHAIN[:4],
+    threshold_outputs=("*_threshold_limit",),
+    only_needed=True,
+))
+register_data_type(DataTypeSpec(
+    name="aqi",
+    chain=ARIMA_CHAIN,
+    threshold="processors.thresholds:threshold_limit_aqi",
+    imputer="ARIMA.arima_imputation:fill_environmental_data",
+    indicator_name="en_name",
+    global_threshold=True,
+))
+register_data_type(DataTypeSpec(
+    name="sapflow",
+    chain=ARIMA_CHAIN,
+    threshold="processors.thresholds:threshold_limit_sapflow",
+    imputer="ARIMA.arima_imputation:fill_missing_values_multicolumn",
+    # 异常值判断需要气温
+    extra_columns=("ta_1_2_1",),
+    global_threshold=True,
+))
+register_data_type(DataTypeSpec(
+    name="nai",
+    chain=ARIMA_CHAIN,
+    threshold="processors.thresholds:threshold_limit_general",
+    threshold_kwargs={"data_type": "nai"},
+    imputer="ARIMA.arima_imputation:fill_missing_values_multicolumn",
+    impute_columns=("nai",),
+    only_needed=True,
+))
+register_data_type(DataTypeSpec(
+    name="micro_meteorology",
+    chain=ARIMA_CHAIN,
+    threshold="processors.thresholds:threshold_limit_general",
+    threshold_kwargs={"data_type": "micro_meteorology"},
+    imputer="ARIMA.arima_imputation:fill_missing_values_multicolumn",
+))
+
+VALID_DATA_TYPES = list(DATA_TYPES)
@@ -2,6 +2,7 @@
 数据质量控制模块
 """
 
+import contextlib
 import pandas as pd
 import numpy as np
 from config.constants import CAMPBELL_SITES, NOT_CONVERT_LIST, NEEDED_INDICES
@@ -12,18 +13,38 @@ from processors.storage_correction import (
     copy_flux_columns_without_qc_filter,
     handle_campbell_special_case,
 )
-from processors.thresholds import threshold_limit
-from processors.gap_filling import gap_fill_par, gapfill
+from processors.gap_filling import gap_fill_par
 from processors.despiking import despiking_data
 from processors.abnormal_data import del_abnormal_data
 from processors.partitioning import ustar_data
-from ARIMA.arima_imputation import fill_missing_values_multicolumn, fill_environmental_data
+from processors.yearly_split import run_by_year
+from processors.backends import RBackend
+from utils.fill_time import align_parts_to_grid
+from utils.output_profiles import select_output_columns, release_intermediates
+from utils.memory import downcast_floats
+from utils.metrics import use_metrics
+from utils.logging import use_task_logger
+from core.pipeline import Stage, PipelineRunner, log_stage_table
+from config.data_types import FLUX_CHAIN, get_data_type
+
+# flux数据从阈值筛选开始按执行顺序排列的阶段，前四个阶段结束后可保存检查点
+FLUX_STAGES = list(FLUX_CHAIN[FLUX_CHAIN.index("threshold_limit"):])
+
+FLUX_COLUMNS = ["co2_flux", "h2o_flux", "le", "h"]
+
+# flux数据阈值筛选前删除的列
+UNNECESSARY_COLUMNS = ["short_up_avg", "rh_12m_avg", "rh_10m_avg", "ta_12m_avg"]
+
+
+def _flux_columns(suffix):
+    return [f"{col}_{suffix}" for col in FLUX_COLUMNS]
+
 
 class DataQc:
     """
     数据质量控制类
 
-    对flux, aqi, sapflow, nai数据进行质量控制
+    对flux, aqi, sapflow, nai等数据进行质量控制，各数据类型的处理流程见 config.data_types
     """
 
     def __init__(
@@ -42,6 +63,19 @@ class DataQc:
         logger,
         despiking_z=4,
         time_freq="30min",
+        stage_cache=None,
+        year_workers=1,
+        year_overlap_days=30,
+        backend=None,
+        output_profile="full",
+        checkpoints=None,
+        resume_after=None,
+        stage_workers=1,
+        arima_orders=None,
+        grow_calendar=None,
+        low_memory=False,
+        profiler=None,
+        metrics=None,
     ):
         """
         初始化数据质量控制类
@@ -61,6 +95,20 @@ class DataQc:
             logger: 日志记录器
             despiking_z: 去尖峰的z值，默认为4
             time_freq: 时间间隔，默认为"30min"
+            stage_cache: R插补/分区阶段的结果缓存（StageCache），默认不缓存
+            year_workers: R阶段按年份并行的进程数，默认为1（不拆分）
+            year_overlap_days: 按年份拆分时前后重叠的天数，默认为30
+            backend: flux插补后端（GapFillBackend），默认使用R
+            output_profile: 输出方案（final、audit、full），默认为"full"输出全部列
+            checkpoints: 阶段检查点（CheckpointStore），指定时flux各阶段结束后保存检查点
+            resume_after: 已完成的flux阶段名称，data为该阶段的检查点数据，从下一阶段继续
+            stage_workers: 互不依赖的处理阶段的最大并发数，默认为1（顺序执行）
+            arima_orders: 各列已知的ARIMA阶数，指定时沿用并写入本次使用的阶数（增量处理）
+            grow_calendar: 生长季日历，指定时沿用并写入已确定的日期（增量处理）
+            low_memory: 低内存模式，测量值列使用float32，各阶段在pandas写时复制模式下执行，
+                复制出的中间列在被修改前与原列共用内存，默认为False
+            profiler: 阶段性能分析器（StageProfiler），指定时对每个阶段执行cProfile和tracemalloc
+            metrics: 运行指标收集器（MetricsCollector），指定时记录行数、各阶段耗时和筛除个数等
         """
         self.filename = filename
         self.qc_flag_list = qc_flag_list  # 保留以确保向后兼容性，但不再使用
@@ -73,8 +121,26 @@ class DataQc:
         self.ftp = ftp
         self.qc_indicators = qc_indicators
         self.data_type = data_type
+        self.spec = get_data_type(data_type)
         self.logger = logger
         self.time_freq = time_freq
+        self.stage_cache = stage_cache
+        self.year_workers = year_workers
+        self.year_overlap_days = year_overlap_days
+        self.backend = backend or RBackend()
+        self.output_profile = output_profile
+        self.checkpoints = checkpoints
+        self.resume_after = resume_after
+        # 逐行处理的阶段是否已通过 load_chunks 分块执行（或已从检查点恢复）
+        self.row_local_done = resume_after is not None
+        self.stage_workers = stage_workers
+        self.arima_orders = arima_orders
+        self.grow_calendar = grow_calendar
+        self.low_memory = low_memory
+        self.profiler = profiler
+        self.metrics = metrics
+        # 各阶段的耗时和内存记录（见 core.pipeline）
+        self.stage_records = []
 
         # 将列表数据转换为DataFrame
         if isinstance(data, list):
@@ -95,193 +161,276 @@ class DataQc:
         Returns:
             处理后的数据DataFrame
         """
-        self.logger.info("数据预处理")
-        self._preprocess_data()
-
-        if self.data_type == "flux":
-            self.logger.info("flux数据质量控制")
-            self._process_flux_data()
-        elif self.data_type == "aqi":
-            self.logger.info("阈值限制")
-            self._threshold_limit()
-            self.logger.info("aqi数据质量控制")
-            self._process_aqi_data()
-        elif self.data_type == "nai":
-            self.logger.info("阈值限制")
-            self._threshold_limit()
-            self.logger.info("nai数据质量控制")
-            self._process_nai_data()
-        elif self.data_type == "sapflow":
-            self.logger.info("阈值限制")
-            self._threshold_limit()
-            self.logger.info("sapflow数据质量控制")
-            self._process_sapflow_data()
-        else:
-            self.logger.info(f"{self.data_type}数据质量控制")
-            # 其他数据类型的处理逻辑...
-            # 原始数据里需要包括下面的这些列
-            if self.ftp in ["cuihu", "yeyahu", "yuankeyuan"]:
-                flux_indicators = ["record_time", "vpd", "rh", "ppfd_1_1_1"]
-            elif self.ftp == "badaling":
-                flux_indicators = [
-                    "record_time",
-                    "short_up_avg",
-                    "rh_10m_avg",
-                    "ta_1_2_1",
-                    "ppfd_1_1_1",
-                ]
-            else:
-                flux_indicators = ["record_time", "vpd", "rh", "rg_1_1_2", "ta_1_2_1"]
-            self.logger.info("根据阈值进行数据过滤")
-            self._threshold_limit()
-            self.logger.info("插补")
-            self._gap_fill()
+        self.logger.info(f"{self.data_type}数据质量控制")
+
+        runner = PipelineRunner(
+            self._build_stages(),
+            self.logger,
+            max_workers=self.stage_workers,
+            skip=self._completed_stages(),
+            after_stage=self._after_stage,
+            profiler=self.profiler,
+        )
+        if self.metrics is not None and not self.metrics.rows_in:
+            self.metrics.rows_in = len(self.raw_data)
+        with self._memory_mode(), use_metrics(self.metrics), use_task_logger(self.logger):
+            self.raw_data = runner.run(self.raw_data)
+        self.stage_records.extend(runner.records)
+
+        # 按输出方案选择输出列
+        self.raw_data = select_output_columns(
+            self.raw_data, self.data_type, self.output_profile, self.qc_indicators
+        )
+        log_stage_table(self.stage_records, self.logger)
+        if self.metrics is not None:
+            self.metrics.rows_out = len(self.raw_data)
+            self.metrics.add_stage_records(self.stage_records)
         return self.raw_data
 
-    def _preprocess_data(self):
+    def _build_stages(self):
+        """
+        按数据类型注册的处理流程构建处理阶段，每个阶段声明读取和写入的列
+
+        Returns:
+            按执行顺序排列的阶段列表
+        """
+        filter_label = _flux_columns("filter_label")
+        if self.spec.impute_columns:
+            impute_inputs = ["record_time", *self.spec.impute_columns]
+            impute_outputs = [f"{col}_filled" for col in self.spec.impute_columns]
+        else:
+            impute_inputs, impute_outputs = ["*"], ["*_filled"]
+        catalogue = {
+            "filter_by_quality": Stage("filter_by_quality", self._filter_by_quality,
+                                       FLUX_COLUMNS, filter_label + ["h2o_flux"], "复制通量数据"),
+            "add_strg": Stage("add_strg", self._add_strg,
+                              filter_label + ["*_strg"], _flux_columns("add_strg"), "添加存储项"),
+            "remove_unnecessary_columns": Stage("remove_unnecessary_columns",
+                                                self._remove_unnecessary_columns,
+                                                [], UNNECESSARY_COLUMNS),
+            "threshold_limit": Stage("threshold_limit", self._threshold_limit,
+                                     ["*"], list(self.spec.threshold_outputs), "根据阈值筛选数据"),
+            "gap_fill_par": Stage("gap_fill_par", self._gap_fill_par,
+                                  ["record_time", "*_threshold_limit"], ["*"],
+                                  "插补par光合有效辐射 ppfd_1_1_1"),
+            "despiking": Stage("despiking", self._despiking,
+                               ["*_threshold_limit", "Par_f"], ["*_despiking", "is_day_night"],
+                               "对co2 h2o le h进行despiking"),
+            "del_abnormal_value": Stage("del_abnormal_value", self._del_abnormal_value,
+                                        ["record_time", "co2_despiking", "Par_f",
+                                         "ta_1_2_1_threshold_limit"],
+                                        ["co2_despiking*", "is_day_night"], "异常值过滤"),
+            "ustar_fill_partition": Stage("ustar_fill_partition", self._ustar_fill_partition,
+                                          ["*"], ["*"], "插补"),
+            "gap_fill": Stage("gap_fill", self._gap_fill, impute_inputs, impute_outputs, "插补"),
+        }
+        stages = [Stage("preprocess_data", self._preprocess_data, ["*"], ["*"], "数据预处理")]
+        return stages + [catalogue[name] for name in self.spec.chain]
+
+    def _row_local_stages(self):
+        """只依赖当前行、可分块执行的阶段名称"""
+        return self.spec.chunkable_stages()
+
+    def _completed_stages(self):
+        """已完成、需要跳过的阶段：从检查点恢复时为检查点之前的阶段，分块读取时为逐行阶段"""
+        if self.resume_after is not None:
+            return self._row_local_stages() + FLUX_STAGES[:FLUX_STAGES.index(self.resume_after) + 1]
+        if self.row_local_done:
+            return self._row_local_stages()
+        return []
+
+    def _after_stage(self, stage, data, skipped):
+        """阶段结束后删除不再使用的中间列，并保存flux阶段检查点"""
+        if not skipped:
+            data = release_intermediates(
+                data, self.data_type, self.output_profile, stage, self.qc_indicators
+            )
+        resumed = self.resume_after is not None and stage in self._completed_stages()
+        if (self.checkpoints is not None and self.data_type == "flux"
+                and stage in FLUX_STAGES[:-1] and not resumed):
+            self.checkpoints.save(stage, data)
+        return data
+
+    def _memory_mode(self):
+        """低内存模式下启用pandas写时复制（列赋值不立即复制数据）"""
+        if self.low_memory:
+            return pd.option_context("mode.copy_on_write", True)
+        return contextlib.nullcontext()
+
+    def _preprocess_data(self, data):
         """数据预处理"""
         # 删除id列
-        if "id" in self.raw_data.columns:
+        if "id" in data.columns:
             self.logger.info("删除id列")
-            self.raw_data = self.raw_data.drop("id", axis=1)
+            data = data.drop("id", axis=1)
+
+        # 读取时已按schema转换为数值的列无需再次处理，只处理object列
+        object_cols = [
+            col for col in data.columns
+            if not pd.api.types.is_numeric_dtype(data[col])
+        ]
 
         # NAN值处理
         self.logger.info("NAN值处理")
-        self.raw_data = self.raw_data.replace(
-            ["NaN", "nan", "NAN", "N/A", "N/a", "n/a", "N/A", " ", ""], np.nan
-        )
+        if object_cols:
+            data[object_cols] = data[object_cols].replace(
+                ["NaN", "nan", "NAN", "N/A", "N/a", "n/a", "N/A", " ", ""], np.nan
+            )
 
         # 转换数据类型为float
         self.logger.info("数据转换float")
-        for col in self.raw_data.columns:
+        for col in object_cols:
             if col not in NOT_CONVERT_LIST:
-                self.raw_data[col] = pd.to_numeric(self.raw_data[col], errors="coerce")
+                data[col] = pd.to_numeric(data[col], errors="coerce")
 
         # 确保必要的列存在 (仅对flux类型数据)
         if self.data_type == "flux":
             for col in NEEDED_INDICES:
-                if col not in self.raw_data.columns:
-                    self.raw_data[col] = np.nan
-
-    def _process_flux_data(self):
-        """处理flux类型数据"""
-        # 复制通量数据
-        self.logger.info("复制通量数据")
-        self._filter_by_quality()
-
-        # 添加存储项
-        self.logger.info("添加存储项")
-        self._add_strg()
+                if col not in data.columns:
+                    data[col] = np.nan
 
-        # 删除不需要的指标
-        self._remove_unnecessary_columns()
+        if self.low_memory:
+            self.logger.info("低内存模式：测量值转换为float32")
+            data = downcast_floats(data, exclude=NOT_CONVERT_LIST)
+        return data
 
-        # 根据阈值进行数据筛选
-        self.logger.info("根据阈值筛选数据")
-        self._threshold_limit()
-
-        # 插补par光合有效辐射
-        self.logger.info("插补par光合有效辐射 ppfd_1_1_1")
-        self._gap_fill_par()
+    def load_chunks(self, chunks, time_freq="30min"):
+        """
+        分块执行逐行处理的阶段，拼接后对齐到时间网格
 
-        # 对co2 h2o le h进行despiking
-        self.logger.info("对co2 h2o le h进行despiking")
-        self._despiking()
+        预处理、通量复制、存储项校正、删除列和阈值筛选（aqi、sapflow除外）只依赖
+        当前行，逐块执行后只需保留处理后的列；需要前后文的阶段在 data_qc() 中
+        对拼接后的完整数据执行
 
-        # 异常值过滤
-        self.logger.info("异常值过滤")
-        self._del_abnormal_value()
+        Args:
+            chunks: 数据块迭代器（见 utils.ingest.iter_data_chunks）
+            time_freq: 时间间隔，默认为"30min"
 
-        # 插补
-        self.logger.info("插补")
-        self._ustar_fill_partition()
+        Returns:
+            时间对齐的统计信息
+        """
+        row_local = set(self._row_local_stages())
+        stages = [stage for stage in self._build_stages() if stage.name in row_local]
+        parts = []
+        for i, chunk in enumerate(chunks, 1):
+            runner = PipelineRunner(stages, self.logger, after_stage=self._release_after_stage,
+                                    profiler=self.profiler)
+            with self._memory_mode(), use_metrics(self.metrics), use_task_logger(self.logger):
+                result = runner.run(chunk)
+            # 各列单独复制保存，拼接时可以逐列释放
+            parts.append({col: result[col].copy() for col in result.columns})
+            del result
+            if self.metrics is not None:
+                self.metrics.rows_in += len(chunk)
+            self.stage_records.extend(runner.records)
+            self.logger.info(f"第{i}块数据处理完成，共{len(chunk)}行")
+
+        # 逐列拼接并对齐，避免拼接结果和对齐结果同时占用内存
+        self.raw_data, summary = align_parts_to_grid(parts, freq=time_freq)
+
+        self.row_local_done = True
+        if not self.raw_data.empty:
+            self.data_start_time = self.raw_data["record_time"].min()
+            self.data_end_time = self.raw_data["record_time"].max()
+        return summary
+
+    def _release_after_stage(self, stage, data, skipped):
+        """分块执行时只删除中间列，检查点在拼接后保存"""
+        return release_intermediates(
+            data, self.data_type, self.output_profile, stage, self.qc_indicators
+        )
 
-    def _filter_by_quality(self):
+    def _filter_by_quality(self, data):
         """复制通量数据（已移除QC标记筛选功能）"""
         if self.ftp in CAMPBELL_SITES:
-            self.raw_data = handle_campbell_special_case(self.raw_data)
-        else:
-            self.raw_data = copy_flux_columns_without_qc_filter(self.raw_data)
+            return handle_campbell_special_case(data)
+        return copy_flux_columns_without_qc_filter(data)
 
-    def _add_strg(self):
+    def _add_strg(self, data):
         """进行存储项校正"""
         if self.is_strg == "1":
-            self.raw_data = do_add_strg(self.raw_data)
-        else:
-            self.raw_data = not_add_strg(self.raw_data)
+            return do_add_strg(data)
+        return not_add_strg(data)
 
-    def _remove_unnecessary_columns(self):
+    def _remove_unnecessary_columns(self, data):
         """删除不需要的列"""
-        columns_to_remove = ["short_up_avg", "rh_12m_avg", "rh_10m_avg", "ta_12m_avg"]
-
-        for col in columns_to_remove:
-            if col in self.raw_data.columns:
-                self.raw_data = self.raw_data.drop(col, axis=1)
+        for col in UNNECESSARY_COLUMNS:
+            if col in data.columns:
+                data = data.drop(col, axis=1)
+        return data
 
-    def _threshold_limit(self):
+    def _threshold_limit(self, data):
         """阈值限制"""
-        self.raw_data = threshold_limit(
-            self.raw_data, self.qc_indicators, self.data_type
-        )
+        return self.spec.threshold_func()(data, self.qc_indicators)
 
-    def _gap_fill_par(self):
+    def _gap_fill_par(self, data):
         """插补光合有效辐射"""
-        self.raw_data = gap_fill_par(
-            self.filename, self.longitude, self.latitude, self.timezone, self.raw_data
+        return self._run_r_stage(
+            gap_fill_par,
+            data,
+            file_name=self.filename,
+            longitude=self.longitude,
+            latitude=self.latitude,
+            timezone=self.timezone,
+            stage_cache=self.stage_cache,
+            backend=self.backend,
         )
 
-    def _despiking(self):
+    def _despiking(self, data):
         """去尖峰处理"""
-        self.raw_data = despiking_data(self.raw_data, self.despiking_z)
+        return despiking_data(data, self.despiking_z)
 
-    def _del_abnormal_value(self):
+    def _del_abnormal_value(self, data):
         """删除异常值"""
-        self.raw_data = del_abnormal_data(
-            self.raw_data, nee_name="co2_despiking", par_name="Par_f"
+        return del_abnormal_data(
+            data, nee_name="co2_despiking", par_name="Par_f", grow_calendar=self.grow_calendar
         )
 
-    def _ustar_fill_partition(self):
+    def _ustar_fill_partition(self, data):
         """
         对co2 flux进行u*计算、插补和分区
         对其它指标只进行插补
         """
-        self.raw_data = ustar_data(
-            self.filename,
-            self.longitude,
-            self.latitude,
-            self.timezone,
-            self.raw_data,
-            self.qc_indicators,
+        return self._run_r_stage(
+            ustar_data,
+            data,
+            file_name=self.filename,
+            longitude=self.longitude,
+            latitude=self.latitude,
+            timezone=self.timezone,
+            qc_indicators=self.qc_indicators,
+            stage_cache=self.stage_cache,
+            backend=self.backend,
         )
 
-    def _gap_fill(self):
-        """插补处理，对非flux数据保留原始列并创建_filled列"""
-        if self.data_type == "flux":
-            # flux数据使用原有的R脚本插补
-            self.raw_data = gapfill(self.filename, self.longitude,
-                                    self.latitude, self.timezone, self.raw_data,
-                                    self.qc_indicators, self.data_type)
-        else:
-            # 其他数据类型使用ARIMA插补，保留原始列
-            self.logger.info(f"对{self.data_type}数据进行插补，保留原始列并创建_filled列")
-            self.raw_data = fill_missing_values_multicolumn(self.raw_data, time_col='record_time', 
-                                                          time_freq=self.time_freq, keep_original=True)
-    
-    def _process_aqi_data(self):
-        """处理aqi数据"""
-        self.logger.info("对aqi数据进行插补，保留原始列并创建_filled列")
-        self.raw_data = fill_environmental_data(self.raw_data, time_col='record_time', 
-                                              time_freq=self.time_freq, keep_original=True)
-
-    def _process_nai_data(self):
-        """处理nai数据"""
-        self.logger.info("对nai数据进行插补，保留原始列并创建_filled列")
-        self.raw_data = fill_missing_values_multicolumn(self.raw_data, time_col='record_time', 
-                                                      value_cols=['nai'], time_freq=self.time_freq, 
-                                                      keep_original=True)
-
-    def _process_sapflow_data(self):
-        """处理sapflow数据"""
-        self.logger.info("对sapflow数据进行插补，保留原始列并创建_filled列")
-        self.raw_data = fill_missing_values_multicolumn(self.raw_data, time_col='record_time', 
-                                                      time_freq=self.time_freq, keep_original=True)
\ No newline at end of file
+    def _run_r_stage(self, func, data, **kwargs):
+        """
+        执行R阶段，启用按年并行时将多年数据拆分到多个进程中处理
+
+        Args:
+            func: R阶段处理函数
+            data: 当前数据
+            **kwargs: 除数据外传给func的参数
+
+        Returns:
+            处理后的数据
+        """
+        if self.year_workers > 1:
+            return run_by_year(
+                func,
+                data,
+                kwargs,
+                overlap_days=self.year_overlap_days,
+                max_workers=self.year_workers,
+                logger=self.logger,
+            )
+        return func(data=data, **kwargs)
+
+    def _gap_fill(self, data):
+        """ARIMA插补，保留原始列并创建_filled列"""
+        self.logger.info(f"对{self.data_type}数据进行插补，保留原始列并创建_filled列")
+        imputer = self.spec.imputer_func()
+        return imputer(data, time_col='record_time',
+                       value_cols=list(self.spec.impute_columns) or None,
+                       time_freq=self.time_freq, keep_original=True,
+                       orders=self.arima_orders)
@@ -0,0 +1,298 @@
+"""
+站点处理任务模块
+
+读取一个站点的数据（文件或行记录），执行质量控制并保存结果。供批量处理（batch.py）、
+常驻服务（server.py）等在同一进程内连续处理多个站点的入口使用
+"""
+import os
+import time
+import datetime
+from types import SimpleNamespace
+import pandas as pd
+from core.data_qc import DataQc
+from config.data_types import read_only_needed
+from utils.fill_time import align_to_grid, format_grid_summary
+from utils.ingest import read_data_file, read_data_files
+from utils.result_io import output_path_for, write_result
+from utils.validators import validate_args
+from utils.logging import setup_logger, close_logger
+from utils.result_store import ResultStore
+from utils.stage_profiler import StageProfiler
+from utils.metrics import MetricsCollector, write_metrics
+from processors.backends import create_backend
+
+# 任务清单的列，site、file、data_type为必填
+MANIFEST_COLUMNS = ["site", "file", "data_type", "longitude", "latitude", "is_strg", "despiking_z"]
+
+JOB_DEFAULTS = {
+    "longitude": 116.28824,
+    "latitude": 40.265635,
+    "is_strg": 0,
+    "despiking_z": 4.0,
+}
+
+
+def init_worker(preload_r=False):
+    """
+    工作进程初始化：预先导入耗时的模块，需要时预先初始化R
+
+    Args:
+        preload_r: 是否初始化R
+    """
+    import statsmodels.api  # noqa: F401
+    import ARIMA.arima_imputation  # noqa: F401
+
+    if preload_r:
+        from r_scripts import load_r
+
+        try:
+            load_r()
+        except RuntimeError:
+            # R不可用时flux任务会各自报错，非flux任务不受影响
+            pass
+
+
+def load_qc_indicators(path="qc_indicators.csv"):
+    """
+    读取质量控制指标
+
+    Args:
+        path: 指标文件路径
+
+    Returns:
+        指标记录列表
+    """
+    return pd.read_csv(path).to_dict("records")
+
+
+def read_manifest(path):
+    """
+    读取任务清单（csv或json），每行一个站点任务
+
+    Args:
+        path: 清单文件路径
+
+    Returns:
+        任务字典列表
+
+    Raises:
+        ValueError: 清单缺少必填列
+    """
+    if path.lower().endswith(".json"):
+        manifest = pd.read_json(path)
+    else:
+        manifest = pd.read_csv(path, dtype={"site": str, "file": str, "data_type": str})
+    missing = [col for col in ("site", "file", "data_type") if col not in manifest.columns]
+    if missing:
+        raise ValueError(f"任务清单缺少列: {', '.join(missing)}")
+
+    jobs = []
+    base_dir = os.path.dirname(os.path.abspath(path))
+    for row in manifest.to_dict("records"):
+        job = dict(JOB_DEFAULTS)
+        job.update({k: v for k, v in row.items() if k in MANIFEST_COLUMNS and not pd.isna(v)})
+        # 相对路径相对于清单文件所在目录
+        if not os.path.isabs(job["file"]):
+            job["file"] = os.path.join(base_dir, job["file"])
+        job["longitude"] = float(job["longitude"])
+        job["latitude"] = float(job["latitude"])
+        job["is_strg"] = int(job["is_strg"])
+        job["despiking_z"] = float(job["despiking_z"])
+        jobs.append(job)
+    return jobs
+
+
+def validate_job(job):
+    """
+    验证任务参数
+
+    Args:
+        job: 任务字典，数据来自file（文件路径）、files（多个文件）或rows（行记录列表）
+
+    Returns:
+        (是否通过, 错误信息列表)
+    """
+    if job.get("file") is None and job.get("rows") is None and not job.get("files"):
+        return False, ["错误：任务需要指定file、files或rows"]
+    missing = [path for path in job.get("files") or [] if not os.path.exists(path)]
+    if missing:
+        return False, [f"错误：文件 {path} 不存在" for path in missing]
+    return validate_args(SimpleNamespace(
+        file_path=job.get("file"),
+        data_type=job["data_type"],
+        longitude=job["longitude"],
+        latitude=job["latitude"],
+    ))
+
+
+def load_job_data(job, qc_indicators, only_needed=False):
+    """
+    读取任务数据
+
+    Args:
+        job: 任务字典
+        qc_indicators: 质量控制指标
+        only_needed: 是否只读取质量控制会用到的列（行记录不受影响）
+
+    Returns:
+        原始数据DataFrame
+    """
+    if job.get("rows") is not None:
+        data = pd.DataFrame(job["rows"])
+        if "record_time" not in data.columns:
+            raise ValueError("rows中缺少record_time")
+        return data
+    if job.get("files"):
+        data, _ = read_data_files(job["files"], qc_indicators=qc_indicators, data_type=job["data_type"],
+                                  only_needed=only_needed)
+        return data
+    return read_data_file(job["file"], qc_indicators=qc_indicators, data_type=job["data_type"],
+                          only_needed=only_needed)
+
+
+def run_qc_job(job, qc_indicators, output_dir=".", output_format="csv",
+               output_profile="full", backend_name="r", fixture_dir=None,
+               store_dir=None, log_dir="../logs", time_freq="30min",
+               backend=None, keep_data=False, job_id=None, low_memory=False,
+               profile=False, profile_top=20, metrics_dir=None, log_format="text"):
+    """
+    处理一个站点任务
+
+    Args:
+        job: 任务字典（见 read_manifest），数据来自file、files或rows
+        qc_indicators: 质量控制指标
+        output_dir: 结果文件目录，为None时不保存结果文件
+        output_format: 结果文件格式
+        output_profile: 输出方案
+        backend_name: flux插补后端名称
+        fixture_dir: replay后端读取录制输出的目录
+        store_dir: 结果库目录，指定时写入结果库；在进程池中并发执行时应改用keep_data，由主进程写入
+        log_dir: 日志目录
+        time_freq: 时间间隔
+        backend: 已创建的插补后端，指定时忽略backend_name和fixture_dir
+        keep_data: 是否在结果的data中返回处理后的数据
+        job_id: 任务ID，指定时加入日志和结果文件名，避免同一站点的并发任务重名
+        low_memory: 是否使用低内存模式（见 DataQc）
+        profile: 是否对各处理阶段执行性能分析，报告写入日志目录
+        profile_top: 性能分析报告中每个阶段列出的函数和分配位置数
+        metrics_dir: 运行指标目录，指定时写入JSON文件和Prometheus textfile
+        log_format: 日志文件格式（text或json，见 setup_logger）
+
+    Returns:
+        任务结果字典，包含站点、数据类型、状态、耗时、行数、结果文件和错误信息
+    """
+    start = time.perf_counter()
+    result = {
+        "site": job["site"],
+        "data_type": job["data_type"],
+        "file": job.get("file"),
+        "status": "failed",
+        "seconds": 0.0,
+        "rows": 0,
+        "output": None,
+        "error": None,
+        "pid": os.getpid(),
+    }
+    name = f"{job['site']}_{job_id}" if job_id else job["site"]
+    logger = setup_logger(ftp=name, log_dir=log_dir, log_format=log_format)
+    success = False
+    stage_profiler = None
+    metrics = None
+    try:
+        logger.info(
+            f"任务: site={job['site']}, file={job.get('file')}, data-type={job['data_type']}"
+        )
+        valid, error_msgs = validate_job(job)
+        if not valid:
+            raise ValueError("; ".join(error_msgs))
+
+        task_id = job["site"] + datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+        if metrics_dir:
+            metrics = MetricsCollector(job["site"], job["data_type"], job_id or task_id)
+        data = load_job_data(
+            job, qc_indicators, only_needed=read_only_needed(job["data_type"], output_profile)
+        )
+        logger.info(f"数据时间范围：{data['record_time'].min()} 至 {data['record_time'].max()}")
+        data, grid_summary = align_to_grid(data, freq=time_freq)
+        logger.info(format_grid_summary(grid_summary))
+
+        if backend is None:
+            backend = create_backend(backend_name, fixture_dir=fixture_dir)
+        stage_profiler = StageProfiler(top_n=profile_top) if profile else None
+        dc = DataQc(
+            task_id=task_id,
+            data=data,
+            data_type=job["data_type"],
+            ftp=job["site"],
+            qc_indicators=qc_indicators,
+            qc_flag_list=["0", "1", "2"],
+            is_strg=job["is_strg"],
+            despiking_z=job["despiking_z"],
+            longitude=job["longitude"],
+            latitude=job["latitude"],
+            timezone=8,
+            filename=job.get("file") or job["site"],
+            logger=logger,
+            backend=backend,
+            output_profile=output_profile,
+            low_memory=low_memory,
+            profiler=stage_profiler,
+            metrics=metrics,
+        )
+        processed_data = dc.data_qc()
+        if stage_profiler is not None:
+            stage_profiler.close()
+            stage_profiler.write_reports(os.path.splitext(logger.log_file_path)[0])
+
+        output_path = None
+        if output_dir is not None:
+            output_path = output_path_for(
+                os.path.join(
+                    output_dir,
+                    f"{name}_{job['data_type']}_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}",
+                ),
+                output_format,
+            )
+            write_result(
+                processed_data,
+                output_path,
+                output_format,
+                metadata={
+                    "data_type": job["data_type"],
+                    "ftp": job["site"],
+                    "task_id": task_id,
+                    "source_file": ", ".join(
+                        os.path.basename(path) for path in job.get("files") or [job.get("file") or ""]
+                    ),
+                    "params": {
+                        "longitude": job["longitude"],
+                        "latitude": job["latitude"],
+                        "is_strg": job["is_strg"],
+                        "despiking_z": job["despiking_z"],
+                        "timezone": 8,
+                        "time_freq": time_freq,
+                        "backend": backend.name,
+                        "output_profile": output_profile,
+                    },
+                },
+            )
+            logger.info(f"数据处理完成，结果保存至: {output_path}")
+
+        if store_dir:
+            ResultStore(store_dir, logger=logger).upsert(processed_data, job["site"], job["data_type"])
+
+        result.update(status="ok", rows=len(processed_data), output=output_path)
+        if keep_data:
+            result["data"] = processed_data
+        success = True
+    except Exception as e:
+        logger.error(f"程序执行出错: {str(e)}")
+        result["error"] = str(e)
+    finally:
+        if stage_profiler is not None:
+            # 出错时也停止tracemalloc，避免影响工作进程之后的任务
+            stage_profiler.close()
+        result["seconds"] = time.perf_counter() - start
+        write_metrics(metrics, metrics_dir, success, logger)
+        close_logger(logger, success=success)
+    return result
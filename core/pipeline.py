@@ -0,0 +1,252 @@
+"""
+处理流水线模块
+
+DataQc的各处理阶段以Stage声明读取和写入的列，PipelineRunner根据列的读写关系
+确定阶段之间的依赖，按依赖分层执行：互不依赖的阶段可以并发执行，已完成的阶段
+（如从检查点恢复、分块读取时已执行）直接跳过，每个阶段记录耗时和内存变化；
+指定分析器（utils.stage_profiler.StageProfiler）时逐个阶段执行cProfile和tracemalloc
+"""
+import time
+import fnmatch
+import contextvars
+import concurrent.futures
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+from utils.memory import memory_usage
+from utils.metrics import stage_scope
+
+
+@dataclass
+class Stage:
+    """
+    处理阶段
+
+    Attributes:
+        name: 阶段名称
+        func: 处理函数，接收数据并返回处理后的数据
+        inputs: 读取的列（支持通配符，"*"表示全部列）
+        outputs: 写入或删除的列（支持通配符，"*"表示可能改动任意列）
+        message: 执行前输出的日志
+    """
+    name: str
+    func: Callable
+    inputs: List[str] = field(default_factory=list)
+    outputs: List[str] = field(default_factory=list)
+    message: Optional[str] = None
+
+
+def _has_wildcard(pattern):
+    return any(ch in pattern for ch in "*?[")
+
+
+def _overlap(patterns_a, patterns_b):
+    """判断两组列模式是否可能指向同一列，两边都含通配符时保守地视为重叠"""
+    for a in patterns_a:
+        for b in patterns_b:
+            if a == b:
+                return True
+            wild_a, wild_b = _has_wildcard(a), _has_wildcard(b)
+            if wild_a and wild_b:
+                return True
+            if wild_a and fnmatch.fnmatchcase(b, a):
+                return True
+            if wild_b and fnmatch.fnmatchcase(a, b):
+                return True
+    return False
+
+
+def depends_on(later, earlier):
+    """later阶段是否必须在earlier阶段之后执行（写后读、写后写、读后写）"""
+    return (
+        _overlap(earlier.outputs, later.inputs)
+        or _overlap(earlier.outputs, later.outputs)
+        or _overlap(earlier.inputs, later.outputs)
+    )
+
+
+def build_levels(stages):
+    """
+    按依赖关系将阶段分层，同一层的阶段互不依赖
+
+    Args:
+        stages: 按声明顺序排列的阶段列表
+
+    Returns:
+        分层后的阶段列表
+    """
+    levels = []
+    stage_level = {}
+    for i, stage in enumerate(stages):
+        level = 0
+        for earlier in stages[:i]:
+            if depends_on(stage, earlier):
+                level = max(level, stage_level[earlier.name] + 1)
+        stage_level[stage.name] = level
+        while len(levels) <= level:
+            levels.append([])
+        levels[level].append(stage)
+    return levels
+
+
+class PipelineRunner:
+    """按依赖分层执行处理阶段，并记录每个阶段的耗时和内存"""
+
+    def __init__(self, stages, logger, max_workers=1, skip=(), after_stage=None, profiler=None):
+        """
+        初始化流水线
+
+        Args:
+            stages: 阶段列表
+            logger: 日志记录器
+            max_workers: 同一层阶段的最大并发数，默认为1（顺序执行）
+            skip: 已完成、需要跳过的阶段名称
+            after_stage: 每个阶段结束（或跳过）后的回调，参数为 (阶段名称, 数据, 是否跳过)，
+                返回处理后的数据
+            profiler: 阶段性能分析器，指定时各阶段顺序执行（避免并发阶段的统计互相混杂）
+        """
+        self.stages = stages
+        self.logger = logger
+        self.max_workers = max_workers
+        self.skip = set(skip)
+        self.after_stage = after_stage
+        self.profiler = profiler
+        self.records = []
+
+    def _record(self, name, status, seconds, rss_before, rss_after, peak):
+        self.records.append({
+            "stage": name,
+            "status": status,
+            "seconds": seconds,
+            "rss_before_mb": rss_before,
+            "rss_after_mb": rss_after,
+            "peak_mb": peak,
+        })
+
+    def _run_stage(self, stage, data):
+        if stage.message:
+            self.logger.info(stage.message)
+        rss_before, _ = memory_usage()
+        start = time.perf_counter()
+        with stage_scope(stage.name):
+            if self.profiler is None:
+                result = stage.func(data)
+            else:
+                with self.profiler.profile(stage.name):
+                    result = stage.func(data)
+        seconds = time.perf_counter() - start
+        rss_after, peak = memory_usage()
+        self._record(stage.name, "run", seconds, rss_before, rss_after, peak)
+        return result
+
+    def _finish(self, stage, data, skipped):
+        if self.after_stage is not None:
+            data = self.after_stage(stage.name, data, skipped)
+        return data
+
+    def _can_run_concurrently(self, stages):
+        """并发执行的阶段只合并声明的输出列，输出列需为确定的列名"""
+        return (
+            self.max_workers > 1
+            and self.profiler is None
+            and len(stages) > 1
+            and all(stage.outputs and not any(_has_wildcard(p) for p in stage.outputs)
+                    and not any(_has_wildcard(p) for p in stage.inputs)
+                    for stage in stages)
+        )
+
+    def run(self, data):
+        """
+        执行流水线
+
+        Args:
+            data: 输入数据
+
+        Returns:
+            处理后的数据
+        """
+        for level in build_levels(self.stages):
+            pending = []
+            for stage in level:
+                if stage.name in self.skip:
+                    self._record(stage.name, "skipped", 0.0, None, None, None)
+                    data = self._finish(stage, data, True)
+                else:
+                    pending.append(stage)
+
+            if self._can_run_concurrently(pending):
+                with concurrent.futures.ThreadPoolExecutor(
+                    max_workers=min(self.max_workers, len(pending))
+                ) as executor:
+                    # 工作线程中沿用当前上下文（指标收集器等contextvars）
+                    futures = [
+                        executor.submit(
+                            contextvars.copy_context().run, self._run_stage, stage,
+                            data[[col for col in stage.inputs if col in data.columns]].copy()
+                        )
+                        for stage in pending
+                    ]
+                    results = [future.result() for future in futures]
+                for stage, result in zip(pending, results):
+                    for col in stage.outputs:
+                        if col in result.columns:
+                            data[col] = result[col].to_numpy()
+                    data = self._finish(stage, data, False)
+            else:
+                for stage in pending:
+                    data = self._run_stage(stage, data)
+                    data = self._finish(stage, data, False)
+        return data
+
+
+def summarize_records(records):
+    """
+    按阶段汇总耗时和内存记录（分块执行时同一阶段会有多条记录）
+
+    Args:
+        records: PipelineRunner.records
+
+    Returns:
+        汇总后的记录列表，保持阶段首次出现的顺序
+    """
+    summary = {}
+    for record in records:
+        item = summary.setdefault(record["stage"], {
+            "stage": record["stage"], "runs": 0, "skipped": 0, "seconds": 0.0,
+            "rss_delta_mb": 0.0, "peak_mb": None,
+        })
+        if record["status"] == "skipped":
+            item["skipped"] += 1
+            continue
+        item["runs"] += 1
+        item["seconds"] += record["seconds"]
+        if record["rss_before_mb"] is not None and record["rss_after_mb"] is not None:
+            item["rss_delta_mb"] += record["rss_after_mb"] - record["rss_before_mb"]
+        if record["peak_mb"] is not None:
+            item["peak_mb"] = max(item["peak_mb"] or 0.0, record["peak_mb"])
+    return list(summary.values())
+
+
+def log_stage_table(records, logger):
+    """
+    输出各阶段耗时和内存统计表
+
+    Args:
+        records: PipelineRunner.records
+        logger: 日志记录器
+    """
+    if not records:
+        return
+    logger.info("各阶段耗时与内存统计:")
+    logger.info(f"  {'阶段':<28}{'次数':>6}{'耗时(s)':>12}{'内存变化(MB)':>16}{'峰值(MB)':>12}")
+    total = 0.0
+    for item in summarize_records(records):
+        if item["runs"] == 0:
+            logger.info(f"  {item['stage']:<28}{'跳过':>6}")
+            continue
+        peak = f"{item['peak_mb']:.1f}" if item["peak_mb"] is not None else "-"
+        logger.info(
+            f"  {item['stage']:<28}{item['runs']:>6}{item['seconds']:>12.3f}"
+            f"{item['rss_delta_mb']:>+16.1f}{peak:>12}"
+        )
+        total += item["seconds"]
+    logger.info(f"  {'合计':<28}{'':>6}{total:>12.3f}")
@@ -17,7 +17,11 @@ from contextlib import redirect_stdout, redirect_stderr
 import concurrent.futures
 import contextvars
 from core.data_qc import DataQc
-from utils.fill_time import fill_time
+from utils.fill_time import align_to_grid, format_grid_summary
+from utils.ingest import read_data_file
+from utils.result_io import write_result
+from utils.stage_profiler import StageProfiler
+from r_scripts import is_r_available
 
 # pandas兼容性补丁 - 修复iteritems问题
 def _fix_pandas_compatibility():
@@ -61,6 +65,9 @@ R_HOME = get_r_home()
 os.environ["R_HOME"] = R_HOME
 os.environ["PATH"] = os.path.join(R_HOME, "bin", "x64") + os.pathsep + os.environ.get("PATH", "")
 
+# 性能分析报告目录（与命令行程序的默认日志目录一致）
+PROFILE_LOG_DIR = "../logs"
+
 def resource_path(relative_path):
     if hasattr(sys, '_MEIPASS'):
         base_path = sys._MEIPASS
@@ -86,6 +93,7 @@ class DataQCGUI:
         self.latitude = tk.DoubleVar()
         self.is_strg = tk.IntVar(value=0)
         self.despiking_z = tk.DoubleVar(value=4.0)
+        self.profile_enabled = tk.BooleanVar(value=False)
         self.is_processing = False
         
         # GUI日志处理器
@@ -185,6 +193,10 @@ class DataQCGUI:
         ttk.Button(button_frame, text="清空日志", 
                   command=self.clear_log).pack(side=tk.LEFT)
         
+        # 性能分析：对每个处理阶段执行cProfile和tracemalloc，报告写入日志目录
+        ttk.Checkbutton(button_frame, text="性能分析", 
+                       variable=self.profile_enabled).pack(side=tk.LEFT, padx=(10, 0))
+        
         # 进度条
         self.progress = ttk.Progressbar(main_frame, mode='indeterminate')
         self.progress.grid(row=4, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(0, 10))
@@ -218,6 +230,7 @@ class DataQCGUI:
         
         # 存储结果数据
         self.result_data = None
+        self.result_metadata = None
 
     def load_qc_indicators(self):
         """加载QC指标"""
@@ -231,7 +244,7 @@ class DataQCGUI:
             return []
     
     def check_r_environment(self):
-        """检查R语言环境"""
+        """检查R语言环境（R在首次处理flux数据时才加载）"""
         if not R_AVAILABLE:
             self.log_message(f"警告: {R_ERROR_MSG}")
             self.log_message("请检查以下项目:")
@@ -240,7 +253,20 @@ class DataQCGUI:
             self.log_message("3. 确保已安装REddyProc R包: install.packages('REddyProc')")
             self.log_message("4. 检查R_HOME环境变量是否正确设置")
         else:
-            self.log_message("R语言环境检查通过")
+            self.log_message("R语言环境将在处理flux数据时加载")
+
+    def ensure_r_loaded(self):
+        """
+        在主线程中初始化R环境
+
+        R只能在主线程中初始化，后台处理线程直接复用已加载的R
+        """
+        global R_AVAILABLE, R_ERROR_MSG
+        if R_AVAILABLE and not is_r_available():
+            R_AVAILABLE = False
+            R_ERROR_MSG = "R环境初始化失败"
+        self.check_r_environment()
+        return R_AVAILABLE
         
     def browse_file(self):
         """浏览文件"""
@@ -248,6 +274,8 @@ class DataQCGUI:
             title="选择数据文件",
             filetypes=[
                 ("CSV files", "*.csv"),
+                ("Parquet files", "*.parquet"),
+                ("Feather files", "*.feather;*.arrow"),
                 ("Excel files", "*.xlsx;*.xls"),
                 ("All files", "*.*")
             ]
@@ -271,7 +299,7 @@ class DataQCGUI:
     
     def validate_inputs(self):
         """验证输入参数"""
-        if not R_AVAILABLE:
+        if self.data_type.get() == "flux" and not self.ensure_r_loaded():
             messagebox.showerror("错误", f"R语言环境未正确配置:\n{R_ERROR_MSG}\n\n请先安装和配置R语言环境")
             return False
             
@@ -311,6 +339,7 @@ class DataQCGUI:
         
         # 清空之前的结果
         self.result_data = None
+        self.result_metadata = None
         self.result_label.config(text="处理中...")
         
         self.log_message("开始数据质量控制处理")
@@ -337,15 +366,16 @@ class DataQCGUI:
     
     def run_data_qc(self):
         """运行数据质量控制（在后台线程中）"""
+        stage_profiler = None
         try:
-            try:
-                # 在新线程中重新激活pandas转换器
-                from rpy2.robjects import pandas2ri
-                from rpy2.robjects.conversion import localconverter
-                pandas2ri.activate()
-                self.log_message("已在新线程中重新激活pandas转换器")
-            except Exception as e:
-                self.log_message(f"重新激活pandas转换器失败: {str(e)}")
+            if self.data_type.get() == "flux":
+                try:
+                    # 在新线程中重新激活pandas转换器（R已在主线程中加载）
+                    from rpy2.robjects import pandas2ri
+                    pandas2ri.activate()
+                    self.log_message("已在新线程中重新激活pandas转换器")
+                except Exception as e:
+                    self.log_message(f"重新激活pandas转换器失败: {str(e)}")
                 
             # 创建参数对象
             class Args:
@@ -387,7 +417,11 @@ class DataQCGUI:
             # 读取数据
             self.log_message("正在读取数据文件...")
             try:
-                data = pd.read_csv(args.file_path)
+                data = read_data_file(
+                    args.file_path,
+                    qc_indicators=self.qc_indicators,
+                    data_type=args.data_type,
+                )
                 self.log_message(f"数据行数: {len(data)}")
                 if 'record_time' in data.columns:
                     self.log_message(f"数据时间范围：{data['record_time'].min()} 至 {data['record_time'].max()}")
@@ -400,8 +434,10 @@ class DataQCGUI:
             
             # 确保数据文件时间间隔为半小时
             self.log_message("正在处理时间序列...")
-            data, detected_time_freq = fill_time(data, time_freq="auto")
+            data, grid_summary = align_to_grid(data, freq="auto")
+            detected_time_freq = grid_summary["freq"]
             self.log_message(f"检测到的时间间隔: {detected_time_freq}")
+            self.log_message(format_grid_summary(grid_summary))
             
             if not self.is_processing:
                 return
@@ -413,6 +449,7 @@ class DataQCGUI:
             
             # 创建数据质量控制对象
             self.log_message(f"开始执行{args.data_type}类型数据的质量控制...")
+            stage_profiler = StageProfiler() if self.profile_enabled.get() else None
             dc = DataQc(
                 task_id=task_id,
                 data=data,
@@ -428,6 +465,7 @@ class DataQCGUI:
                 filename=args.file_path,
                 logger=self.gui_logger,
                 time_freq=detected_time_freq,
+                profiler=stage_profiler,
             )
             
             if not self.is_processing:
@@ -437,11 +475,35 @@ class DataQCGUI:
             self.log_message("正在执行数据质量控制...")
             processed_data = dc.data_qc()
             
+            if stage_profiler is not None:
+                stage_profiler.close()
+                stage_profiler.log_summary(self.gui_logger)
+                os.makedirs(PROFILE_LOG_DIR, exist_ok=True)
+                report_base = os.path.join(
+                    PROFILE_LOG_DIR, f"{args.ftp}{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}"
+                )
+                profile_path, memory_path = stage_profiler.write_reports(report_base)
+                self.log_message(f"性能分析报告已保存至: {profile_path}, {memory_path}")
+            
             if not self.is_processing:
                 return
             
             # 保存结果数据
             self.result_data = processed_data
+            self.result_metadata = {
+                "data_type": args.data_type,
+                "ftp": args.ftp,
+                "task_id": task_id,
+                "source_file": os.path.basename(args.file_path),
+                "params": {
+                    "longitude": args.longitude,
+                    "latitude": args.latitude,
+                    "is_strg": args.is_strg,
+                    "despiking_z": args.despiking_z,
+                    "timezone": 8,
+                    "time_freq": detected_time_freq,
+                },
+            }
             
             # 生成输出文件名
             timestamp = datetime.datetime.now().strftime('%Y%m%d%H%M%S')
@@ -451,6 +513,8 @@ class DataQCGUI:
             self.root.after(0, self.processing_completed)
             
         except Exception as e:
+            if stage_profiler is not None:
+                stage_profiler.close()
             error_message = f"处理过程中发生错误: {str(e)}"
             self.root.after(0, lambda: self.processing_failed(error_message))
     
@@ -487,6 +551,8 @@ class DataQCGUI:
                 defaultextension=".csv",
                 filetypes=[
                     ("CSV files", "*.csv"),
+                    ("Parquet files", "*.parquet"),
+                    ("Feather files", "*.feather"),
                     ("Excel files", "*.xlsx"),
                     ("All files", "*.*")
                 ]
@@ -494,11 +560,9 @@ class DataQCGUI:
             
             if file_path:
                 try:
-                    # 保存文件
-                    if file_path.endswith('.xlsx'):
-                        self.result_data.to_excel(file_path, index=False)
-                    else:
-                        self.result_data.to_csv(file_path, index=False)
+                    # 保存文件（格式根据扩展名判断）
+                    write_result(self.result_data, file_path,
+                                 metadata=getattr(self, 'result_metadata', None))
                     
                     # 获取完整的绝对路径
                     absolute_path = os.path.abspath(file_path)
@@ -565,6 +629,8 @@ class DataQCGUI:
                 defaultextension=".csv",
                 filetypes=[
                     ("CSV files", "*.csv"),
+                    ("Parquet files", "*.parquet"),
+                    ("Feather files", "*.feather"),
                     ("Excel files", "*.xlsx"),
                     ("All files", "*.*")
                 ]
@@ -572,11 +638,9 @@ class DataQCGUI:
             
         if file_path:
             try:
-                # 保存实际的结果数据
-                if file_path.endswith('.xlsx'):
-                    self.result_data.to_excel(file_path, index=False)
-                else:
-                    self.result_data.to_csv(file_path, index=False)
+                # 保存实际的结果数据（格式根据扩展名判断）
+                write_result(self.result_data, file_path,
+                             metadata=getattr(self, 'result_metadata', None))
                         
                 self.log_message(f"结果已保存到: {file_path}")
                 messagebox.showinfo("成功", f"结果已保存到:\n{file_path}")
@@ -3,14 +3,34 @@
 REddyProc 数据质量控制和处理主程序
 """
 import sys
-import pandas as pd
 import argparse
 import os
 import datetime
-from core.data_qc import DataQc
-from utils.fill_time import fill_time
-from utils.validators import validate_args
-from utils.logging import setup_logger, close_logger
+from utils.timings import timed_import, log_timings
+
+# R环境不在这里加载，只在flux数据插补时按需初始化
+with timed_import("pandas"):
+    import pandas as pd
+with timed_import("ARIMA.arima_imputation"):
+    import ARIMA.arima_imputation
+with timed_import("core.data_qc"):
+    from core.data_qc import DataQc, FLUX_STAGES
+    from config.data_types import read_only_needed
+with timed_import("utils"):
+    from utils.fill_time import align_to_grid, format_grid_summary
+    from utils.ingest import read_data_file, iter_data_chunks, read_data_dir, list_data_files
+    from utils.checkpoints import CheckpointStore, make_run_key
+    from utils.result_io import OUTPUT_FORMATS, output_path_for, write_result
+    from config.constants import OUTPUT_PROFILES
+    from utils.validators import validate_args
+    from utils.logging import LOG_FORMATS, setup_logger, close_logger
+    from utils.stage_cache import StageCache
+    from utils.result_store import ResultStore
+    from utils.incremental import IncrementalState
+    from processors.backends import create_backend
+    from utils.r_profiler import RProfiler
+    from utils.stage_profiler import StageProfiler
+    from utils.metrics import MetricsCollector, write_metrics
 
 
 def main():
@@ -36,15 +56,109 @@ def main():
     parser.add_argument(
         "--despiking-z", "-z", type=float, default=4.0, help="去噪声的z值"
     )
+    parser.add_argument(
+        "--cache-dir", type=str, default=None, help="R插补/分区阶段结果缓存目录，不指定则不缓存"
+    )
+    parser.add_argument(
+        "--cache-size-mb", type=int, default=2048, help="阶段结果缓存容量上限（MB）"
+    )
+    parser.add_argument(
+        "--year-workers", type=int, default=1, help="flux数据R阶段按年份并行的进程数，1表示不拆分"
+    )
+    parser.add_argument(
+        "--stage-workers", type=int, default=1, help="互不依赖的处理阶段的最大并发数，1表示顺序执行"
+    )
+    parser.add_argument(
+        "--year-overlap-days", type=int, default=30, help="按年份拆分时前后重叠的天数"
+    )
+    parser.add_argument(
+        "--backend", type=str, default="r", choices=["r", "replay"],
+        help="flux插补后端：r调用REddyProc，replay读取录制的输出",
+    )
+    parser.add_argument(
+        "--fixture-dir", type=str, default=None, help="replay后端读取录制输出的目录"
+    )
+    parser.add_argument(
+        "--record-fixtures", type=str, default=None, help="将插补后端的输出录制到该目录"
+    )
+    parser.add_argument(
+        "--r-profile", action="store_true",
+        help="统计每次R调用的数据转换、各REddyProc步骤耗时及R端内存变化",
+    )
+    parser.add_argument(
+        "--timings", action="store_true", help="输出各模块导入及R初始化耗时"
+    )
+    parser.add_argument(
+        "--output-format", type=str, default="csv", choices=list(OUTPUT_FORMATS),
+        help="结果文件格式：csv、parquet（zstd压缩）或feather（Arrow IPC）",
+    )
+    parser.add_argument(
+        "--output-profile", type=str, default="full", choices=OUTPUT_PROFILES,
+        help="输出方案：final只输出最终结果，audit额外输出中间列，full输出全部列",
+    )
+    parser.add_argument(
+        "--store-dir", type=str, default=None,
+        help="结果库目录，指定时将本次结果按站点/数据类型/年月分区写入结果库",
+    )
+    parser.add_argument(
+        "--store-compact", action="store_true", help="写入结果库后合并该站点该类型的增量文件"
+    )
+    parser.add_argument(
+        "--checkpoint-dir", type=str, default=None,
+        help="flux阶段检查点目录，指定时各阶段结束后保存Arrow IPC检查点",
+    )
+    parser.add_argument(
+        "--resume-from", type=str, default=None, choices=FLUX_STAGES,
+        help="从指定的flux阶段重新执行，之前的阶段使用最近的检查点（需指定--checkpoint-dir）",
+    )
+    parser.add_argument(
+        "--input-dir", type=str, default=None,
+        help="数据目录，指定时并发读取目录中的多个数据文件并合并（忽略--file-path）",
+    )
+    parser.add_argument(
+        "--input-pattern", type=str, default="*.csv", help="数据目录中文件名的匹配模式"
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=0,
+        help="分块读取的行数，大于0时逐块执行逐行处理的阶段以降低内存占用，0表示一次读取",
+    )
+    parser.add_argument(
+        "--only-needed-columns", action="store_true",
+        help="只读取质量控制会用到的列（输出文件中不再保留其它原始列）",
+    )
+    parser.add_argument(
+        "--incremental-state", type=str, default=None,
+        help="增量处理状态目录，指定时只处理上次处理之后追加的数据（附加必要的上下文），只输出新数据的结果",
+    )
+    parser.add_argument(
+        "--low-memory", action="store_true",
+        help="低内存模式：测量值使用float32，复制出的中间列在被修改前不占用额外内存",
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="对每个处理阶段执行cProfile和tracemalloc，热点和内存报告写入日志目录",
+    )
+    parser.add_argument(
+        "--profile-top", type=int, default=20, help="性能分析报告中每个阶段列出的函数和分配位置数"
+    )
+    parser.add_argument(
+        "--metrics-dir", type=str, default=None,
+        help="运行指标目录，指定时运行结束后写入JSON文件和Prometheus textfile（*.prom）",
+    )
+    parser.add_argument(
+        "--log-format", type=str, default="text", choices=LOG_FORMATS,
+        help="日志文件格式：text为文本，json为JSON lines（由后台线程写入，不阻塞处理）",
+    )
     args = parser.parse_args()
 
     # 初始化日志
-    logger = setup_logger(ftp=args.ftp)
+    logger = setup_logger(ftp=args.ftp, log_format=args.log_format)
+    metrics = None
 
     try:
         logger.info("数据质量控制工具开始运行")
         logger.info(
-            f"参数信息: file-path={args.file_path}, data-type={args.data_type}, "
+            f"参数信息: file-path={args.file_path}, input-dir={args.input_dir}, data-type={args.data_type}, "
             f"ftp={args.ftp}, longitude={args.longitude}, latitude={args.latitude}"
         )
 
@@ -63,26 +177,10 @@ def main():
 
         # 创建任务ID
         task_id = args.ftp + datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+        if args.metrics_dir:
+            metrics = MetricsCollector(args.ftp, args.data_type, task_id)
         logger.info(f"创建任务ID: {task_id}")
 
-        # 读取数据
-        logger.info("开始读取数据文件")
-        if not os.path.exists(args.file_path):
-            logger.error(f"文件 {args.file_path} 不存在")
-            close_logger(logger, success=False)
-            sys.exit(1)
-        try:
-            data = pd.read_csv(args.file_path)
-            logger.info(
-                f"数据时间范围：{data['record_time'].min()} 至 {data['record_time'].max()}"
-            )
-        except Exception as e:
-            logger.error(f"读取数据文件失败: {str(e)}")
-            close_logger(logger, success=False)
-            sys.exit(1)
-        # 确保数据文件时间间隔为半小时
-        data = fill_time(data, time_freq="30min")
-
         # 读取质量控制指标
         logger.info(f"执行{args.data_type}类型数据的质量控制")
         try:
@@ -93,6 +191,147 @@ def main():
             close_logger(logger, success=False)
             sys.exit(1)
 
+        # 读取数据（按质量控制指标构建的schema直接读为float列）
+        logger.info("开始读取数据文件")
+        if not args.input_dir and not os.path.exists(args.file_path):
+            logger.error(f"文件 {args.file_path} 不存在")
+            close_logger(logger, success=False)
+            sys.exit(1)
+        # 数据来源名称，传给R作为文件名
+        source_path = os.path.normpath(args.input_dir) if args.input_dir else args.file_path
+        # 输出方案不包含未使用的原始列时，只读取质量控制需要的列（见 config.data_types）
+        only_needed = args.only_needed_columns or read_only_needed(args.data_type, args.output_profile)
+
+        # 阶段检查点，按源文件内容和处理参数命名
+        checkpoints = None
+        resume_after = None
+        if args.resume_from and not args.checkpoint_dir:
+            logger.error("--resume-from 需要同时指定 --checkpoint-dir")
+            close_logger(logger, success=False)
+            sys.exit(1)
+        if args.checkpoint_dir and args.data_type == "flux":
+            source_paths = (
+                list_data_files(args.input_dir, args.input_pattern)
+                if args.input_dir else [args.file_path]
+            )
+            run_key = make_run_key(source_paths, {
+                "data_type": args.data_type,
+                "ftp": args.ftp,
+                "longitude": args.longitude,
+                "latitude": args.latitude,
+                "is_strg": args.is_strg,
+                "despiking_z": args.despiking_z,
+                "timezone": 8,
+                "output_profile": args.output_profile,
+                "only_needed_columns": only_needed,
+                "backend": args.backend,
+                "qc_indicators": qc_indicators,
+            })
+            checkpoints = CheckpointStore(args.checkpoint_dir, run_key, logger=logger)
+            if args.resume_from:
+                resume_after = checkpoints.find_resume_point(args.resume_from, FLUX_STAGES)
+                if resume_after is None:
+                    logger.warning(f"没有{args.resume_from}之前阶段的检查点，从头开始处理")
+        elif args.checkpoint_dir:
+            logger.warning("检查点只用于flux数据，忽略 --checkpoint-dir")
+
+        # 增量处理状态
+        incremental = None
+        if args.incremental_state:
+            if args.chunk_size > 0 or args.resume_from:
+                logger.error("--incremental-state 不能与 --chunk-size、--resume-from 同时使用")
+                close_logger(logger, success=False)
+                sys.exit(1)
+            incremental = IncrementalState(
+                args.incremental_state, args.ftp, args.data_type, logger=logger
+            )
+
+        time_freq = "30min"
+        chunks = None
+        if resume_after is not None:
+            logger.info(f"从检查点 {resume_after} 继续，跳过数据读取和之前的阶段")
+            data = checkpoints.load(resume_after)
+        elif args.input_dir:
+            try:
+                data, read_summary = read_data_dir(
+                    args.input_dir,
+                    pattern=args.input_pattern,
+                    qc_indicators=qc_indicators,
+                    data_type=args.data_type,
+                    only_needed=only_needed,
+                )
+                logger.info(
+                    f"读取{read_summary['files']}个文件: 共{read_summary['rows_in']}行, "
+                    f"合并后{read_summary['rows_out']}行, {read_summary['columns']}列, "
+                    f"删除重叠时间{read_summary['duplicates_dropped']}行"
+                )
+                logger.info(
+                    f"数据时间范围：{data['record_time'].min()} 至 {data['record_time'].max()}"
+                )
+            except Exception as e:
+                logger.error(f"读取数据目录失败: {str(e)}")
+                close_logger(logger, success=False)
+                sys.exit(1)
+            data, grid_summary = align_to_grid(data, freq=time_freq)
+            logger.info(format_grid_summary(grid_summary))
+        elif args.chunk_size > 0:
+            # 分块读取，逐行处理的阶段在DataQc.load_chunks中逐块执行
+            logger.info(f"分块读取数据，每块{args.chunk_size}行")
+            data = pd.DataFrame()
+            chunks = iter_data_chunks(
+                args.file_path,
+                qc_indicators=qc_indicators,
+                data_type=args.data_type,
+                only_needed=only_needed,
+                chunksize=args.chunk_size,
+            )
+        else:
+            try:
+                data = read_data_file(
+                    args.file_path,
+                    qc_indicators=qc_indicators,
+                    data_type=args.data_type,
+                    only_needed=only_needed,
+                )
+                logger.info(
+                    f"数据时间范围：{data['record_time'].min()} 至 {data['record_time'].max()}"
+                )
+            except Exception as e:
+                logger.error(f"读取数据文件失败: {str(e)}")
+                close_logger(logger, success=False)
+                sys.exit(1)
+            # 确保数据文件时间间隔为半小时
+            data, grid_summary = align_to_grid(data, freq=time_freq)
+            logger.info(format_grid_summary(grid_summary))
+
+        if incremental is not None:
+            data, new_rows = incremental.select(data)
+            if new_rows == 0:
+                logger.info("没有新数据，无需处理")
+                close_logger(logger, success=True)
+                return pd.DataFrame()
+
+        # 阶段结果缓存
+        stage_cache = None
+        if args.cache_dir:
+            stage_cache = StageCache(
+                args.cache_dir, max_bytes=args.cache_size_mb * 1024 * 1024, logger=logger
+            )
+            logger.info(f"启用阶段结果缓存: {args.cache_dir}")
+
+        # 插补后端
+        r_profiler = RProfiler() if args.r_profile else None
+        backend = create_backend(
+            args.backend,
+            fixture_dir=args.fixture_dir,
+            record_dir=args.record_fixtures,
+            profiler=r_profiler,
+        )
+        logger.info(f"使用插补后端: {backend.name}")
+
+        # 阶段性能分析
+        stage_profiler = StageProfiler(top_n=args.profile_top) if args.profile else None
+
         # 数据质量控制
         dc = DataQc(
             task_id=task_id,
@@ -106,23 +345,103 @@ def main():
             longitude=args.longitude,
             latitude=args.latitude,
             timezone=8,
-            filename=args.file_path,
+            filename=source_path,
             logger=logger,
+            stage_cache=stage_cache,
+            year_workers=args.year_workers,
+            year_overlap_days=args.year_overlap_days,
+            backend=backend,
+            output_profile=args.output_profile,
+            checkpoints=checkpoints,
+            resume_after=resume_after,
+            stage_workers=args.stage_workers,
+            arima_orders=incremental.arima_orders if incremental is not None else None,
+            grow_calendar=incremental.grow_calendar if incremental is not None else None,
+            low_memory=args.low_memory,
+            profiler=stage_profiler,
+            metrics=metrics,
         )
 
+        if chunks is not None:
+            try:
+                grid_summary = dc.load_chunks(chunks, time_freq=time_freq)
+            except Exception as e:
+                logger.error(f"读取数据文件失败: {str(e)}")
+                close_logger(logger, success=False)
+                sys.exit(1)
+            logger.info(format_grid_summary(grid_summary))
+            logger.info(f"数据时间范围：{dc.data_start_time} 至 {dc.data_end_time}")
+
         # 执行质量控制
         processed_data = dc.data_qc()
+        if incremental is not None:
+            # 只输出新数据的结果，之前时段的结果保持不变
+            processed_data = incremental.new_rows(processed_data)
+            if metrics is not None:
+                metrics.rows_out = len(processed_data)
+
+        if stage_profiler is not None:
+            stage_profiler.close()
+            stage_profiler.log_summary(logger)
+            profile_path, memory_path = stage_profiler.write_reports(
+                os.path.splitext(logger.log_file_path)[0]
+            )
+            logger.info(f"性能分析报告已保存至: {profile_path}, {memory_path}")
 
         # 保存处理后的数据
-        output_path = f"{args.ftp}_{args.data_type}_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}.csv"
-        processed_data.to_csv(output_path, index=False)
+        output_path = output_path_for(
+            f"{args.ftp}_{args.data_type}_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}",
+            args.output_format,
+        )
+        write_result(
+            processed_data,
+            output_path,
+            args.output_format,
+            metadata={
+                "data_type": args.data_type,
+                "ftp": args.ftp,
+                "task_id": task_id,
+                "source_file": os.path.basename(source_path),
+                "params": {
+                    "longitude": args.longitude,
+                    "latitude": args.latitude,
+                    "is_strg": args.is_strg,
+                    "despiking_z": args.despiking_z,
+                    "timezone": 8,
+                    "time_freq": time_freq,
+                    "backend": backend.name,
+                    "output_profile": args.output_profile,
+                },
+            },
+        )
         logger.info(f"数据处理完成，结果保存至: {output_path}")
 
+        # 写入结果库
+        if args.store_dir:
+            store = ResultStore(args.store_dir, logger=logger)
+            store.upsert(processed_data, args.ftp, args.data_type)
+            if args.store_compact:
+                store.compact(ftp=args.ftp, data_type=args.data_type)
+
+        if incremental is not None:
+            incremental.save(processed_data)
+
+        if r_profiler is not None:
+            r_profiler.log_summary(logger)
+            profile_path = os.path.splitext(logger.log_file_path)[0] + "_r_profile.json"
+            r_profiler.write_json(profile_path)
+            logger.info(f"R调用耗时统计已保存至: {profile_path}")
+
+        if args.timings:
+            log_timings(logger)
+
+        write_metrics(metrics, args.metrics_dir, True, logger)
         close_logger(logger, success=True)
         return processed_data
 
     except Exception as e:
         logger.error(f"程序执行出错: {str(e)}")
+        write_metrics(metrics, args.metrics_dir, False, logger)
         close_logger(logger, success=False)
         sys.exit(1)
 
@@ -4,11 +4,14 @@
 import numpy as np
 import pandas as pd
 from utils.data_helpers import judge_day_night
+from utils.timestamps import ensure_datetime
+from utils.metrics import record_flagged
 
 
 def del_abnormal_data(raw_data, ta_name="ta_1_2_1_threshold_limit", 
                       par_name="ppfd_1_1_1_threshold_limit",
-                      nee_name="co2_flux_threshold_limit"):
+                      nee_name="co2_flux_threshold_limit",
+                      grow_calendar=None):
     """
     删除异常值
     
@@ -17,6 +20,8 @@ def del_abnormal_data(raw_data, ta_name="ta_1_2_1_threshold_limit",
         ta_name: 温度列名
         par_name: 光合有效辐射列名
         nee_name: NEE列名
+        grow_calendar: 生长季日历 {日期: 0/1}，已有的日期沿用其中的结果，
+            3天平均温度窗口完整的日期会写入日历，默认不使用
         
     Returns:
         处理后的数据
@@ -28,7 +33,7 @@ def del_abnormal_data(raw_data, ta_name="ta_1_2_1_threshold_limit",
     df[nee_name + "_old"] = df[nee_name]
     
     if ta_name in df.columns and 'record_time' in df.columns:
-        df['record_time'] = pd.to_datetime(df['record_time'])
+        df['record_time'] = ensure_datetime(df['record_time'])
         df['date'] = df['record_time'].dt.date
         
         # 计算每日的平均温度
@@ -41,6 +46,7 @@ def del_abnormal_data(raw_data, ta_name="ta_1_2_1_threshold_limit",
 
         # 滚动平均计算3天平均温度
         daily_df['ta_three_avg'] = daily_df['day_avg_tair'].rolling(window=3, min_periods=3, center=True).mean()
+        window_complete = daily_df['ta_three_avg'].notna()
         
         # 处理前后的NaN值
         first_non_nan = daily_df['ta_three_avg'].first_valid_index()
@@ -62,6 +68,15 @@ def del_abnormal_data(raw_data, ta_name="ta_1_2_1_threshold_limit",
         # 判断是否是生长季（温度是否大于等于5℃）
         daily_df['is_grow_season'] = (daily_df['ta_three_avg'] >= 5).astype(int)
 
+        if grow_calendar is not None:
+            # 增量处理时，之前已确定的日期沿用日历中的结果
+            dates = daily_df['date'].astype(str)
+            known = dates.map(grow_calendar)
+            daily_df['is_grow_season'] = known.fillna(daily_df['is_grow_season']).astype(int)
+            for date, flag, complete in zip(dates, daily_df['is_grow_season'], window_complete):
+                if complete:
+                    grow_calendar.setdefault(date, int(flag))
+
         # 合并生长季信息到原数据
         df = df.merge(daily_df[['date', 'is_grow_season']], on='date', how='left')
 
@@ -73,6 +88,7 @@ def del_abnormal_data(raw_data, ta_name="ta_1_2_1_threshold_limit",
             ((df['is_day_night'] == 0) & (df[nee_name] < -0.2) & (df['is_grow_season'] == 0))
         )
         df.loc[condition, nee_name] = pd.NA
+        record_flagged(nee_name, condition.sum())
 
         # 删除辅助列
         df.drop(['date', 'is_grow_season'], axis=1, inplace=True)
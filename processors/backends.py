@@ -0,0 +1,337 @@
+"""
+插补后端模块
+
+flux流程中依赖REddyProc的三类操作（Par插补、指标MDS插补、u*筛选+插补+分区）
+通过统一的后端接口调用：
+- RBackend: 通过rpy2调用REddyProc（默认）
+- ReplayBackend: 从磁盘读取预先录制的输出，无需R即可运行和测试Python侧流程
+- RecordingBackend: 包装其它后端，将其输出录制到磁盘供ReplayBackend使用
+- SerializedBackend: 包装其它后端，多线程共用同一R解释器时串行调用
+
+后端方法接收已整理为R列名（DateTime、rH、Rg、Tair、VPD等）的DataFrame，
+返回“输入列 + REddyProc输出列”形式的DataFrame
+"""
+import os
+import time
+import contextlib
+import threading
+from abc import ABC, abstractmethod
+import pandas as pd
+from r_scripts import load_r
+from utils.stage_cache import content_key
+from utils.memory import upcast_floats
+from utils.metrics import record_r_call
+
+# 各操作中决定输出结果的输入列（插补指标列另行追加）
+FILL_PAR_COLUMNS = ['DateTime', 'rH', 'Rg', 'Tair', 'VPD', 'Par']
+MDS_DRIVER_COLUMNS = ['DateTime', 'rH', 'Rg', 'Tair', 'VPD']
+USTAR_COLUMNS = ['DateTime', 'NEE', 'rH', 'Rg', 'Tair', 'VPD', 'u__threshold_limit']
+
+
+def operation_columns(operation, indicators=None):
+    """
+    获取某个操作中决定输出结果的输入列
+
+    Args:
+        operation: 操作名称（fill_par、fill_indicators、ustar_partition）
+        indicators: 插补指标列表
+
+    Returns:
+        输入列名列表
+    """
+    indicators = list(indicators or [])
+    if operation == 'fill_par':
+        return FILL_PAR_COLUMNS
+    elif operation == 'fill_indicators':
+        return MDS_DRIVER_COLUMNS + indicators
+    elif operation == 'ustar_partition':
+        return USTAR_COLUMNS + indicators
+    raise ValueError(f"未知的插补操作: {operation}")
+
+
+class GapFillBackend(ABC):
+    """插补后端接口，子类需实现全部三个操作，否则实例化时报错"""
+
+    name = "base"
+    # R调用统计（RProfiler），只有r后端使用
+    profiler = None
+
+    @abstractmethod
+    def fill_par(self, file_name, longitude, latitude, timezone, data):
+        """
+        插补Par（光合有效辐射）
+
+        Args:
+            file_name: 文件名
+            longitude: 经度
+            latitude: 纬度
+            timezone: 时区
+            data: R格式的数据DataFrame
+
+        Returns:
+            输入列和插补结果列组成的DataFrame
+        """
+
+    @abstractmethod
+    def fill_indicators(self, file_name, longitude, latitude, timezone, data, indicators):
+        """
+        对指定指标进行MDS插补
+
+        Args:
+            file_name: 文件名
+            longitude: 经度
+            latitude: 纬度
+            timezone: 时区
+            data: R格式的数据DataFrame
+            indicators: 需要插补的列名列表
+
+        Returns:
+            输入列和插补结果列组成的DataFrame
+        """
+
+    @abstractmethod
+    def ustar_partition(self, file_name, longitude, latitude, timezone, data, indicators):
+        """
+        对NEE进行u*筛选、插补和分区，并对指定指标进行MDS插补
+
+        Args:
+            file_name: 文件名
+            longitude: 经度
+            latitude: 纬度
+            timezone: 时区
+            data: R格式的数据DataFrame
+            indicators: 需要插补的列名列表
+
+        Returns:
+            输入列和处理结果列组成的DataFrame
+        """
+
+
+class RBackend(GapFillBackend):
+    """通过rpy2调用REddyProc的后端"""
+
+    name = "r"
+
+    def __init__(self, profiler=None):
+        """
+        初始化R后端
+
+        Args:
+            profiler: RProfiler实例，指定时记录每次调用的耗时和R端内存变化
+        """
+        self.profiler = profiler
+
+    def _measure(self, function_name, step):
+        """统计Python端一个步骤的耗时，未指定profiler时不统计"""
+        if self.profiler is None:
+            return contextlib.nullcontext()
+        return self.profiler.measure(function_name, step)
+
+    def _call(self, function_name, file_name, longitude, latitude, timezone, data, *extra):
+        r = load_r()
+        r.pandas2ri.activate()
+        profiler = self.profiler
+        if profiler is not None:
+            r.robjects.r('options(qc.profile=TRUE)')
+            r.robjects.r['qc_profile_reset']()
+
+        try:
+            # 转换为R对象
+            r_filename = r.StrVector([file_name])
+            r_longitude = r.FloatVector([longitude])
+            r_latitude = r.FloatVector([latitude])
+            r_timezone = r.IntVector([timezone])
+
+            # 使用localconverter来转换DataFrame（R只有双精度，低内存模式的float32列先转回float64）
+            call_start = time.perf_counter()
+            with self._measure(function_name, "py2rpy"):
+                data = upcast_floats(data)
+                with r.localconverter(r.robjects.default_converter + r.pandas2ri.converter):
+                    data_r = r.robjects.conversion.py2rpy(data)
+
+            # 调用R函数
+            with self._measure(function_name, "r_call"):
+                result_r = r.robjects.r[function_name](
+                    r_filename, r_longitude, r_latitude, r_timezone, data_r, *extra
+                )
+
+            # 将R结果转回Python（这里ns 和ns Shanghai 不可直接合并，后续需要去掉时区）
+            with self._measure(function_name, "rpy2py"):
+                with r.localconverter(r.robjects.default_converter + r.pandas2ri.converter):
+                    result = r.robjects.conversion.rpy2py(result_r)
+            record_r_call(function_name, time.perf_counter() - call_start)
+
+            if profiler is not None:
+                with r.localconverter(r.robjects.default_converter + r.pandas2ri.converter):
+                    r_records = r.robjects.conversion.rpy2py(r.robjects.r['qc_profile_records']())
+                profiler.add_r_records(function_name, r_records)
+        finally:
+            # R出错时也关闭统计，避免常驻进程中之后的调用继续统计
+            if profiler is not None:
+                r.robjects.r('options(qc.profile=FALSE)')
+        return result
+
+    def fill_par(self, file_name, longitude, latitude, timezone, data):
+        return self._call('r_gap_fill_par', file_name, longitude, latitude, timezone, data)
+
+    def fill_indicators(self, file_name, longitude, latitude, timezone, data, indicators):
+        r = load_r()
+        return self._call('r_gap_fill_all', file_name, longitude, latitude, timezone, data,
+                          r.StrVector(indicators))
+
+    def ustar_partition(self, file_name, longitude, latitude, timezone, data, indicators):
+        r = load_r()
+        return self._call('r_co2_flux', file_name, longitude, latitude, timezone, data,
+                          r.StrVector(indicators))
+
+
+def _fixture_key(operation, longitude, latitude, timezone, data, indicators=None):
+    """计算录制输出的内容哈希键"""
+    params = {'longitude': longitude, 'latitude': latitude, 'timezone': timezone,
+              'indicators': list(indicators or [])}
+    return content_key(operation, data, operation_columns(operation, indicators), params)
+
+
+class ReplayBackend(GapFillBackend):
+    """
+    从磁盘读取录制输出的后端
+
+    录制文件按输入内容哈希命名，输入数据与录制时不一致会找不到对应文件
+    """
+
+    name = "replay"
+
+    def __init__(self, fixture_dir):
+        """
+        初始化回放后端
+
+        Args:
+            fixture_dir: 录制文件目录
+        """
+        self.fixture_dir = fixture_dir
+
+    def _replay(self, operation, longitude, latitude, timezone, data, indicators=None):
+        key = _fixture_key(operation, longitude, latitude, timezone, data, indicators)
+        path = os.path.join(self.fixture_dir, f"{key}.parquet")
+        if not os.path.exists(path):
+            raise FileNotFoundError(
+                f"没有找到{operation}的录制输出: {path}，请先用RecordingBackend录制"
+            )
+        exports = pd.read_parquet(path)
+        return pd.concat([data.reset_index(drop=True), exports], axis=1)
+
+    def fill_par(self, file_name, longitude, latitude, timezone, data):
+        return self._replay('fill_par', longitude, latitude, timezone, data)
+
+    def fill_indicators(self, file_name, longitude, latitude, timezone, data, indicators):
+        return self._replay('fill_indicators', longitude, latitude, timezone, data, indicators)
+
+    def ustar_partition(self, file_name, longitude, latitude, timezone, data, indicators):
+        return self._replay('ustar_partition', longitude, latitude, timezone, data, indicators)
+
+
+class RecordingBackend(GapFillBackend):
+    """包装其它后端，将其输出录制到磁盘"""
+
+    name = "recording"
+
+    def __init__(self, inner, fixture_dir):
+        """
+        初始化录制后端
+
+        Args:
+            inner: 实际执行计算的后端
+            fixture_dir: 录制文件目录
+        """
+        self.inner = inner
+        self.fixture_dir = fixture_dir
+        os.makedirs(fixture_dir, exist_ok=True)
+
+    @property
+    def profiler(self):
+        return self.inner.profiler
+
+    def _record(self, operation, longitude, latitude, timezone, data, result, indicators=None):
+        key = _fixture_key(operation, longitude, latitude, timezone, data, indicators)
+        new_columns = [col for col in result.columns if col not in data.columns]
+        result[new_columns].reset_index(drop=True).to_parquet(
+            os.path.join(self.fixture_dir, f"{key}.parquet"), index=False
+        )
+        return result
+
+    def fill_par(self, file_name, longitude, latitude, timezone, data):
+        result = self.inner.fill_par(file_name, longitude, latitude, timezone, data)
+        return self._record('fill_par', longitude, latitude, timezone, data, result)
+
+    def fill_indicators(self, file_name, longitude, latitude, timezone, data, indicators):
+        result = self.inner.fill_indicators(file_name, longitude, latitude, timezone, data,
+                                            indicators)
+        return self._record('fill_indicators', longitude, latitude, timezone, data, result,
+                            indicators)
+
+    def ustar_partition(self, file_name, longitude, latitude, timezone, data, indicators):
+        result = self.inner.ustar_partition(file_name, longitude, latitude, timezone, data,
+                                            indicators)
+        return self._record('ustar_partition', longitude, latitude, timezone, data, result,
+                            indicators)
+
+
+class SerializedBackend(GapFillBackend):
+    """包装其它后端，同一时间只允许一个线程调用（嵌入的R解释器不支持多线程并发调用）"""
+
+    def __init__(self, inner, lock=None):
+        """
+        初始化串行化后端
+
+        Args:
+            inner: 实际执行计算的后端
+            lock: 共用的锁，默认新建
+        """
+        self.inner = inner
+        self.lock = lock or threading.Lock()
+        self.name = inner.name
+
+    @property
+    def profiler(self):
+        return self.inner.profiler
+
+    def fill_par(self, file_name, longitude, latitude, timezone, data):
+        with self.lock:
+            return self.inner.fill_par(file_name, longitude, latitude, timezone, data)
+
+    def fill_indicators(self, file_name, longitude, latitude, timezone, data, indicators):
+        with self.lock:
+            return self.inner.fill_indicators(file_name, longitude, latitude, timezone, data,
+                                              indicators)
+
+    def ustar_partition(self, file_name, longitude, latitude, timezone, data, indicators):
+        with self.lock:
+            return self.inner.ustar_partition(file_name, longitude, latitude, timezone, data,
+                                              indicators)
+
+
+def create_backend(name="r", fixture_dir=None, record_dir=None, profiler=None):
+    """
+    根据名称创建插补后端
+
+    Args:
+        name: 后端名称（r 或 replay）
+        fixture_dir: replay后端读取录制文件的目录
+        record_dir: 指定时将后端输出录制到该目录
+        profiler: RProfiler实例，仅对r后端生效
+
+    Returns:
+        GapFillBackend实例
+    """
+    if name == "r":
+        backend = RBackend(profiler=profiler)
+    elif name == "replay":
+        if not fixture_dir:
+            raise ValueError("replay后端需要指定录制文件目录")
+        backend = ReplayBackend(fixture_dir)
+    else:
+        raise ValueError(f"未知的插补后端: {name}")
+
+    if record_dir:
+        backend = RecordingBackend(backend, record_dir)
+    return backend
@@ -5,6 +5,7 @@ import numpy as np
 import pandas as pd
 from utils.data_helpers import judge_day_night, add_window_tag, calculate_diff, set_data_nan
 from processors.md_mad import md_method, mad_method
+from utils.metrics import record_flagged
 
 
 def despiking_data(data, despiking_z=4):
@@ -31,8 +32,10 @@ def despiking_data(data, despiking_z=4):
     variables = ['co2', 'h2o', 'le', 'h']
     for var in variables:
         var_column = f'{var}_despiking'
-        # 筛选非空数据
-        window_data = data[data[var_column].notnull()].reset_index(drop=True)
+        # 筛选非空数据，只保留去尖峰用到的列（各窗口的分组中位数只需要这几列）
+        window_data = data.loc[
+            data[var_column].notnull(), ['record_time', 'is_day_night', var_column]
+        ].reset_index(drop=True)
         
         # 添加窗口标签
         window_data, _, window_nums = add_window_tag(window_data)
@@ -108,5 +111,6 @@ def process_variable_despiking(data, window_data, var_name, window_nums, despiki
             spike_times = window_data.loc[condition, 'record_time'].tolist()
             data_condition = data['record_time'].isin(spike_times)
             data = set_data_nan(data, data_condition, despiking_col)
+            record_flagged(despiking_col, data_condition.sum())
     
     return data
\ No newline at end of file
@@ -4,11 +4,12 @@
 import re
 import pandas as pd
 import numpy as np
-from r_scripts import robjects, StrVector, FloatVector, IntVector, pandas2ri
-from rpy2.robjects.conversion import localconverter
+from processors.backends import RBackend, operation_columns
+from utils.stage_cache import cached_exports
+from utils.timestamps import ensure_datetime
 
 
-def gap_fill_par(file_name, longitude, latitude, timezone, data):
+def gap_fill_par(file_name, longitude, latitude, timezone, data, stage_cache=None, backend=None):
     """
     插补Par（光合有效辐射）
     
@@ -18,12 +19,14 @@ def gap_fill_par(file_name, longitude, latitude, timezone, data):
         latitude: 纬度
         timezone: 时区
         data: 数据DataFrame
+        stage_cache: 阶段结果缓存，为None时不使用缓存
+        backend: 插补后端（GapFillBackend），默认使用R
         
     Returns:
         插补后的数据
     """
     # 将数据转化成R语言需要的格式
-    data['record_time'] = pd.to_datetime(data['record_time'])
+    data['record_time'] = ensure_datetime(data['record_time'])
     data = data.rename(columns={"record_time": "DateTime"})
     
     # 准备R需要的变量
@@ -33,22 +36,16 @@ def gap_fill_par(file_name, longitude, latitude, timezone, data):
     data['VPD'] = data['vpd_threshold_limit'] * 0.01 if 'vpd_threshold_limit' in data.columns else np.nan
     data['Par'] = data['ppfd_1_1_1_threshold_limit'] if 'ppfd_1_1_1_threshold_limit' in data.columns else np.nan
  
-    # 转换为R对象
-    r_filename = StrVector([file_name])
-    r_longitude = FloatVector([longitude])
-    r_latitude = FloatVector([latitude])
-    r_timezone = IntVector([timezone])
-    
-    # 使用localconverter来转换DataFrame
-    with localconverter(robjects.default_converter + pandas2ri.converter):
-        data_r = robjects.conversion.py2rpy(data)
-    
-    # 调用R函数
-    result_data = robjects.r['r_gap_fill_par'](r_filename, r_longitude, r_latitude, r_timezone, data_r)
+    backend = backend or RBackend()
 
-    # 将R结果转回Python
-    with localconverter(robjects.default_converter + pandas2ri.converter):
-        result_data = robjects.conversion.rpy2py(result_data)
+    def compute():
+        return backend.fill_par(file_name, longitude, latitude, timezone, data)
+
+    # 只缓存R新增的插补结果列，其余列直接沿用输入数据
+    params = {'longitude': longitude, 'latitude': latitude, 'timezone': timezone}
+    exports = cached_exports(stage_cache, 'gap_fill_par', data, operation_columns('fill_par'),
+                             params, compute)
+    result_data = pd.concat([data.reset_index(drop=True), exports], axis=1)
         
     # 处理结果数据
     result_data = result_data.rename(columns={"DateTime": "record_time"})
@@ -65,8 +62,8 @@ def gap_fill_par(file_name, longitude, latitude, timezone, data):
     return result_data
 
 
-def gapfill(file_name,longitude,latitude,timezone,data,qc_indicators,data_type):
-    data['record_time'] = pd.to_datetime(data['record_time'])
+def gapfill(file_name,longitude,latitude,timezone,data,qc_indicators,data_type,stage_cache=None,backend=None):
+    data['record_time'] = ensure_datetime(data['record_time'])
     data = data.rename(columns={'record_time': 'DateTime'})
 
     data['rH'] = data['rh_threshold_limit']
@@ -75,14 +72,6 @@ def gapfill(file_name,longitude,latitude,timezone,data,qc_indicators,data_type):
     # VPD pa to hpa
     data['VPD'] = data['vpd_threshold_limit'] * 0.01
 
-    # 先把传入的参数给处理掉
-    # print(longitude, latitude, timezone)
-    r_filename = StrVector([file_name])
-    r_longitude = FloatVector([longitude])
-    r_latitude = FloatVector([latitude])
-    r_timezone = IntVector([timezone])
-    data_r = pandas2ri.py2rpy(data)
-
     # gapfilling indicators  这里是这个表里仅有的那几个指标而不是所有的指标都gapfilling 因为有的站没有一些指标
     gapfill_indicators = []
     for i in qc_indicators:
@@ -97,16 +86,21 @@ def gapfill(file_name,longitude,latitude,timezone,data,qc_indicators,data_type):
             else:
                 if i['belong_to'] == data_type and i['code'] in data.columns:
                     gapfill_indicators.append(i['code'] + '_threshold_limit')
-    result_data = robjects.r['r_gap_fill_all'](r_filename,
-                                                           r_longitude,
-                                                           r_latitude,
-                                                           r_timezone, data_r,
-                                                           gapfill_indicators)
+
+    backend = backend or RBackend()
+
+    def compute():
+        return backend.fill_indicators(file_name, longitude, latitude, timezone, data,
+                                       gapfill_indicators)
+
+    params = {'longitude': longitude, 'latitude': latitude, 'timezone': timezone,
+              'indicators': gapfill_indicators}
+    exports = cached_exports(stage_cache, 'gapfill', data,
+                             operation_columns('fill_indicators', gapfill_indicators),
+                             params, compute)
+    result_data = pd.concat([data.reset_index(drop=True), exports], axis=1)
 
     # 设置index
-    # 这里ns 和ns Shanghai 不可直接合并，所以要转一下
-    with localconverter(robjects.default_converter + pandas2ri.converter):
-        result_data = robjects.conversion.rpy2py(result_data)
 
     result_data = result_data.rename(columns={'DateTime': 'record_time'})
     result_data['record_time'] = result_data['record_time'].dt.tz_localize(
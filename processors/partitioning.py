@@ -2,12 +2,14 @@
 数据分区模块
 """
 import pandas as pd
-from r_scripts import robjects, StrVector, FloatVector, IntVector, pandas2ri
-from rpy2.robjects.conversion import localconverter
 from config.constants import DEL_LIST, NO_USE_LIST
+from processors.backends import RBackend, operation_columns
+from utils.stage_cache import cached_exports
+from utils.timestamps import ensure_datetime
 
 
-def ustar_data(file_name, longitude, latitude, timezone, data, qc_indicators):
+def ustar_data(file_name, longitude, latitude, timezone, data, qc_indicators, stage_cache=None,
+               backend=None):
     """
     执行u*筛选、插补和分区
     
@@ -18,12 +20,14 @@ def ustar_data(file_name, longitude, latitude, timezone, data, qc_indicators):
         timezone: 时区
         data: 数据DataFrame
         qc_indicators: 质量控制指标
+        stage_cache: 阶段结果缓存，为None时不使用缓存
+        backend: 插补后端（GapFillBackend），默认使用R
         
     Returns:
         处理后的数据
     """
     # 格式化时间
-    data['record_time'] = pd.to_datetime(data['record_time'])
+    data['record_time'] = ensure_datetime(data['record_time'])
     
     # 重命名列为R格式
     data = data.rename(columns={'record_time': 'DateTime'})
@@ -35,13 +39,6 @@ def ustar_data(file_name, longitude, latitude, timezone, data, qc_indicators):
     data['Tair'] = data['ta_1_2_1_threshold_limit']
     data['VPD'] = data['vpd_threshold_limit'] * 0.01  # Pa to hPa
     
-    # 准备R函数参数
-    pandas2ri.activate()
-    r_filename = StrVector([file_name])
-    r_longitude = FloatVector([longitude])
-    r_latitude = FloatVector([latitude])
-    r_timezone = IntVector([timezone])
-    
     # 准备插补指标
     gapfill_indicators = []
     for indicator in qc_indicators:
@@ -52,19 +49,19 @@ def ustar_data(file_name, longitude, latitude, timezone, data, qc_indicators):
     # 添加其他需要插补的指标
     gapfill_indicators += ['h2o_despiking', 'le_despiking', 'h_despiking']
     
-    # 转换数据为R格式
-    with localconverter(robjects.default_converter + pandas2ri.converter):
-        data_r = robjects.conversion.py2rpy(data)
-    r_gapfill_indicators = StrVector(gapfill_indicators)
-    
-    # 调用R函数
-    result_data = robjects.r['r_co2_flux'](
-        r_filename, r_longitude, r_latitude, r_timezone, data_r, r_gapfill_indicators
-    )
-    
-    # 将R结果转回Python
-    with localconverter(robjects.default_converter + pandas2ri.converter):
-        result_data = robjects.conversion.rpy2py(result_data)
+    backend = backend or RBackend()
+
+    def compute():
+        return backend.ustar_partition(file_name, longitude, latitude, timezone, data,
+                                       gapfill_indicators)
+
+    # 只缓存R新增的结果列，despiking阈值等参数不变时直接复用
+    params = {'longitude': longitude, 'latitude': latitude, 'timezone': timezone,
+              'indicators': gapfill_indicators}
+    exports = cached_exports(stage_cache, 'ustar_data', data,
+                             operation_columns('ustar_partition', gapfill_indicators),
+                             params, compute)
+    result_data = pd.concat([data.reset_index(drop=True), exports], axis=1)
     
     # 处理结果数据
     result_data = result_data.rename(columns={'DateTime': 'record_time'})
@@ -1,31 +1,14 @@
 """
 阈值处理模块
+
+各数据类型使用的阈值处理函数在 config.data_types 中注册
 """
 import re
 import numpy as np
 import pandas as pd
-
-
-def threshold_limit(data, qc_indicators, data_type):
-    """
-    基于阈值对数据进行筛选
-    
-    Args:
-        data: 数据DataFrame
-        qc_indicators: 所有质量控制指标
-        data_type: 数据类型
-        
-    Returns:
-        阈值处理后的数据
-    """
-    if data_type == 'flux':
-        return threshold_limit_flux(data, qc_indicators)
-    elif data_type == 'sapflow':
-        return threshold_limit_sapflow(data, qc_indicators)
-    elif data_type == 'aqi':
-        return threshold_limit_aqi(data, qc_indicators)
-    else:
-        return threshold_limit_general(data, qc_indicators, data_type)
+from utils.timestamps import ensure_datetime
+from utils.metrics import record_flagged
+from utils.logging import get_task_logger
 
 
 def threshold_limit_flux(data, qc_indicators):
@@ -68,15 +51,17 @@ def threshold_limit_flux(data, qc_indicators):
                         condition = (data[add_strg_col] < limits['lower']) | (data[add_strg_col] > limits['upper'])
                         data[threshold_col] = data[add_strg_col]
                         data.loc[condition, threshold_col] = np.nan
+                        record_flagged(threshold_col, condition.sum())
                 else:
                     # 对其他变量处理
                     threshold_col = col + "_threshold_limit"
                     condition = (data[col] < limits['lower']) | (data[col] > limits['upper'])
                     data[threshold_col] = data[col]
                     data.loc[condition, threshold_col] = np.nan
+                    record_flagged(threshold_col, condition.sum())
         return data
     except Exception as e:
-        print(f"阈值处理出错: {e}")
+        get_task_logger().error(f"阈值处理出错: {e}")
         return data
 
 
@@ -106,13 +91,15 @@ def threshold_limit_general(data, qc_indicators, data_type):
                         condition = (data[col] < float(indicator['qc_lower_limit'])) | (data[col] > float(indicator['qc_upper_limit']))
                         # 直接在原列上设置NaN，而不是创建新列
                         data.loc[condition, col] = np.nan
+                        record_flagged(col, condition.sum())
                 else:
                     if indicator['code'] == col:
                         condition = (data[col] < float(indicator['qc_lower_limit'])) | (data[col] > float(indicator['qc_upper_limit']))
                         # 直接在原列上设置NaN，而不是创建新列
                         data.loc[condition, col] = np.nan
+                        record_flagged(col, condition.sum())
     except Exception as e:
-        print(f"阈值处理出错: {e}")
+        get_task_logger().error(f"阈值处理出错: {e}")
     
     return data
 
@@ -161,7 +148,7 @@ def threshold_limit_aqi(data, qc_indicators):
     
     # 补半点数据将用前后整点数据的均值来插补，若前后至少有一个是NaN那么这个半点的数据就是NaN
     # 将时间设为index
-    data = data.set_index(pd.to_datetime(data['record_time'])).drop('record_time', axis=1)
+    data = data.set_index(ensure_datetime(data['record_time'])).drop('record_time', axis=1)
     
     # 补全时间序列 半点数据置为NaN
     data = data.resample('30min').mean()
@@ -191,7 +178,7 @@ def del_abnormal_data_sapflow(raw_data, ta_name="ta_1_2_1", daca_name="tc_dtca_1
     df[daca_name + "_old"] = df[daca_name]
 
     if ta_name in df.columns and 'record_time' in df.columns:
-        df['record_time'] = pd.to_datetime(df['record_time'])
+        df['record_time'] = ensure_datetime(df['record_time'])
         df['date'] = df['record_time'].dt.date
 
         # 计算每日的平均温度
@@ -230,6 +217,7 @@ def del_abnormal_data_sapflow(raw_data, ta_name="ta_1_2_1", daca_name="tc_dtca_1
         # 在生长季剔除不在 [3, 12] 范围内的数据
         condition = (df['is_grow_season'] == 1) & ((df[daca_name] < 3) | (df[daca_name] > 12))
         df.loc[condition, daca_name] = pd.NA
+        record_flagged(daca_name, condition.sum())
 
         # 删除辅助列
         df.drop(['date', 'is_grow_season'], axis=1, inplace=True)
@@ -279,7 +267,8 @@ def standard_deviation_limit(data):
         for col in process_cols:
             mask = (sapflow_data.iloc[index:index + 480][col] > upper_bound[col]) | \
                    (sapflow_data.iloc[index:index + 480][col] < lower_bound[col])
-            sapflow_data.loc[index:index + 479, col].loc[mask] = np.nan
+            sapflow_data.loc[mask.index[mask], col] = np.nan
+            record_flagged(col, mask.sum())
             
         index += 96
     
@@ -287,7 +276,7 @@ def standard_deviation_limit(data):
     data[process_cols] = sapflow_data
     
     # 只保留整点和半点数据
-    data['record_time'] = pd.to_datetime(data['record_time'])
+    data['record_time'] = ensure_datetime(data['record_time'])
     new_data = data[~data['record_time'].dt.minute.isin([15, 45])]
     
     return new_data
\ No newline at end of file
@@ -0,0 +1,125 @@
+"""
+按年份拆分并行处理模块
+
+REddyProc的u*估计和分区本身按季节/年份进行，多年数据可以按自然年拆分，
+每年附加前后重叠的上下文数据后在独立进程中运行R流程，最后去掉重叠部分拼接回去
+"""
+import concurrent.futures
+import pandas as pd
+from utils.timestamps import ensure_datetime
+from utils.logging import get_task_logger, forward_worker_logs, init_worker_logging
+
+
+def split_by_year(data, overlap_days=30, min_days=90, time_col='record_time'):
+    """
+    将多年数据按自然年拆分，每段附加前后重叠数据
+
+    不足min_days天的首尾年份并入相邻年份，避免R在数据过少时估计失败
+
+    Args:
+        data: 数据DataFrame
+        overlap_days: 每段前后附加的重叠天数，默认为30
+        min_days: 单独成段所需的最少天数，默认为90
+        time_col: 时间列名
+
+    Returns:
+        列表，元素为 (keep_start, keep_end, chunk)，
+        chunk为含重叠数据的子集，[keep_start, keep_end) 为该段最终保留的时间范围
+    """
+    times = ensure_datetime(data[time_col])
+    start, end = times.min(), times.max()
+
+    # 以每年1月1日为分界点，过短的首尾段并入相邻段
+    bounds = [start]
+    for year in range(start.year + 1, end.year + 1):
+        bounds.append(pd.Timestamp(year=year, month=1, day=1))
+    bounds.append(end + pd.Timedelta(microseconds=1))
+    while len(bounds) > 2 and (bounds[1] - bounds[0]).days < min_days:
+        del bounds[1]
+    while len(bounds) > 2 and (bounds[-1] - bounds[-2]).days < min_days:
+        del bounds[-2]
+
+    overlap = pd.Timedelta(days=overlap_days)
+    chunks = []
+    for keep_start, keep_end in zip(bounds[:-1], bounds[1:]):
+        mask = (times >= keep_start - overlap) & (times < keep_end + overlap)
+        chunks.append((keep_start, keep_end, data.loc[mask].reset_index(drop=True)))
+    return chunks
+
+
+def stitch_years(results, time_col='record_time'):
+    """
+    拼接各段结果，只保留每段自身的时间范围
+
+    Args:
+        results: 列表，元素为 (keep_start, keep_end, result_df)
+        time_col: 时间列名
+
+    Returns:
+        拼接后的DataFrame
+    """
+    parts = []
+    for keep_start, keep_end, result in results:
+        times = ensure_datetime(result[time_col])
+        parts.append(result.loc[(times >= keep_start) & (times < keep_end)])
+    return pd.concat(parts, ignore_index=True)
+
+
+def _run_year_chunk(func, data, func_kwargs):
+    """
+    在子进程中执行func，同时返回本段新增的R调用统计记录：子进程中的后端是主进程后端的
+    副本，其RProfiler中的记录不会自动回到主进程
+
+    Returns:
+        (处理后的数据, R调用统计记录列表)
+    """
+    profiler = getattr(func_kwargs.get("backend"), "profiler", None)
+    start = len(profiler.records) if profiler is not None else 0
+    result = func(data=data, **func_kwargs)
+    records = profiler.records[start:] if profiler is not None else []
+    return result, records
+
+
+def run_by_year(func, data, func_kwargs, overlap_days=30, max_workers=None,
+                time_col='record_time', logger=None):
+    """
+    按年份拆分数据，在多个进程中分别执行func后拼接结果
+
+    Args:
+        func: 处理函数（模块级函数，以data关键字参数接收数据）
+        data: 数据DataFrame
+        func_kwargs: 传给func的其它关键字参数
+        overlap_days: 每段前后附加的重叠天数，默认为30
+        max_workers: 最大进程数，默认为CPU核数
+        time_col: 时间列名
+        logger: 日志记录器，默认为当前任务的日志记录器，各进程中的日志转发到该记录器
+
+    func_kwargs中的backend带有RProfiler时，各进程的R调用统计按数据段合并到该RProfiler
+
+    Returns:
+        处理后的数据
+    """
+    chunks = split_by_year(data, overlap_days=overlap_days, time_col=time_col)
+    if len(chunks) == 1:
+        return func(data=data, **func_kwargs)
+
+    logger = logger or get_task_logger()
+    ranges = ", ".join(f"{s:%Y-%m-%d}~{e:%Y-%m-%d}" for s, e, _ in chunks)
+    logger.info(f"{func.__name__} 按年份拆分为{len(chunks)}段并行处理: {ranges}")
+
+    with forward_worker_logs(logger) as log_queue, concurrent.futures.ProcessPoolExecutor(
+        max_workers=max_workers, initializer=init_worker_logging, initargs=(log_queue,)
+    ) as executor:
+        futures = [
+            executor.submit(_run_year_chunk, func, chunk, func_kwargs)
+            for _, _, chunk in chunks
+        ]
+        outputs = [future.result() for future in futures]
+
+    profiler = getattr(func_kwargs.get("backend"), "profiler", None)
+    results = []
+    for (keep_start, keep_end, _), (result, records) in zip(chunks, outputs):
+        if profiler is not None:
+            profiler.merge(records, segment=f"{keep_start:%Y-%m-%d}~{keep_end:%Y-%m-%d}")
+        results.append((keep_start, keep_end, result))
+    return stitch_years(results, time_col=time_col)
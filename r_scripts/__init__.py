@@ -1,9 +1,14 @@
 """
 R脚本模块 - Windows兼容版本
+
+R环境在首次调用 load_r() 时才初始化，非flux数据的运行不会加载R
 """
 import os
 import sys
+import time
+import threading
 import warnings
+from utils.timings import record_timing
 
 # 直接设置您的R路径
 # R_HOME_PATH = r'C:\Program Files\R\R-4.4.2'
@@ -98,90 +103,126 @@ def setup_rpy2_console_fix():
         print(f"设置rpy2控制台修复时出错: {e}")
         return False
 
-# 在导入rpy2之前设置R环境
-print("正在配置R环境...")
-setup_successful = setup_r_environment()
+class RRuntime:
+    """
+    已初始化的R运行环境
 
-# 尝试导入rpy2
-R_AVAILABLE = False
-try:
-    if setup_successful:
-        print("正在导入rpy2...")
-        
-        # 禁用相关警告
-        warnings.filterwarnings('ignore', category=UserWarning)
-        warnings.filterwarnings('ignore', category=RuntimeWarning)
-        warnings.filterwarnings('ignore', message='.*cffi callback.*')
-        
-        import rpy2.robjects as robjects
-        from rpy2.robjects import vectors, pandas2ri
-        
-        # 设置控制台修复
-        setup_rpy2_console_fix()
-        
-        # 激活pandas转换器
-        pandas2ri.activate()
-        
-        # 创建便于使用的别名
-        StrVector = vectors.StrVector
-        FloatVector = vectors.FloatVector
-        IntVector = vectors.IntVector
-        
-        print("正在加载R脚本...")
-        # 导入R脚本，确保R函数被定义
-        from . import r_gap_fill_par
-        from . import r_co2_flux
-        from . import r_gap_fill_all
-        
-        # 设置R选项来减少输出
-        try:
-            robjects.r('options(warn=-1)')  # 禁用R警告
-            robjects.r('options(verbose=FALSE)')  # 禁用详细输出
-        except:
-            pass
-        
-        print("✓ rpy2导入成功，R环境配置完成")
-        R_AVAILABLE = True
-        
-    else:
+    持有rpy2的对象和向量构造函数，由 load_r() 创建并在进程内复用
+    """
+
+    def __init__(self, robjects, pandas2ri, localconverter):
+        self.robjects = robjects
+        self.pandas2ri = pandas2ri
+        self.localconverter = localconverter
+        self.StrVector = robjects.StrVector
+        self.FloatVector = robjects.FloatVector
+        self.IntVector = robjects.IntVector
+
+
+_runtime = None
+_load_error = None
+_load_lock = threading.Lock()
+
+
+def _bootstrap():
+    """设置R环境、导入rpy2并定义所有R函数"""
+    print("正在配置R环境...")
+    if not setup_r_environment():
         raise ImportError("R环境设置失败")
-        
-except Exception as e:
-    print(f"✗ rpy2导入失败: {e}")
-    print("\n建议解决方案:")
-    print("1. 降级rpy2版本: pip uninstall rpy2 && pip install rpy2==3.4.5")
-    print("2. 或者尝试: pip uninstall rpy2 && pip install rpy2==3.3.6")
-    print("3. 确保已安装REddyProc R包")
-    print("4. 考虑使用conda安装: conda install -c conda-forge rpy2")
-    
-    R_AVAILABLE = False
-    
-    # 创建占位符以避免导入错误
-    class DummyRobjects:
-        r = lambda x: None
-        
-    class DummyVectors:
+
+    print("正在导入rpy2...")
+
+    # 禁用相关警告
+    warnings.filterwarnings('ignore', category=UserWarning)
+    warnings.filterwarnings('ignore', category=RuntimeWarning)
+    warnings.filterwarnings('ignore', message='.*cffi callback.*')
+
+    import rpy2.robjects as robjects
+    from rpy2.robjects import pandas2ri
+    from rpy2.robjects.conversion import localconverter
+
+    # 设置控制台修复
+    setup_rpy2_console_fix()
+
+    # 激活pandas转换器
+    pandas2ri.activate()
+
+    print("正在加载R脚本...")
+    # R包只加载一次，再依次定义各R函数
+    from . import r_profiling
+    from . import r_gap_fill_par
+    from . import r_co2_flux
+    from . import r_gap_fill_all
+    robjects.r("""
+      library(REddyProc)
+      library(dplyr)
+    """)
+    for module in (r_profiling, r_gap_fill_par, r_co2_flux, r_gap_fill_all):
+        robjects.r(module.R_SOURCE)
+
+    # 设置R选项来减少输出
+    try:
+        robjects.r('options(warn=-1)')  # 禁用R警告
+        robjects.r('options(verbose=FALSE)')  # 禁用详细输出
+    except Exception:
         pass
-    
-    robjects = DummyRobjects()
-    vectors = DummyVectors()
-    StrVector = lambda x: x
-    FloatVector = lambda x: x
-    IntVector = lambda x: x
-    
-    class DummyPandas2ri:
-        @staticmethod
-        def activate():
-            pass
-    
-    pandas2ri = DummyPandas2ri()
+
+    print("✓ rpy2导入成功，R环境配置完成")
+    return RRuntime(robjects, pandas2ri, localconverter)
+
+
+def load_r():
+    """
+    获取R运行环境（首次调用时初始化，之后复用同一实例）
+
+    Returns:
+        RRuntime实例
+
+    Raises:
+        RuntimeError: R环境不可用
+    """
+    global _runtime, _load_error
+    if _runtime is not None:
+        return _runtime
+
+    with _load_lock:
+        if _runtime is None and _load_error is None:
+            start = time.perf_counter()
+            try:
+                _runtime = _bootstrap()
+            except Exception as e:
+                _load_error = e
+                print(f"✗ rpy2导入失败: {e}")
+                print("\n建议解决方案:")
+                print("1. 降级rpy2版本: pip uninstall rpy2 && pip install rpy2==3.4.5")
+                print("2. 或者尝试: pip uninstall rpy2 && pip install rpy2==3.3.6")
+                print("3. 确保已安装REddyProc R包")
+                print("4. 考虑使用conda安装: conda install -c conda-forge rpy2")
+            finally:
+                record_timing("r_scripts (R初始化)", time.perf_counter() - start)
+
+    if _runtime is None:
+        raise RuntimeError(f"R环境不可用: {_load_error}")
+    return _runtime
+
+
+def is_r_available():
+    """
+    检查R环境是否可用（会触发R初始化）
+
+    Returns:
+        R环境是否可用
+    """
+    try:
+        load_r()
+        return True
+    except RuntimeError:
+        return False
+
 
 # 导出供其他模块使用的符号
 __all__ = [
-    'robjects',
-    'StrVector',
-    'FloatVector', 
-    'IntVector',
-    'pandas2ri',
-    'R_AVAILABLE'
-]
\ No newline at end of file
+    'RRuntime',
+    'load_r',
+    'is_r_available',
+]
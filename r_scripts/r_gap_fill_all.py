@@ -1,27 +1,28 @@
-from r_scripts import robjects
+"""
+全部指标MDS插补的R脚本
+"""
 
-robjects.r("""
-  library(REddyProc)
-  library(dplyr)
+# R函数定义，由 r_scripts.load_r() 在R初始化时执行
 
+R_SOURCE = """
   r_gap_fill_all <- function(file_name, longitude, latitude, timezone, flux_data, indicators){
 
       # start a new edd work
       flux_data$VPD<-fCalcVPDfromRHandTair(rH=flux_data$rH, Tair=flux_data$Tair)
       datanames<-colnames(flux_data)
-      EddyProc.C<-sEddyProc$new(ID=file_name, Data=flux_data, ColNames=datanames[-1])
+      EddyProc.C<-qc_timed("sEddyProc$new", sEddyProc$new(ID=file_name, Data=flux_data, ColNames=datanames[-1]))
       EddyProc.C$sSetLocationInfo(LatDeg=latitude,LongDeg=longitude,TimeZoneHour=timezone)
       rm(datanames)
 
       # gap filling
       for(i in indicators){
-        EddyProc.C$sMDSGapFill(i,FillAll=TRUE)
+        qc_timed(paste0("sMDSGapFill:", i), EddyProc.C$sMDSGapFill(i,FillAll=TRUE))
       }
 
       # bind the data      
-      FilledEddyData.F<-EddyProc.C$sExportResults()
+      FilledEddyData.F<-qc_timed("sExportResults", EddyProc.C$sExportResults())
       CombinedData.F<-cbind(flux_data, FilledEddyData.F)
 
       return(CombinedData.F)
   }
-""")
\ No newline at end of file
+"""
\ No newline at end of file
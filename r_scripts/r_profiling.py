@@ -0,0 +1,44 @@
+"""
+R调用耗时与内存统计的R脚本
+"""
+
+# R函数定义，由 r_scripts.load_r() 在R初始化时执行
+# 只有设置了 options(qc.profile=TRUE) 时 qc_timed 才记录耗时和gc()内存变化，否则直接求值
+R_SOURCE = """
+  .qc_profile_env <- new.env()
+  .qc_profile_env$records <- list()
+
+  qc_profile_reset <- function(){
+      .qc_profile_env$records <- list()
+      invisible(NULL)
+  }
+
+  qc_timed <- function(label, expr){
+      if(!isTRUE(getOption("qc.profile", FALSE))){
+        return(expr)
+      }
+      mem_before <- sum(gc(reset=TRUE)[, 2])
+      start <- proc.time()[["elapsed"]]
+      result <- expr
+      elapsed <- proc.time()[["elapsed"]] - start
+      mem_after <- gc()
+      record <- data.frame(
+        label=label,
+        seconds=elapsed,
+        mem_before_mb=mem_before,
+        mem_after_mb=sum(mem_after[, 2]),
+        mem_peak_mb=sum(mem_after[, 6]),
+        stringsAsFactors=FALSE
+      )
+      .qc_profile_env$records[[length(.qc_profile_env$records) + 1]] <- record
+      result
+  }
+
+  qc_profile_records <- function(){
+      if(length(.qc_profile_env$records) == 0){
+        return(data.frame(label=character(0), seconds=numeric(0), mem_before_mb=numeric(0),
+                          mem_after_mb=numeric(0), mem_peak_mb=numeric(0)))
+      }
+      do.call(rbind, .qc_profile_env$records)
+  }
+"""
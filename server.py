@@ -0,0 +1,412 @@
+#!/usr/bin/env python
+"""
+常驻质量控制服务
+
+启动时导入pandas、statsmodels、DataQc，读取质量控制指标并初始化R，之后通过本机HTTP
+接口接收任务，避免每次处理都重新导入模块和启动R。只允许监听回环地址。
+
+接口：
+    POST /jobs        提交任务，JSON: {site, data_type, file 或 rows, longitude, latitude,
+                      is_strg, despiking_z, return: "path"|"rows", wait: bool,
+                      timeout: 等待秒数（默认60，最多600）}
+    GET  /jobs/<id>   查询任务状态和结果
+    GET  /health      服务状态（队列长度、运行中和已完成的任务数）
+
+任务队列有长度上限，队列已满时返回503；flux任务的R调用在多个工作线程之间串行执行
+"""
+import os
+import sys
+import json
+import uuid
+import time
+import queue
+import socket
+import argparse
+import ipaddress
+import threading
+import collections
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from core.jobs import JOB_DEFAULTS, load_qc_indicators, run_qc_job
+from utils.result_io import OUTPUT_FORMATS
+from utils.result_store import ResultStore
+from utils.logging import setup_logger, close_logger
+from config.constants import OUTPUT_PROFILES
+from processors.backends import create_backend, SerializedBackend
+
+RETURN_MODES = ("path", "rows")
+
+# wait为true时等待任务完成的默认秒数和上限，超时后返回202，客户端再用GET /jobs/<id>查询
+DEFAULT_WAIT_TIMEOUT = 60
+MAX_WAIT_TIMEOUT = 600
+
+
+def is_loopback(host):
+    """判断监听地址是否为回环地址"""
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except (OSError, ValueError):
+        return False
+
+
+def parse_job(payload):
+    """
+    将请求内容整理为任务字典
+
+    Args:
+        payload: 请求JSON对象
+
+    Returns:
+        任务字典
+
+    Raises:
+        ValueError: 缺少必填字段或字段不合法
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("请求内容应为JSON对象")
+    missing = [key for key in ("site", "data_type") if not payload.get(key)]
+    if missing:
+        raise ValueError(f"缺少字段: {', '.join(missing)}")
+    if payload.get("file") is None and payload.get("rows") is None:
+        raise ValueError("需要指定file或rows")
+    if payload.get("rows") is not None and not isinstance(payload["rows"], list):
+        raise ValueError("rows应为行记录列表")
+
+    job = dict(JOB_DEFAULTS)
+    for key in ("site", "data_type", "file", "rows", "longitude", "latitude", "is_strg", "despiking_z"):
+        if payload.get(key) is not None:
+            job[key] = payload[key]
+    job["longitude"] = float(job["longitude"])
+    job["latitude"] = float(job["latitude"])
+    job["is_strg"] = int(job["is_strg"])
+    job["despiking_z"] = float(job["despiking_z"])
+
+    # 内联数据默认直接返回处理结果，文件任务默认返回结果文件路径
+    job["return"] = payload.get("return") or ("rows" if job.get("rows") is not None else "path")
+    if job["return"] not in RETURN_MODES:
+        raise ValueError(f"return应为: {', '.join(RETURN_MODES)}")
+
+    job["wait"] = payload.get("wait", False)
+    if not isinstance(job["wait"], bool):
+        raise ValueError("wait应为true或false")
+    timeout = payload.get("timeout")
+    if timeout is None:
+        timeout = DEFAULT_WAIT_TIMEOUT
+    elif isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or not timeout > 0:
+        raise ValueError("timeout应为正数（秒）")
+    job["timeout"] = min(float(timeout), MAX_WAIT_TIMEOUT)
+    return job
+
+
+class QcService:
+    """任务队列和工作线程"""
+
+    def __init__(self, qc_indicators, backend, logger, workers=2, max_queue=32,
+                 output_dir="results", output_format="csv", output_profile="full",
+                 store_dir=None, log_dir="../logs", max_finished=200):
+        """
+        初始化服务
+
+        Args:
+            qc_indicators: 质量控制指标
+            backend: 插补后端（各工作线程共用）
+            logger: 服务日志记录器
+            workers: 工作线程数（同时处理的任务数）
+            max_queue: 等待队列长度上限
+            output_dir: 结果文件目录
+            output_format: 结果文件格式
+            output_profile: 输出方案
+            store_dir: 结果库目录，指定时结果写入结果库
+            log_dir: 任务日志目录
+            max_finished: 保留的已完成任务记录数
+        """
+        self.qc_indicators = qc_indicators
+        self.backend = backend
+        self.logger = logger
+        self.workers = workers
+        self.max_queue = max_queue
+        self.output_dir = output_dir
+        self.output_format = output_format
+        self.output_profile = output_profile
+        self.store_dir = store_dir
+        # 各工作线程共用一个结果库，由结果库的锁串行写入索引
+        self.store = ResultStore(store_dir, logger=logger) if store_dir else None
+        self.log_dir = log_dir
+        self.max_finished = max_finished
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = []
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+
+    def start(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"qc-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def submit(self, job):
+        """
+        提交任务
+
+        Args:
+            job: 任务字典（见 parse_job）
+
+        Returns:
+            任务ID
+
+        Raises:
+            queue.Full: 等待队列已满
+        """
+        job_id = uuid.uuid4().hex[:12]
+        record = {
+            "id": job_id,
+            "status": "queued",
+            "submitted_at": time.time(),
+            "job": job,
+            "result": None,
+            "done": threading.Event(),
+        }
+        with self._lock:
+            self._jobs[job_id] = record
+        try:
+            self._queue.put_nowait(job_id)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job_id]
+            raise
+        self.logger.info(f"任务{job_id}已加入队列: {job['site']}/{job['data_type']}")
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "max_queue": self.max_queue,
+                "workers": self.workers,
+                "running": self.running,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+
+    def _forget_finished(self):
+        """只保留最近max_finished个已完成任务的记录"""
+        finished = [job_id for job_id, r in self._jobs.items() if r["done"].is_set()]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def _worker(self):
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                break
+            record = self.get(job_id)
+            job = record["job"]
+            with self._lock:
+                record["status"] = "running"
+                self.running += 1
+            want_rows = job["return"] == "rows"
+            result = run_qc_job(
+                job,
+                self.qc_indicators,
+                output_dir=None if want_rows else self.output_dir,
+                output_format=self.output_format,
+                output_profile=self.output_profile,
+                log_dir=self.log_dir,
+                backend=self.backend,
+                keep_data=want_rows or self.store is not None,
+                job_id=job_id,
+            )
+            if self.store is not None:
+                data = result.get("data") if want_rows else result.pop("data", None)
+                if result["status"] == "ok":
+                    try:
+                        self.store.upsert(data, job["site"], job["data_type"])
+                    except Exception as e:
+                        result.update(status="failed", error=f"写入结果库出错: {str(e)}")
+                        result.pop("data", None)
+                del data
+            with self._lock:
+                record["result"] = result
+                record["status"] = result["status"]
+                self.running -= 1
+                if result["status"] == "ok":
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                self._forget_finished()
+            record["job"] = {k: v for k, v in job.items() if k != "rows"}
+            record["done"].set()
+            self.logger.info(f"任务{job_id} {result['status']} {result['seconds']:.1f}s")
+
+
+def record_to_json(record):
+    """将任务记录转换为响应内容"""
+    body = {"id": record["id"], "status": record["status"]}
+    result = record["result"]
+    if result is not None:
+        body.update({k: v for k, v in result.items() if k != "data"})
+        if result.get("data") is not None:
+            body["data"] = json.loads(result["data"].to_json(orient="records", date_format="iso"))
+    return body
+
+
+class QcRequestHandler(BaseHTTPRequestHandler):
+    """HTTP请求处理"""
+
+    server_version = "QcService/1.0"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        self.service.logger.debug(f"{self.address_string()} {format % args}")
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, self.service.stats())
+        elif self.path.startswith("/jobs/"):
+            record = self.service.get(self.path[len("/jobs/"):])
+            if record is None:
+                self._send_json(404, {"error": "任务不存在"})
+            else:
+                self._send_json(200, record_to_json(record))
+        else:
+            self._send_json(404, {"error": "未知的接口"})
+
+    def do_POST(self):
+        if self.path != "/jobs":
+            self._send_json(404, {"error": "未知的接口"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            job = parse_job(payload)
+        except (ValueError, TypeError) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+
+        try:
+            job_id = self.service.submit(job)
+        except queue.Full:
+            self._send_json(503, {"error": "任务队列已满，请稍后重试"}, {"Retry-After": "5"})
+            return
+
+        record = self.service.get(job_id)
+        if job["wait"]:
+            record["done"].wait(timeout=job["timeout"])
+        if record["done"].is_set():
+            self._send_json(200, record_to_json(record))
+        else:
+            self._send_json(202, {"id": job_id, "status": record["status"]})
+
+
+def warm_up(backend_name, logger):
+    """预先导入耗时的模块，r后端预先初始化R"""
+    import statsmodels.api  # noqa: F401
+    import ARIMA.arima_imputation  # noqa: F401
+
+    if backend_name == "r":
+        from r_scripts import load_r
+
+        try:
+            load_r()
+            logger.info("R环境初始化完成")
+        except RuntimeError as e:
+            logger.warning(f"R环境初始化失败，flux任务将无法处理: {e}")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="常驻数据质量控制服务")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="监听地址，只允许回环地址")
+    parser.add_argument("--port", type=int, default=8765, help="监听端口")
+    parser.add_argument("--workers", "-w", type=int, default=2, help="同时处理的任务数")
+    parser.add_argument("--max-queue", type=int, default=32, help="等待队列长度上限")
+    parser.add_argument("--output-dir", "-o", type=str, default="results", help="结果文件目录")
+    parser.add_argument(
+        "--output-format", type=str, default="csv", choices=list(OUTPUT_FORMATS),
+        help="结果文件格式：csv、parquet（zstd压缩）或feather（Arrow IPC）",
+    )
+    parser.add_argument(
+        "--output-profile", type=str, default="full", choices=OUTPUT_PROFILES,
+        help="输出方案：final只输出最终结果，audit额外输出中间列，full输出全部列",
+    )
+    parser.add_argument(
+        "--backend", type=str, default="r", choices=["r", "replay"],
+        help="flux插补后端：r调用REddyProc，replay读取录制的输出",
+    )
+    parser.add_argument(
+        "--fixture-dir", type=str, default=None, help="replay后端读取录制输出的目录"
+    )
+    parser.add_argument("--store-dir", type=str, default=None, help="结果库目录")
+    parser.add_argument("--log-dir", type=str, default="../logs", help="日志目录")
+    args = parser.parse_args()
+
+    if not is_loopback(args.host):
+        print(f"错误：监听地址 {args.host} 不是回环地址，服务只允许本机访问")
+        sys.exit(1)
+
+    logger = setup_logger(ftp="server", log_dir=args.log_dir)
+    try:
+        warm_up(args.backend, logger)
+        qc_indicators = load_qc_indicators()
+        backend = SerializedBackend(create_backend(args.backend, fixture_dir=args.fixture_dir))
+        service = QcService(
+            qc_indicators,
+            backend,
+            logger,
+            workers=args.workers,
+            max_queue=args.max_queue,
+            output_dir=args.output_dir,
+            output_format=args.output_format,
+            output_profile=args.output_profile,
+            store_dir=args.store_dir,
+            log_dir=args.log_dir,
+        )
+        service.start()
+
+        httpd = ThreadingHTTPServer((args.host, args.port), QcRequestHandler)
+        httpd.daemon_threads = True
+        httpd.service = service
+        logger.info(f"服务已启动: http://{args.host}:{httpd.server_port}")
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("收到中断信号，停止服务")
+        finally:
+            httpd.server_close()
+            service.stop()
+        close_logger(logger, success=True)
+    except Exception as e:
+        logger.error(f"服务运行出错: {str(e)}")
+        close_logger(logger, success=False)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import sys
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+# 添加父目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config.constants import NOT_CONVERT_LIST
+from utils.ingest import read_data_file
+
+
+def legacy_read(file_path):
+    """
+    原有的读取方式：read_csv后整表replace，再逐列to_numeric
+
+    参数:
+    file_path: str - 数据文件路径
+
+    返回:
+    DataFrame - 读取结果
+    """
+    data = pd.read_csv(file_path)
+    data = data.replace(["NaN", "nan", "NAN", "N/A", "N/a", "n/a", "N/A", " ", ""], np.nan)
+    for col in data.columns:
+        if col not in NOT_CONVERT_LIST:
+            data[col] = pd.to_numeric(data[col], errors="coerce")
+    return data
+
+
+def make_synthetic_file(file_path, years=3, n_columns=60):
+    """
+    生成半小时间隔的模拟数据文件，包含部分缺失值字符串
+
+    参数:
+    file_path: str - 输出文件路径
+    years: int - 年数
+    n_columns: int - 数值列数量
+    """
+    times = pd.date_range("2021-01-01", periods=years * 365 * 48, freq="30min")
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=(len(times), n_columns)).round(4).astype(object)
+    values[rng.random(values.shape) < 0.05] = "NaN"
+    data = pd.DataFrame(values, columns=[f"col_{i}" for i in range(n_columns)])
+    data.insert(0, "record_time", times.strftime("%Y/%m/%d %H:%M"))
+    data.to_csv(file_path, index=False)
+
+
+def run_benchmark(file_path, data_type, repeat=3):
+    """
+    对比原有读取方式与schema读取方式的耗时
+
+    参数:
+    file_path: str - 数据文件路径
+    data_type: str - 数据类型
+    repeat: int - 重复次数，取最短耗时
+
+    返回:
+    dict - 各方式的最短耗时（秒）
+    """
+    qc_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           "qc_indicators.csv")
+    qc_indicators = pd.read_csv(qc_path).to_dict("records")
+
+    cases = {
+        "原有方式 (read_csv + replace + to_numeric)": lambda: legacy_read(file_path),
+        "schema读取 (c引擎)": lambda: read_data_file(
+            file_path, qc_indicators, data_type, engine="c"),
+        "schema读取 (pyarrow引擎)": lambda: read_data_file(
+            file_path, qc_indicators, data_type, engine="pyarrow"),
+        "schema读取 (pyarrow引擎, 只读需要的列)": lambda: read_data_file(
+            file_path, qc_indicators, data_type, only_needed=True, engine="pyarrow"),
+    }
+
+    results = {}
+    for name, func in cases.items():
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            try:
+                func()
+            except ImportError as e:
+                print(f"{name}: 跳过（{e}）")
+                break
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        if best is not None:
+            results[name] = best
+            print(f"{name:<45} {best:8.3f} s")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="数据读取性能测试")
+    parser.add_argument("--file-path", type=str, default=None,
+                        help="数据文件路径，不指定则生成模拟数据")
+    parser.add_argument("--data-type", type=str, default="flux", help="数据类型")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数")
+    args = parser.parse_args()
+
+    file_path = args.file_path
+    if file_path is None:
+        file_path = "ingest_benchmark_data.csv"
+        print(f"生成模拟数据: {file_path}")
+        make_synthetic_file(file_path)
+
+    print("开始数据读取性能测试")
+    print("=" * 40)
+    run_benchmark(file_path, args.data_type, repeat=args.repeat)
@@ -0,0 +1,177 @@
+import sys
+import os
+import json
+import time
+import argparse
+import subprocess
+import logging
+import numpy as np
+import pandas as pd
+
+# 添加父目录到路径
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+from processors.backends import GapFillBackend, create_backend
+
+
+class InterpolationBackend(GapFillBackend):
+    """
+    用线性插值代替REddyProc的后端，只用于测试Python侧流程的内存占用
+
+    输出列与REddyProc的主要输出列同名（Par_f、NEE_f、GPP_f、Reco及各指标的_f、_fqc列），
+    不需要安装R
+    """
+
+    name = "interp"
+
+    @staticmethod
+    def _fill(series):
+        return series.interpolate(limit_direction="both").to_numpy()
+
+    def fill_par(self, file_name, longitude, latitude, timezone, data):
+        return pd.DataFrame({"Par_f": self._fill(data["Par"])})
+
+    def fill_indicators(self, file_name, longitude, latitude, timezone, data, indicators):
+        exports = {}
+        for col in indicators:
+            exports[f"{col}_f"] = self._fill(data[col])
+            exports[f"{col}_fqc"] = data[col].isna().astype("int64").to_numpy()
+        return pd.DataFrame(exports)
+
+    def ustar_partition(self, file_name, longitude, latitude, timezone, data, indicators):
+        nee = self._fill(data["NEE"])
+        exports = {
+            "NEE_f": nee,
+            "NEE_fqc": data["NEE"].isna().astype("int64").to_numpy(),
+            "Reco": np.clip(nee, 0, None),
+            "GPP_f": np.clip(-nee, 0, None),
+        }
+        exports.update(self.fill_indicators(file_name, longitude, latitude, timezone, data, indicators))
+        return pd.DataFrame(exports)
+
+
+def make_synthetic_file(file_path, source_path, years=10):
+    """
+    将一年的flux数据按年平移拼接成多年数据文件，并添加存储项列
+
+    参数:
+    file_path: str - 输出文件路径
+    source_path: str - 一年的flux原始数据文件
+    years: int - 年数
+    """
+    source = pd.read_csv(source_path)
+    times = pd.to_datetime(source["record_time"], format="%Y/%m/%d %H:%M")
+    rng = np.random.default_rng(0)
+    parts = []
+    for i in range(years):
+        part = source.copy()
+        part["record_time"] = (times - pd.DateOffset(years=years - 1 - i)).dt.strftime("%Y/%m/%d %H:%M")
+        for col in ("co2_flux", "h2o_flux", "le", "h"):
+            part[f"{col}_strg"] = rng.normal(scale=0.1, size=len(part)).round(5)
+        parts.append(part)
+    pd.concat(parts, ignore_index=True).drop_duplicates("record_time").to_csv(file_path, index=False)
+
+
+def run_once(file_path, low_memory, output_profile, backend_name, fixture_dir):
+    """
+    在当前进程中执行一次flux质量控制，返回耗时和峰值内存
+
+    参数:
+    file_path: str - 数据文件路径
+    low_memory: bool - 是否使用低内存模式
+    output_profile: str - 输出方案
+    backend_name: str - 插补后端（interp、r、replay）
+
+    返回:
+    dict - 行数、耗时（秒）、读取后内存和峰值内存（MB）
+    """
+    from core.data_qc import DataQc
+    from utils.ingest import read_data_file
+    from utils.fill_time import align_to_grid
+    from utils.memory import memory_usage
+
+    qc_indicators = pd.read_csv(os.path.join(ROOT, "qc_indicators.csv")).to_dict("records")
+    if backend_name == "interp":
+        backend = InterpolationBackend()
+    else:
+        backend = create_backend(backend_name, fixture_dir=fixture_dir)
+    logger = logging.getLogger("low_memory_benchmark")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    start = time.perf_counter()
+    data, _ = align_to_grid(read_data_file(file_path, qc_indicators, "flux"), freq="30min")
+    loaded_mb = memory_usage()[0]
+    dc = DataQc(data, file_path, 116.28824, 40.265635, [], "1", 8, qc_indicators, "flux",
+                "benchmark", "benchmark", logger, backend=backend,
+                output_profile=output_profile, low_memory=low_memory)
+    del data
+    result = dc.data_qc()
+    return {
+        "rows": len(result),
+        "seconds": time.perf_counter() - start,
+        "loaded_mb": loaded_mb,
+        "peak_mb": memory_usage()[1],
+    }
+
+
+def run_benchmark(file_path, output_profile="full", backend_name="interp", fixture_dir=None):
+    """
+    分别在独立进程中以默认模式和低内存模式处理同一文件，对比峰值内存
+
+    参数:
+    file_path: str - 数据文件路径
+    output_profile: str - 输出方案
+    backend_name: str - 插补后端
+    fixture_dir: str - replay后端读取录制输出的目录
+
+    返回:
+    dict - 各模式的测试结果
+    """
+    results = {}
+    for name, low_memory in (("默认模式 (float64)", False), ("低内存模式 (float32)", True)):
+        cmd = [sys.executable, os.path.abspath(__file__), "--file-path", file_path,
+               "--output-profile", output_profile, "--backend", backend_name, "--child"]
+        if low_memory:
+            cmd.append("--low-memory")
+        if fixture_dir:
+            cmd += ["--fixture-dir", fixture_dir]
+        output = subprocess.run(cmd, check=True, capture_output=True, text=True, cwd=ROOT).stdout
+        results[name] = json.loads(output.strip().splitlines()[-1])
+        r = results[name]
+        print(f"{name:<24} 行数 {r['rows']:>8}  耗时 {r['seconds']:7.1f} s  "
+              f"读取后 {r['loaded_mb']:8.1f} MB  峰值 {r['peak_mb']:8.1f} MB")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="低内存模式峰值内存测试")
+    parser.add_argument("--file-path", type=str, default=None,
+                        help="flux数据文件路径，不指定则由2024年数据生成10年模拟数据")
+    parser.add_argument("--years", type=int, default=10, help="生成模拟数据的年数")
+    parser.add_argument("--output-profile", type=str, default="full", help="输出方案")
+    parser.add_argument("--backend", type=str, default="interp", choices=["interp", "r", "replay"],
+                        help="插补后端：interp用线性插值代替R（默认），r调用REddyProc")
+    parser.add_argument("--fixture-dir", type=str, default=None, help="replay后端读取录制输出的目录")
+    parser.add_argument("--low-memory", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        # 子进程：执行一次并输出JSON结果
+        print(json.dumps(run_once(args.file_path, args.low_memory, args.output_profile,
+                                  args.backend, args.fixture_dir)))
+        sys.exit(0)
+
+    file_path = args.file_path
+    if file_path is None:
+        file_path = os.path.abspath(f"low_memory_benchmark_{args.years}y.csv")
+        if not os.path.exists(file_path):
+            print(f"生成{args.years}年模拟数据: {file_path}")
+            make_synthetic_file(
+                file_path, os.path.join(ROOT, "data", "2024_shisanling_flux_raw_data.csv"), args.years
+            )
+
+    print("开始低内存模式测试")
+    print("=" * 40)
+    run_benchmark(os.path.abspath(file_path), args.output_profile, args.backend, args.fixture_dir)
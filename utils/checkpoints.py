@@ -0,0 +1,133 @@
+"""
+阶段检查点模块
+
+flux流程的每个阶段结束后可将数据保存为未压缩的Arrow IPC文件，重新运行时以内存映射
+方式读取，从指定阶段继续，无需重新解析CSV和重复执行之前的阶段。
+检查点按源文件内容的sha256和处理参数命名，源文件或参数变化后不会误用旧的检查点
+"""
+import os
+import json
+import hashlib
+
+# 检查点格式或阶段逻辑变化时递增，使旧检查点失效
+CHECKPOINT_VERSION = 1
+
+
+def file_sha256(paths, block_size=1 << 20):
+    """
+    计算一个或多个文件内容的sha256
+
+    Args:
+        paths: 文件路径列表
+        block_size: 每次读取的字节数
+
+    Returns:
+        十六进制摘要
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(os.path.basename(path).encode("utf-8"))
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def make_run_key(source_paths, params):
+    """
+    根据源文件内容和处理参数生成检查点键
+
+    Args:
+        source_paths: 源数据文件路径列表
+        params: 影响处理结果的参数字典
+
+    Returns:
+        检查点键
+    """
+    digest = hashlib.sha256()
+    digest.update(str(CHECKPOINT_VERSION).encode("utf-8"))
+    digest.update(file_sha256(source_paths).encode("utf-8"))
+    digest.update(json.dumps(params, sort_keys=True, default=str, ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
+class CheckpointStore:
+    """按运行键和阶段名称保存的Arrow IPC检查点"""
+
+    def __init__(self, checkpoint_dir, run_key, logger=None):
+        """
+        初始化检查点目录
+
+        Args:
+            checkpoint_dir: 检查点目录
+            run_key: 检查点键（见 make_run_key）
+            logger: 日志记录器，可选
+        """
+        self.checkpoint_dir = checkpoint_dir
+        self.run_key = run_key
+        self.logger = logger
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+    def log(self, message):
+        if self.logger is not None:
+            self.logger.info(message)
+
+    def path(self, stage):
+        return os.path.join(self.checkpoint_dir, f"{self.run_key}-{stage}.arrow")
+
+    def exists(self, stage):
+        return os.path.exists(self.path(stage))
+
+    def save(self, stage, data):
+        """
+        保存阶段结束时的数据
+
+        Args:
+            stage: 阶段名称
+            data: 数据
+        """
+        import pyarrow as pa
+        import pyarrow.feather as feather
+
+        table = pa.Table.from_pandas(data, preserve_index=False)
+        path = self.path(stage)
+        tmp_path = path + ".tmp"
+        # 不压缩，重新读取时可直接内存映射
+        feather.write_feather(table, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, path)
+        self.log(f"已保存检查点 {stage}: {path}")
+
+    def load(self, stage):
+        """
+        以内存映射方式读取检查点
+
+        Args:
+            stage: 阶段名称
+
+        Returns:
+            数据
+        """
+        import pyarrow as pa
+        import pyarrow.ipc as ipc
+
+        path = self.path(stage)
+        with pa.memory_map(path, "r") as source:
+            data = ipc.open_file(source).read_all().to_pandas()
+        self.log(f"已读取检查点 {stage}: {path}")
+        return data
+
+    def find_resume_point(self, resume_from, stages):
+        """
+        查找从resume_from阶段继续时可用的最近检查点
+
+        Args:
+            resume_from: 希望从哪个阶段开始重新执行
+            stages: 按执行顺序排列的阶段名称列表
+
+        Returns:
+            已完成的阶段名称，没有可用检查点时返回None
+        """
+        for stage in reversed(stages[:stages.index(resume_from)]):
+            if self.exists(stage):
+                return stage
+        return None
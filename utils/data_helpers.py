@@ -3,6 +3,7 @@
 """
 import numpy as np
 import pandas as pd
+from utils.logging import get_task_logger
 
 
 def set_data_nan(data, condition, column_name):
@@ -74,7 +75,7 @@ def judge_day_night(data, ppfd_column='Par_f', ppfd_threshold=5):
     """
     data['is_day_night'] = np.nan
     if ppfd_column not in data.columns:
-        print(f'数据表缺失 {ppfd_column}，无法判断白天黑夜')
+        get_task_logger().warning(f'数据表缺失 {ppfd_column}，无法判断白天黑夜')
     else:
         data[ppfd_column] = data[ppfd_column].astype('float')
         day_condition = (data[ppfd_column] > ppfd_threshold) & (pd.isna(data['is_day_night']))
@@ -1,73 +1,275 @@
 import numpy as np
 import pandas as pd
 import os
+from utils.timestamps import ensure_datetime
+from utils.logging import get_task_logger
+
+DUPLICATE_POLICIES = ("first", "last", "error")
+
+
+def align_to_grid(raw_data: pd.DataFrame, freq: str = "auto", time_col: str = "record_time",
+                  duplicates: str = "last") -> tuple[pd.DataFrame, dict]:
+    """
+    将数据对齐到等间隔时间网格
+
+    以时间列为DatetimeIndex直接reindex到完整时间序列，数值列保持float类型，
+    缺失时间点的值为NaN
+
+    Args:
+        raw_data: 原始数据
+        freq: 时间间隔，"auto"时自动检测
+        time_col: 时间列名
+        duplicates: 重复时间的处理方式，"first"保留第一条，"last"保留最后一条，
+            "error"直接报错
+
+    Returns:
+        (对齐后的数据, 统计信息)，统计信息包括输入/输出行数、补齐的时间点数、
+        删除的重复时间、不在网格上的时间及无法解析的时间的行数
+    """
+    if duplicates not in DUPLICATE_POLICIES:
+        raise ValueError(f"不支持的重复时间处理方式: {duplicates}，可选 {DUPLICATE_POLICIES}")
+
+    summary = {"rows_in": len(raw_data)}
 
-def fill_time(raw_data: pd.DataFrame, time_freq: str = "auto") -> tuple[pd.DataFrame, str]:
     # 删除 id 字段（如果存在）
-    if "id" in raw_data.columns:
-        del raw_data["id"]
+    data = raw_data.drop(columns=[c for c in ("id", time_col) if c in raw_data.columns])
+
+    # 只对字符串列做缺失值替换，数值列保持原类型
+    object_cols = [col for col in data.columns if data[col].dtype == object]
+    if object_cols:
+        data[object_cols] = data[object_cols].replace(["NaN", "nan", ""], np.nan)
 
-    # 将 'NaN', 'nan', '' 替换成 np.NAN，再填充 NaN 值
-    raw_data = raw_data.replace(["NaN", "nan", ""], np.nan)
-    raw_data = raw_data.fillna(np.nan)
+    # 以时间列为索引，删除无法解析的时间
+    times = ensure_datetime(raw_data[time_col], errors="coerce")
+    data.index = pd.DatetimeIndex(times, name=time_col)
+    invalid = data.index.isna()
+    summary["invalid_time_dropped"] = int(invalid.sum())
+    if invalid.any():
+        data = data[~invalid]
+    data = data.sort_index(kind="stable")
 
-    # 确保 record_time 转换为 datetime 类型
-    raw_data["record_time"] = pd.to_datetime(raw_data["record_time"], errors="coerce")
-    raw_data = raw_data.sort_values("record_time")
+    # 重复时间
+    duplicated = data.index.duplicated(keep=duplicates if duplicates != "error" else False)
+    summary["duplicates_dropped"] = int(duplicated.sum()) if duplicates != "error" else 0
+    if duplicated.any():
+        if duplicates == "error":
+            examples = ", ".join(str(t) for t in data.index[duplicated].unique()[:5])
+            raise ValueError(f"数据中存在重复时间: {examples}")
+        data = data[~duplicated]
 
     # 自动检测时间间隔
-    detected_freq = time_freq
-    if time_freq == "auto":
-        detected_freq = detect_time_frequency(raw_data)
-        print(f"自动检测到时间间隔: {detected_freq}")
+    if freq == "auto":
+        analysis = analyze_time_frequency(data.index)
+        freq = analysis["freq"]
+        summary["frequency_analysis"] = analysis
+    summary["freq"] = freq
 
-    # 生成完整的时间序列
-    start_time = raw_data["record_time"].min()
-    end_time = raw_data["record_time"].max()
-    complete_time_index = pd.date_range(start=start_time, end=end_time, freq=detected_freq)
+    # 生成完整的时间序列并对齐
+    if len(data):
+        grid = pd.date_range(start=data.index.min(), end=data.index.max(), freq=freq, name=time_col)
+    else:
+        grid = pd.DatetimeIndex([], name=time_col)
+    on_grid = data.index.isin(grid)
+    summary["off_grid_dropped"] = int((~on_grid).sum())
+    summary["inserted"] = int(len(grid) - on_grid.sum())
 
-    # 构建包含完整时间序列的 DataFrame
-    df_complete = pd.DataFrame({"record_time": complete_time_index})
+    aligned = data.reindex(grid).reset_index()
+    summary["rows_out"] = len(aligned)
+    return aligned, summary
 
-    # 将完整时间序列与原始数据按 record_time 合并（左连接）
-    merged = pd.merge(df_complete, raw_data, on="record_time", how="left")
 
-    # 对于除 record_time 之外的其他字段，如果缺失则填充为空字符串
-    other_cols = [col for col in merged.columns if col != "record_time"]
-    merged[other_cols] = merged[other_cols].fillna("")
+def align_parts_to_grid(parts: list, freq: str = "auto", time_col: str = "record_time",
+                        duplicates: str = "last") -> tuple[pd.DataFrame, dict]:
+    """
+    将分块的数据拼接并对齐到时间网格，结果与 align_to_grid(pd.concat(...)) 相同
 
-    # 更新 raw_data
-    raw_data = merged
-    return raw_data, detected_freq
+    先只用时间列和行号确定网格上每个时间点对应的行，再逐列拼接、对齐，
+    每列处理后立即释放各块中的该列，内存峰值约为对齐后的数据加一列，
+    而不是拼接结果和对齐结果同时各占一份
 
+    Args:
+        parts: 数据块列表，每块为 {列名: Series}（各列不与其它数据共用内存），处理后被清空
+        freq: 时间间隔，"auto"时自动检测
+        time_col: 时间列名
+        duplicates: 重复时间的处理方式（见 align_to_grid）
 
-def detect_time_frequency(data):
-    """自动检测数据的时间间隔"""
-    if len(data) < 2:
-        return "30min"  # 默认值
-    
-    # 计算前几个时间差
-    time_diffs = []
-    for i in range(1, min(10, len(data))):  # 检查前10个时间点
-        diff = (data.iloc[i]["record_time"] - data.iloc[i-1]["record_time"]).total_seconds() / 60
-        time_diffs.append(diff)
-    
-    # 找出最常见的时间间隔
-    most_common_diff = max(set(time_diffs), key=time_diffs.count)
-    
-    # 根据时间间隔返回相应的频率字符串
-    if abs(most_common_diff - 30) < 5:  # 30分钟左右
+    Returns:
+        (对齐后的数据, 统计信息)
+    """
+    columns = []
+    for part in parts:
+        columns += [col for col in part if col not in columns and col not in ("id", time_col)]
+    lengths = [len(part[time_col]) for part in parts]
+
+    # 网格上每个时间点对应的行号，补齐的时间点为-1
+    times = pd.concat([part.pop(time_col) for part in parts], ignore_index=True)
+    rows, summary = align_to_grid(
+        pd.DataFrame({time_col: times, "_row": np.arange(len(times))}),
+        freq=freq, time_col=time_col, duplicates=duplicates,
+    )
+    del times
+    positions = rows["_row"].fillna(-1).to_numpy(dtype=np.int64)
+
+    aligned = {time_col: rows[time_col]}
+    for col in columns:
+        # 某块缺少该列时以NaN补齐，浮点列保持原精度（与pd.concat一致）
+        dtype = next(part[col].dtype for part in parts if col in part)
+        fill_dtype = dtype if dtype.kind == "f" else "float64"
+        values = pd.concat(
+            [part.pop(col) if col in part else pd.Series(np.nan, index=range(length), dtype=fill_dtype)
+             for part, length in zip(parts, lengths)],
+            ignore_index=True,
+        )
+        if values.dtype == object:
+            values = values.replace(["NaN", "nan", ""], np.nan)
+        aligned[col] = values.reindex(positions).to_numpy()
+        del values
+    parts.clear()
+    return pd.DataFrame(aligned, copy=False), summary
+
+
+def format_grid_summary(summary: dict) -> str:
+    """
+    将对齐统计信息格式化为一行文字
+
+    Args:
+        summary: align_to_grid 返回的统计信息
+
+    Returns:
+        统计信息文字
+    """
+    text = (
+        f"时间对齐({summary['freq']}): 输入{summary['rows_in']}行, 输出{summary['rows_out']}行, "
+        f"补齐{summary['inserted']}个时间点, 删除重复时间{summary['duplicates_dropped']}行, "
+        f"删除不在时间网格上的{summary['off_grid_dropped']}行, "
+        f"删除无法解析时间的{summary['invalid_time_dropped']}行"
+    )
+    analysis = summary.get("frequency_analysis")
+    if analysis:
+        text += f"; 时间间隔置信度{analysis['confidence']:.1%}"
+        if analysis["split_suggestion"]:
+            periods = ", ".join(
+                f"{p['start']:%Y-%m-%d %H:%M}~{p['end']:%Y-%m-%d %H:%M}({p['freq']})"
+                for p in analysis["split_suggestion"]
+            )
+            text += f"; 存在{len(analysis['segments'])}段不同时间间隔的数据，建议拆分为: {periods}"
+    return text
+
+
+def fill_time(raw_data: pd.DataFrame, time_freq: str = "auto") -> tuple[pd.DataFrame, str]:
+    """
+    将数据补齐为完整的时间序列
+
+    Args:
+        raw_data: 原始数据
+        time_freq: 时间间隔，"auto"时自动检测
+
+    Returns:
+        (补齐后的数据, 使用的时间间隔)
+    """
+    aligned, summary = align_to_grid(raw_data, freq=time_freq)
+    logger = get_task_logger()
+    if time_freq == "auto":
+        logger.info(f"自动检测到时间间隔: {summary['freq']}")
+    logger.info(format_grid_summary(summary))
+    return aligned, summary["freq"]
+
+
+def interval_to_freq(minutes):
+    """
+    将时间间隔（分钟）转换为pandas频率字符串
+
+    Args:
+        minutes: 时间间隔（分钟）
+
+    Returns:
+        频率字符串
+    """
+    if minutes in (1, 2, 5, 10, 20):  # 分钟级数据
+        return f"{int(minutes)}min"
+    elif abs(minutes - 30) < 5:  # 30分钟左右
         return "30min"
-    elif abs(most_common_diff - 60) < 5:  # 1小时左右
+    elif abs(minutes - 60) < 5:  # 1小时左右
         return "1h"
-    elif abs(most_common_diff - 15) < 5:  # 15分钟左右
+    elif abs(minutes - 15) < 5:  # 15分钟左右
         return "15min"
+    # 如果检测不出来，默认使用最接近的标准间隔
+    elif minutes <= 45:
+        return "30min"
     else:
-        # 如果检测不出来，默认使用最接近的标准间隔
-        if most_common_diff <= 45:
-            return "30min"
-        else:
-            return "1h"
+        return "1h"
+
+
+def analyze_time_frequency(times, min_segment=48):
+    """
+    分析整个时间序列的时间间隔
+
+    对全部相邻时间差取众数作为主时间间隔；连续min_segment个以上相同且不等于
+    主间隔的时间差视为一段不同采样间隔的数据（单个的大间隔视为断数，不计入）
+
+    Args:
+        times: 时间序列
+        min_segment: 判定为不同采样间隔所需的最少连续时间差个数，默认为48
+
+    Returns:
+        字典，包括主时间间隔freq、interval_minutes、置信度confidence（等于主间隔的
+        时间差占比）、不同间隔的数据段segments，以及存在不同间隔时的拆分建议
+        split_suggestion（否则为None）
+    """
+    times = pd.DatetimeIndex(ensure_datetime(pd.Series(times)).dropna()).unique().sort_values()
+    result = {
+        "freq": "30min",  # 默认值
+        "interval_minutes": 30.0,
+        "confidence": 0.0,
+        "n_intervals": max(len(times) - 1, 0),
+        "segments": [],
+        "split_suggestion": None,
+    }
+    if len(times) < 2:
+        return result
+
+    # 全部相邻时间差（分钟）
+    diffs = np.diff(times.asi8) / 60e9
+    values, counts = np.unique(diffs, return_counts=True)
+    mode = values[np.argmax(counts)]
+    result["interval_minutes"] = float(mode)
+    result["freq"] = interval_to_freq(mode)
+    result["confidence"] = round(float(counts.max() / len(diffs)), 4)
+
+    # 相同时间差的连续段
+    change = np.flatnonzero(np.diff(diffs) != 0) + 1
+    run_starts = np.concatenate(([0], change))
+    run_ends = np.concatenate((change, [len(diffs)]))
+    run_values = diffs[run_starts]
+    keep = (run_values != mode) & (run_ends - run_starts >= min_segment)
+
+    for run_start, run_end, minutes in zip(run_starts[keep], run_ends[keep], run_values[keep]):
+        result["segments"].append({
+            "start": times[run_start],
+            "end": times[run_end],
+            "interval_minutes": float(minutes),
+            "freq": interval_to_freq(minutes),
+            "n_intervals": int(run_end - run_start),
+        })
+
+    # 拆分建议：不同间隔的数据段之间为主时间间隔
+    if result["segments"]:
+        periods = []
+        cursor = times[0]
+        for segment in result["segments"]:
+            if segment["start"] > cursor:
+                periods.append({"start": cursor, "end": segment["start"], "freq": result["freq"]})
+            periods.append({"start": segment["start"], "end": segment["end"], "freq": segment["freq"]})
+            cursor = segment["end"]
+        if cursor < times[-1]:
+            periods.append({"start": cursor, "end": times[-1], "freq": result["freq"]})
+        result["split_suggestion"] = periods
+    return result
+
+
+def detect_time_frequency(data):
+    """自动检测数据的时间间隔"""
+    return analyze_time_frequency(data["record_time"])["freq"]
 
 if __name__ == "__main__":
     # 测试代码
@@ -0,0 +1,102 @@
+"""
+增量处理模块
+
+数据文件不断追加新数据时，只处理上次处理之后的新行，并在前面附加依赖前后文的阶段
+所需的上下文数据（见 config.constants.INCREMENTAL_CONTEXT_DAYS），输出时只保留新行，
+之前时段的结果保持不变。每个站点和数据类型的状态（上次处理到的时间、各列ARIMA阶数、
+生长季日历）保存在状态目录的JSON文件中
+"""
+import os
+import json
+import datetime
+import pandas as pd
+from config.constants import INCREMENTAL_CONTEXT_DAYS
+
+
+class IncrementalState:
+    """站点/数据类型的增量处理状态"""
+
+    def __init__(self, state_dir, ftp, data_type, logger=None):
+        """
+        读取增量处理状态
+
+        Args:
+            state_dir: 状态目录
+            ftp: 站点
+            data_type: 数据类型
+            logger: 日志记录器，可选
+        """
+        self.path = os.path.join(state_dir, f"{ftp}-{data_type}.json")
+        self.data_type = data_type
+        self.logger = logger
+        os.makedirs(state_dir, exist_ok=True)
+
+        state = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        self.last_time = pd.Timestamp(state["last_time"]) if state.get("last_time") else None
+        self.arima_orders = state.get("arima_orders", {})
+        self.grow_calendar = state.get("grow_calendar", {})
+
+    def log(self, message):
+        if self.logger is not None:
+            self.logger.info(message)
+
+    @property
+    def context_days(self):
+        return INCREMENTAL_CONTEXT_DAYS.get(self.data_type, INCREMENTAL_CONTEXT_DAYS["default"])
+
+    def select(self, data, time_col="record_time"):
+        """
+        选出需要处理的数据：新行及其之前的上下文
+
+        Args:
+            data: 时间对齐后的完整数据
+            time_col: 时间列名
+
+        Returns:
+            (需要处理的数据, 新行数)
+        """
+        if self.last_time is None:
+            self.log("没有增量处理状态，处理全部数据")
+            return data, len(data)
+
+        new_rows = int((data[time_col] > self.last_time).sum())
+        start = self.last_time - pd.Timedelta(days=self.context_days)
+        selected = data[data[time_col] > start].reset_index(drop=True)
+        self.log(
+            f"增量处理: 上次处理到{self.last_time}, 新数据{new_rows}行, "
+            f"附加{self.context_days}天上下文后共{len(selected)}行"
+        )
+        return selected, new_rows
+
+    def new_rows(self, result, time_col="record_time"):
+        """只保留上次处理之后的行"""
+        if self.last_time is None:
+            return result
+        return result[result[time_col] > self.last_time].reset_index(drop=True)
+
+    def save(self, result, time_col="record_time"):
+        """
+        记录本次处理到的时间并保存状态
+
+        Args:
+            result: 本次输出的数据
+            time_col: 时间列名
+        """
+        if not result.empty:
+            self.last_time = max(
+                [t for t in (self.last_time, result[time_col].max()) if t is not None]
+            )
+        state = {
+            "last_time": str(self.last_time) if self.last_time is not None else None,
+            "arima_orders": self.arima_orders,
+            "grow_calendar": self.grow_calendar,
+            "updated_at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+        self.log(f"增量处理状态已保存: {self.path}")
@@ -0,0 +1,332 @@
+"""
+数据读取模块
+
+根据qc_indicators和数据类型构建读取schema（列类型、缺失值标记、需要的列），
+一次读取即得到float类型的数值列，避免先读成object再逐列转换。
+另外提供大文件的分块读取，以及目录中多个数据文件的并发读取与合并
+"""
+import os
+import re
+import glob
+import concurrent.futures
+import pandas as pd
+from config.constants import NOT_CONVERT_LIST
+from config.data_types import get_data_type
+from utils.result_io import detect_format, read_columnar
+from utils.timestamps import ensure_datetime
+
+# 视为缺失值的字符串
+NA_VALUES = ["NaN", "nan", "NAN", "N/A", "N/a", "n/a", " ", ""]
+
+
+def _has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def indicator_column_name(indicator, data_type):
+    """
+    获取指标在数据文件中的列名
+
+    Args:
+        indicator: qc_indicators中的一条记录
+        data_type: 数据类型
+
+    Returns:
+        列名（indicator_name为en_name的数据类型使用规范化后的en_name，如aqi；其它使用code）
+    """
+    if get_data_type(data_type).indicator_name == "en_name":
+        return re.sub(r"\W", "_", indicator["en_name"]).lower()
+    return indicator["code"]
+
+
+def needed_columns(qc_indicators, data_type):
+    """
+    获取某种数据类型在质量控制中会用到的列
+
+    Args:
+        qc_indicators: 质量控制指标
+        data_type: 数据类型
+
+    Returns:
+        列名集合
+    """
+    columns = set(NOT_CONVERT_LIST)
+    for indicator in qc_indicators:
+        if indicator["belong_to"] == data_type:
+            columns.add(indicator_column_name(indicator, data_type))
+    columns.update(get_data_type(data_type).extra_columns)
+    return columns
+
+
+def build_read_schema(header, qc_indicators=None, data_type=None, only_needed=False):
+    """
+    构建读取参数
+
+    Args:
+        header: 文件中的列名列表
+        qc_indicators: 质量控制指标
+        data_type: 数据类型
+        only_needed: 是否只读取质量控制会用到的列
+
+    Returns:
+        传给 pd.read_csv 的 usecols、dtype、na_values 参数字典
+    """
+    columns = list(header)
+    if only_needed and qc_indicators is not None and data_type is not None:
+        wanted = needed_columns(qc_indicators, data_type)
+        columns = [col for col in columns if col in wanted]
+
+    dtype = {col: "float64" for col in columns if col not in NOT_CONVERT_LIST and col != "id"}
+    return {
+        "usecols": columns,
+        "dtype": dtype,
+        "na_values": NA_VALUES,
+        "keep_default_na": True,
+    }
+
+
+def read_data_file(file_path, qc_indicators=None, data_type=None, only_needed=False,
+                   engine="auto"):
+    """
+    按schema读取数据文件，数值列直接读为float64
+
+    支持CSV以及Parquet、Feather（Arrow IPC）格式，列式格式按扩展名识别
+
+    文件中存在无法解析为数字的值时，回退为逐列 pd.to_numeric(errors="coerce")，
+    结果与原先的处理方式一致
+
+    Args:
+        file_path: 数据文件路径
+        qc_indicators: 质量控制指标
+        data_type: 数据类型
+        only_needed: 是否只读取质量控制会用到的列
+        engine: CSV解析引擎，"auto"时优先使用pyarrow
+
+    Returns:
+        读取的DataFrame
+    """
+    if detect_format(file_path) in ("parquet", "feather"):
+        return read_columnar_data_file(file_path, qc_indicators, data_type, only_needed)
+
+    if engine == "auto":
+        engine = "pyarrow" if _has_pyarrow() else "c"
+
+    header = pd.read_csv(file_path, nrows=0).columns
+    schema = build_read_schema(header, qc_indicators, data_type, only_needed)
+
+    try:
+        return pd.read_csv(file_path, engine=engine, **schema)
+    except (ValueError, TypeError):
+        # 存在非数字内容，先按字符串读取再转换
+        dtype = schema.pop("dtype")
+        data = pd.read_csv(file_path, engine=engine, dtype=str, **schema)
+        for col in dtype:
+            data[col] = pd.to_numeric(data[col], errors="coerce")
+        return data
+
+
+def read_columnar_data_file(file_path, qc_indicators=None, data_type=None, only_needed=False):
+    """
+    读取Parquet或Feather格式的数据文件，非数值列转换为float64
+
+    Args:
+        file_path: 数据文件路径
+        qc_indicators: 质量控制指标
+        data_type: 数据类型
+        only_needed: 是否只读取质量控制会用到的列
+
+    Returns:
+        读取的DataFrame
+    """
+    columns = None
+    if only_needed and qc_indicators is not None and data_type is not None:
+        wanted = needed_columns(qc_indicators, data_type)
+        header = _columnar_header(file_path)
+        columns = [col for col in header if col in wanted]
+
+    data = read_columnar(file_path, columns=columns)
+    for col in data.columns:
+        if col in NOT_CONVERT_LIST or col == "id":
+            continue
+        if not pd.api.types.is_float_dtype(data[col]):
+            data[col] = pd.to_numeric(
+                data[col].replace(NA_VALUES, float("nan")), errors="coerce"
+            ).astype("float64")
+    return data
+
+
+def _columnar_header(file_path):
+    """读取列式文件的列名"""
+    if detect_format(file_path) == "parquet":
+        import pyarrow.parquet as pq
+        return pq.read_schema(file_path).names
+    import pyarrow.ipc as ipc
+    with ipc.open_file(file_path) as reader:
+        return reader.schema.names
+
+
+def _coerce_chunk(chunk):
+    """将数据块中的非数值列转换为float64，时间列解析为datetime并排序"""
+    for col in chunk.columns:
+        if col in NOT_CONVERT_LIST or col == "id":
+            continue
+        if not pd.api.types.is_float_dtype(chunk[col]):
+            chunk[col] = pd.to_numeric(
+                chunk[col].replace(NA_VALUES, float("nan")), errors="coerce"
+            ).astype("float64")
+    if "record_time" in chunk.columns:
+        chunk["record_time"] = ensure_datetime(chunk["record_time"], errors="coerce")
+        chunk = chunk.sort_values("record_time", kind="stable").reset_index(drop=True)
+    return chunk
+
+
+def iter_data_chunks(file_path, qc_indicators=None, data_type=None, only_needed=False,
+                     chunksize=50000):
+    """
+    分块读取数据文件
+
+    每块的数值列为float64，record_time已解析并在块内按时间排序。
+    块之间的顺序与文件一致，文件整体无序或有重复时间时，需在拼接后统一对齐时间网格
+
+    Args:
+        file_path: 数据文件路径
+        qc_indicators: 质量控制指标
+        data_type: 数据类型
+        only_needed: 是否只读取质量控制会用到的列
+        chunksize: 每块的行数，默认为50000
+
+    Yields:
+        数据块DataFrame
+    """
+    file_format = detect_format(file_path)
+    if file_format == "parquet":
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(file_path)
+        columns = None
+        if only_needed and qc_indicators is not None and data_type is not None:
+            wanted = needed_columns(qc_indicators, data_type)
+            columns = [col for col in parquet_file.schema_arrow.names if col in wanted]
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            yield _coerce_chunk(batch.to_pandas())
+        return
+
+    if file_format == "feather":
+        # Arrow IPC文件按record batch读取
+        import pyarrow.ipc as ipc
+        wanted = None
+        if only_needed and qc_indicators is not None and data_type is not None:
+            wanted = needed_columns(qc_indicators, data_type)
+        with ipc.open_file(file_path) as reader:
+            for i in range(reader.num_record_batches):
+                chunk = reader.get_batch(i).to_pandas()
+                if wanted is not None:
+                    chunk = chunk[[col for col in chunk.columns if col in wanted]]
+                yield _coerce_chunk(chunk)
+        return
+
+    # pyarrow引擎不支持分块读取，这里使用c引擎，数值列由解析器直接推断为float
+    header = pd.read_csv(file_path, nrows=0).columns
+    schema = build_read_schema(header, qc_indicators, data_type, only_needed)
+    schema.pop("dtype")
+    for chunk in pd.read_csv(file_path, engine="c", chunksize=chunksize, **schema):
+        yield _coerce_chunk(chunk)
+
+
+def list_data_files(input_dir, pattern="*.csv"):
+    """
+    列出目录中匹配的数据文件
+
+    Args:
+        input_dir: 数据目录
+        pattern: 文件名匹配模式，默认为"*.csv"
+
+    Returns:
+        按文件名排序的文件路径列表
+    """
+    return sorted(
+        path for path in glob.glob(os.path.join(input_dir, pattern)) if os.path.isfile(path)
+    )
+
+
+def _read_fragment(file_path, qc_indicators, data_type, only_needed):
+    data = read_data_file(file_path, qc_indicators, data_type, only_needed)
+    if "id" in data.columns:
+        data = data.drop(columns="id")
+    # 各文件的时间格式可能不同，分别解析
+    data["record_time"] = ensure_datetime(data["record_time"], errors="coerce")
+    return data
+
+
+def read_data_dir(input_dir, pattern="*.csv", qc_indicators=None, data_type=None,
+                  only_needed=False, max_workers=8):
+    """
+    并发读取目录中的多个数据文件并合并
+
+    各文件的列取并集（缺少的列为NaN），重叠的时间保留文件名排序靠后的文件中的记录，
+    结果按时间排序
+
+    Args:
+        input_dir: 数据目录
+        pattern: 文件名匹配模式，默认为"*.csv"
+        qc_indicators: 质量控制指标
+        data_type: 数据类型
+        only_needed: 是否只读取质量控制会用到的列
+        max_workers: 最大读取线程数，默认为8
+
+    Returns:
+        (合并后的数据, 统计信息)，统计信息包括文件数、读取行数、列数、
+        删除的重叠时间行数
+    """
+    files = list_data_files(input_dir, pattern)
+    if not files:
+        raise FileNotFoundError(f"目录 {input_dir} 中没有匹配 {pattern} 的文件")
+    return read_data_files(files, qc_indicators, data_type, only_needed, max_workers)
+
+
+def read_data_files(files, qc_indicators=None, data_type=None, only_needed=False,
+                    max_workers=8):
+    """
+    并发读取多个数据文件并合并
+
+    各文件的列取并集（缺少的列为NaN），重叠的时间保留列表中靠后的文件中的记录，
+    结果按时间排序
+
+    Args:
+        files: 数据文件路径列表
+        qc_indicators: 质量控制指标
+        data_type: 数据类型
+        only_needed: 是否只读取质量控制会用到的列
+        max_workers: 最大读取线程数，默认为8
+
+    Returns:
+        (合并后的数据, 统计信息)，统计信息包括文件数、读取行数、列数、
+        删除的重叠时间行数
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        fragments = list(executor.map(
+            lambda path: _read_fragment(path, qc_indicators, data_type, only_needed), files
+        ))
+
+    rows_in = sum(len(fragment) for fragment in fragments)
+    data = pd.concat(fragments, ignore_index=True, join="outer")
+    del fragments
+
+    # 稳定排序后保留最后一条，即列表中靠后的文件优先
+    data = data.sort_values("record_time", kind="stable")
+    duplicated = data["record_time"].duplicated(keep="last") & data["record_time"].notna()
+    if duplicated.any():
+        data = data[~duplicated]
+    data = data.reset_index(drop=True)
+
+    summary = {
+        "files": len(files),
+        "rows_in": rows_in,
+        "rows_out": len(data),
+        "columns": len(data.columns),
+        "duplicates_dropped": int(duplicated.sum()),
+    }
+    return data, summary
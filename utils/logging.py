@@ -1,23 +1,85 @@
 """
 日志配置模块
+
+json_lines模式下日志文件每行一条JSON记录，日志记录器只将记录放入队列（QueueHandler），
+由后台线程（QueueListener）写入控制台和文件，处理线程和多进程中的各工作进程不会阻塞在磁盘写入上。
+
+处理模块不直接print，而是通过get_task_logger()取得当前任务的日志记录器（DataQc运行时
+用use_task_logger设置），输出与该任务的其它日志写入同一文件；没有当前任务时（直接调用
+处理函数）输出到控制台。子进程中的处理函数通过forward_worker_logs把日志经队列转发回
+主进程的任务日志记录器
 """
 import os
+import json
+import queue
 import logging
 import datetime
-from logging.handlers import RotatingFileHandler
+import contextvars
+import multiprocessing
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+
+LOG_FORMATS = ["text", "json"]
+
+FALLBACK_LOGGER = "data_qc"
+
+_current_task_logger = contextvars.ContextVar("qc_task_logger", default=None)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """将日志记录格式化为一行JSON"""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "process": record.process,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def _text_formatter():
+    return logging.Formatter(
+        '%(asctime)s - %(levelname)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+
+
+def _fallback_logger():
+    """没有当前任务时使用的日志记录器，INFO及以上输出到控制台"""
+    logger = logging.getLogger(FALLBACK_LOGGER)
+    if not logger.handlers:
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(logging.INFO)
+        console_handler.setFormatter(_text_formatter())
+        logger.addHandler(console_handler)
+        logger.setLevel(logging.INFO)
+        # 已经输出到控制台，不再传给根日志记录器，避免重复输出
+        logger.propagate = False
+    return logger
 
 
-def setup_logger(ftp, log_dir="../logs"):
+def setup_logger(ftp, log_dir="../logs", log_format="text"):
     """
     设置日志记录器
     
     Args:
         ftp: 站点FTP名称，用于生成日志文件名
         log_dir: 日志保存目录，默认为"../logs"
+        log_format: 日志文件格式，text为文本（默认），json为JSON lines（*.jsonl），
+            json时通过队列由后台线程写入
     
     Returns:
         logger: 配置好的日志记录器
     """
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f"不支持的日志格式: {log_format}，可选: {', '.join(LOG_FORMATS)}")
+
     # 确保日志目录存在
     if not os.path.exists(log_dir):
         os.makedirs(log_dir)
@@ -26,7 +88,7 @@ def setup_logger(ftp, log_dir="../logs"):
     time_str = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
     
     # 日志文件名格式：ftp + 时间戳
-    log_filename = f"{ftp}{time_str}.txt"
+    log_filename = f"{ftp}{time_str}.{'jsonl' if log_format == 'json' else 'txt'}"
     log_path = os.path.join(log_dir, log_filename)
     
     # 创建日志记录器
@@ -48,18 +110,23 @@ def setup_logger(ftp, log_dir="../logs"):
     file_handler.setLevel(logging.DEBUG)
     
     # 定义日志格式
-    log_format = logging.Formatter(
-        '%(asctime)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
+    text_format = _text_formatter()
     
     # 设置处理器格式
-    console_handler.setFormatter(log_format)
-    file_handler.setFormatter(log_format)
-    
-    # 添加处理器到日志记录器
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+    console_handler.setFormatter(text_format)
+    if log_format == "json":
+        file_handler.setFormatter(JsonLinesFormatter())
+        # 记录放入队列，由后台线程写入控制台和文件
+        log_queue = queue.SimpleQueue()
+        listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+        listener.start()
+        logger.addHandler(QueueHandler(log_queue))
+        logger.queue_listener = listener
+    else:
+        file_handler.setFormatter(text_format)
+        # 添加处理器到日志记录器
+        logger.addHandler(console_handler)
+        logger.addHandler(file_handler)
     
     # 记录初始信息
     logger.info("=" * 50)
@@ -73,16 +140,35 @@ def setup_logger(ftp, log_dir="../logs"):
     return logger
 
 
-def get_task_logger(task_id):
+@contextmanager
+def use_task_logger(logger):
+    """
+    在代码块内将logger设为当前任务的日志记录器，处理模块通过get_task_logger()取得
+
+    Args:
+        logger: 日志记录器
+    """
+    token = _current_task_logger.set(logger)
+    try:
+        yield logger
+    finally:
+        _current_task_logger.reset(token)
+
+
+def get_task_logger(task_id=None):
     """
     获取特定任务的日志记录器
     
     Args:
-        task_id: 任务ID
+        task_id: 任务ID，为None时返回当前任务的日志记录器（见 use_task_logger），
+            没有当前任务时返回输出到控制台的日志记录器"data_qc"
     
     Returns:
         logger: 任务日志记录器
     """
+    if task_id is None:
+        current = _current_task_logger.get()
+        return current if current is not None else _fallback_logger()
     logger = logging.getLogger(f"task_{task_id}")
     if not logger.handlers:
         # 如果这个logger还没有被配置，则使用根logger的配置
@@ -94,6 +180,56 @@ def get_task_logger(task_id):
     return logger
 
 
+class _ForwardHandler(logging.Handler):
+    """将子进程的日志记录交给主进程中的日志记录器处理"""
+
+    def __init__(self, logger):
+        super().__init__()
+        self.logger = logger
+
+    def emit(self, record):
+        self.logger.handle(record)
+
+
+@contextmanager
+def forward_worker_logs(logger):
+    """
+    在代码块内接收子进程的日志记录并转发给logger，
+    子进程启动时以返回的队列调用init_worker_logging
+
+    Args:
+        logger: 主进程中的日志记录器
+
+    Yields:
+        日志队列
+    """
+    log_queue = multiprocessing.Queue()
+    listener = QueueListener(log_queue, _ForwardHandler(logger))
+    listener.start()
+    try:
+        yield log_queue
+    finally:
+        listener.stop()
+        log_queue.close()
+        log_queue.join_thread()
+
+
+def init_worker_logging(log_queue):
+    """
+    子进程初始化：将当前任务的日志记录器设为写入log_queue的记录器
+    （进程池的initializer，队列见 forward_worker_logs）
+
+    Args:
+        log_queue: 日志队列
+    """
+    logger = logging.getLogger(f"data_qc_worker_{os.getpid()}")
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    if not logger.handlers:
+        logger.addHandler(QueueHandler(log_queue))
+    _current_task_logger.set(logger)
+
+
 def close_logger(logger, success=True):
     """
     关闭日志记录器
@@ -107,6 +243,14 @@ def close_logger(logger, success=True):
     logger.info(f"日志记录结束 - {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     logger.info("=" * 50)
     
+    # json模式下先停止后台线程，写完队列中剩余的记录
+    listener = getattr(logger, "queue_listener", None)
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+        logger.queue_listener = None
+
     # 关闭所有处理器
     for handler in logger.handlers[:]:
         handler.close()
@@ -0,0 +1,105 @@
+"""
+进程内存统计模块
+
+读取当前进程的常驻内存（RSS）和峰值内存：Linux读取/proc/self/status，
+Windows调用GetProcessMemoryInfo，其它系统使用resource模块（只能得到峰值）；
+以及低内存模式下测量值列的float32转换
+"""
+import os
+import sys
+
+
+def _linux_status():
+    values = {}
+    with open("/proc/self/status", "r") as f:
+        for line in f:
+            if line.startswith(("VmRSS:", "VmHWM:")):
+                key, value = line.split(":", 1)
+                values[key] = int(value.split()[0]) / 1024  # kB -> MB
+    return values.get("VmRSS"), values.get("VmHWM")
+
+
+def _windows_memory():
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(PROCESS_MEMORY_COUNTERS)
+    handle = ctypes.windll.kernel32.GetCurrentProcess()
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+        return None, None
+    return counters.WorkingSetSize / 1024 / 1024, counters.PeakWorkingSetSize / 1024 / 1024
+
+
+def _resource_peak():
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS单位为字节，其它系统为KB
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def memory_usage():
+    """
+    获取当前进程的内存占用
+
+    Returns:
+        (当前RSS, 峰值RSS)，单位MB，无法获取时对应值为None
+    """
+    try:
+        if sys.platform.startswith("linux") and os.path.exists("/proc/self/status"):
+            return _linux_status()
+        if sys.platform == "win32":
+            return _windows_memory()
+        return None, _resource_peak()
+    except (OSError, ValueError, AttributeError, ImportError):
+        return None, None
+
+
+def current_rss_mb():
+    """当前进程常驻内存（MB）"""
+    return memory_usage()[0]
+
+
+def peak_rss_mb():
+    """当前进程峰值内存（MB）"""
+    return memory_usage()[1]
+
+
+def downcast_floats(data, exclude=()):
+    """
+    将float64列转换为float32（低内存模式）
+
+    Args:
+        data: 数据DataFrame
+        exclude: 不转换的列
+
+    Returns:
+        转换后的数据
+    """
+    cols = [col for col in data.columns if data[col].dtype == "float64" and col not in exclude]
+    if cols:
+        data[cols] = data[cols].astype("float32")
+    return data
+
+
+def upcast_floats(data):
+    """将float32列转换回float64（传给R等只支持双精度的接口前使用）"""
+    cols = [col for col in data.columns if data[col].dtype == "float32"]
+    if not cols:
+        return data
+    return data.astype({col: "float64" for col in cols})
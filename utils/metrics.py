@@ -0,0 +1,286 @@
+"""
+运行指标模块
+
+DataQc和各处理模块在运行过程中向当前的指标收集器（MetricsCollector）报告输入输出行数、
+各阶段筛除的数据个数、阶段耗时、ARIMA拟合次数、R调用耗时和峰值内存，运行结束后写入
+JSON文件和Prometheus node-exporter的textfile（*.prom），供监控系统绘图和报警。
+
+收集器通过contextvars传递：DataQc运行时将收集器设为当前收集器，处理模块调用
+record_* 函数报告数据，没有当前收集器时这些函数直接返回
+"""
+import os
+import json
+import time
+import datetime
+import threading
+import contextvars
+from contextlib import contextmanager
+from utils.memory import memory_usage
+
+_current_metrics = contextvars.ContextVar("qc_metrics", default=None)
+_current_stage = contextvars.ContextVar("qc_stage", default=None)
+
+METRIC_PREFIX = "qc"
+
+
+class MetricsCollector:
+    """一次质量控制运行的指标"""
+
+    def __init__(self, site, data_type, task_id=None):
+        """
+        初始化
+
+        Args:
+            site: 站点
+            data_type: 数据类型
+            task_id: 任务ID
+        """
+        self.site = site
+        self.data_type = data_type
+        self.task_id = task_id
+        self.started_at = time.time()
+        self.finished_at = None
+        self.success = None
+        self.rows_in = 0
+        self.rows_out = 0
+        self.arima_fits = 0
+        self.peak_memory_mb = None
+        # 阶段 -> {seconds, runs, peak_mb}
+        self.stages = {}
+        # (阶段, 列) -> 筛除的数据个数
+        self.flagged = {}
+        # R函数 -> {calls, seconds}
+        self.r_calls = {}
+        # 阶段并行执行时各线程同时报告
+        self._lock = threading.Lock()
+
+    def add_flagged(self, stage, column, count):
+        key = (stage or "unknown", column)
+        with self._lock:
+            self.flagged[key] = self.flagged.get(key, 0) + int(count)
+
+    def add_arima_fit(self):
+        with self._lock:
+            self.arima_fits += 1
+
+    def add_r_call(self, operation, seconds):
+        with self._lock:
+            item = self.r_calls.setdefault(operation, {"calls": 0, "seconds": 0.0})
+            item["calls"] += 1
+            item["seconds"] += seconds
+
+    def add_stage_records(self, records):
+        """
+        添加流水线的阶段记录
+
+        Args:
+            records: PipelineRunner.records
+        """
+        for record in records:
+            if record["status"] != "run":
+                continue
+            item = self.stages.setdefault(record["stage"], {"runs": 0, "seconds": 0.0, "peak_mb": None})
+            item["runs"] += 1
+            item["seconds"] += record["seconds"]
+            if record["peak_mb"] is not None:
+                item["peak_mb"] = max(item["peak_mb"] or 0.0, record["peak_mb"])
+
+    def finish(self, success):
+        """记录运行结果和进程峰值内存"""
+        self.finished_at = time.time()
+        self.success = bool(success)
+        self.peak_memory_mb = memory_usage()[1]
+
+    @property
+    def duration_seconds(self):
+        return (self.finished_at or time.time()) - self.started_at
+
+    def to_dict(self):
+        """转换为JSON文档"""
+        return {
+            "site": self.site,
+            "data_type": self.data_type,
+            "task_id": self.task_id,
+            "started_at": datetime.datetime.fromtimestamp(self.started_at).isoformat(timespec="seconds"),
+            "duration_seconds": round(self.duration_seconds, 3),
+            "success": self.success,
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "arima_fits": self.arima_fits,
+            "peak_memory_mb": round(self.peak_memory_mb, 1) if self.peak_memory_mb is not None else None,
+            "stages": [
+                {"stage": stage, "runs": item["runs"], "seconds": round(item["seconds"], 4),
+                 "peak_mb": item["peak_mb"]}
+                for stage, item in self.stages.items()
+            ],
+            "flagged": [
+                {"stage": stage, "column": column, "count": count}
+                for (stage, column), count in self.flagged.items()
+            ],
+            "r_calls": [
+                {"operation": operation, "calls": item["calls"], "seconds": round(item["seconds"], 4)}
+                for operation, item in self.r_calls.items()
+            ],
+        }
+
+    def to_prometheus(self):
+        """转换为Prometheus文本格式"""
+        base = {"site": self.site, "data_type": self.data_type}
+        metrics = [
+            ("run_success", "gauge", "最近一次运行是否成功", [(base, int(bool(self.success)))]),
+            ("run_timestamp_seconds", "gauge", "最近一次运行结束时间",
+             [(base, self.finished_at or time.time())]),
+            ("run_duration_seconds", "gauge", "最近一次运行耗时", [(base, self.duration_seconds)]),
+            ("rows_in", "gauge", "输入行数", [(base, self.rows_in)]),
+            ("rows_out", "gauge", "输出行数", [(base, self.rows_out)]),
+            ("arima_fits", "gauge", "ARIMA模型拟合次数", [(base, self.arima_fits)]),
+            ("stage_duration_seconds", "gauge", "各阶段耗时",
+             [({**base, "stage": stage}, item["seconds"]) for stage, item in self.stages.items()]),
+            ("flagged_values", "gauge", "各阶段筛除（置为NaN）的数据个数",
+             [({**base, "stage": stage, "column": column}, count)
+              for (stage, column), count in self.flagged.items()]),
+            ("r_calls", "gauge", "R函数调用次数",
+             [({**base, "operation": op}, item["calls"]) for op, item in self.r_calls.items()]),
+            ("r_call_duration_seconds", "gauge", "R函数调用耗时（含数据转换）",
+             [({**base, "operation": op}, item["seconds"]) for op, item in self.r_calls.items()]),
+        ]
+        if self.peak_memory_mb is not None:
+            metrics.append(("peak_memory_bytes", "gauge", "进程峰值内存",
+                            [(base, self.peak_memory_mb * 1024 * 1024)]))
+
+        lines = []
+        for name, metric_type, help_text, samples in metrics:
+            if not samples:
+                continue
+            full_name = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {metric_type}")
+            for labels, value in samples:
+                lines.append(f"{full_name}{{{_format_labels(labels)}}} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, metrics_dir):
+        """
+        写入JSON文件和Prometheus textfile
+
+        JSON文件按运行时间命名，每次运行一个；textfile按站点和数据类型命名，
+        每次运行覆盖（node-exporter读取目录中的 *.prom 文件）
+
+        Args:
+            metrics_dir: 输出目录
+
+        Returns:
+            (JSON文件路径, textfile路径)
+        """
+        os.makedirs(metrics_dir, exist_ok=True)
+        time_str = datetime.datetime.fromtimestamp(self.started_at).strftime("%Y%m%d%H%M%S")
+        json_path = os.path.join(metrics_dir, f"{self.site}_{self.data_type}_{time_str}.json")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+        # 先写临时文件再替换，避免node-exporter读到写了一半的文件
+        prom_path = os.path.join(metrics_dir, f"qc_{self.site}_{self.data_type}.prom")
+        tmp_path = prom_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, prom_path)
+        return json_path, prom_path
+
+
+def _format_labels(labels):
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+    return ",".join(f'{key}="{escape(value)}"' for key, value in labels.items())
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+def current_metrics():
+    """当前的指标收集器，没有时返回None"""
+    return _current_metrics.get()
+
+
+@contextmanager
+def use_metrics(collector):
+    """
+    在代码块内将collector设为当前的指标收集器
+
+    Args:
+        collector: MetricsCollector，为None时不改变当前收集器
+    """
+    if collector is None:
+        yield None
+        return
+    token = _current_metrics.set(collector)
+    try:
+        yield collector
+    finally:
+        _current_metrics.reset(token)
+
+
+@contextmanager
+def stage_scope(stage):
+    """在代码块内将stage设为当前阶段，处理模块报告的筛除个数计入该阶段"""
+    token = _current_stage.set(stage)
+    try:
+        yield
+    finally:
+        _current_stage.reset(token)
+
+
+def record_flagged(column, count):
+    """
+    报告当前阶段某列筛除（置为NaN）的数据个数
+
+    Args:
+        column: 列名
+        count: 个数
+    """
+    collector = _current_metrics.get()
+    if collector is not None:
+        collector.add_flagged(_current_stage.get(), column, count)
+
+
+def record_arima_fit():
+    """报告一次ARIMA模型拟合"""
+    collector = _current_metrics.get()
+    if collector is not None:
+        collector.add_arima_fit()
+
+
+def record_r_call(operation, seconds):
+    """
+    报告一次R函数调用
+
+    Args:
+        operation: R函数名称
+        seconds: 耗时（含数据转换）
+    """
+    collector = _current_metrics.get()
+    if collector is not None:
+        collector.add_r_call(operation, seconds)
+
+
+def write_metrics(collector, metrics_dir, success, logger):
+    """
+    结束指标收集并写入指标目录，写入失败只记录警告，不影响处理结果
+
+    Args:
+        collector: MetricsCollector，为None时直接返回
+        metrics_dir: 指标目录
+        success: 运行是否成功
+        logger: 日志记录器
+    """
+    if collector is None or not metrics_dir:
+        return
+    collector.finish(success)
+    try:
+        json_path, prom_path = collector.write(metrics_dir)
+        logger.info(f"运行指标已保存至: {json_path}, {prom_path}")
+    except OSError as e:
+        logger.warning(f"运行指标写入失败: {str(e)}")
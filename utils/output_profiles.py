@@ -0,0 +1,86 @@
+"""
+输出方案模块
+
+根据 config.constants.OUTPUT_COLUMNS 中按数据类型声明的列配置选择输出列，
+并在中间列最后一次被使用后及时删除，减少输出文件大小和内存峰值
+"""
+import fnmatch
+from config.constants import OUTPUT_PROFILES, OUTPUT_COLUMNS, FLUX_INTERMEDIATE_LAST_USE
+from utils.ingest import needed_columns
+
+
+def _match(columns, patterns):
+    """返回匹配任一模式的列，保持原有顺序"""
+    return [col for col in columns if any(fnmatch.fnmatchcase(col, p) for p in patterns)]
+
+
+def profile_patterns(data_type, profile, qc_indicators):
+    """
+    获取输出方案的列模式列表
+
+    Args:
+        data_type: 数据类型
+        profile: 输出方案（final、audit、full）
+        qc_indicators: 质量控制指标
+
+    Returns:
+        列模式列表，full方案返回 ["*"]
+    """
+    if profile not in OUTPUT_PROFILES:
+        raise ValueError(f"不支持的输出方案: {profile}，可选 {OUTPUT_PROFILES}")
+    if profile == "full":
+        return ["*"]
+
+    column_map = OUTPUT_COLUMNS.get(data_type, OUTPUT_COLUMNS["default"])
+    patterns = list(column_map["final"])
+    if profile == "audit":
+        patterns += column_map["audit"]
+
+    if "{inputs}" in patterns:
+        patterns.remove("{inputs}")
+        patterns += sorted(needed_columns(qc_indicators, data_type))
+    return patterns
+
+
+def select_output_columns(data, data_type, profile, qc_indicators):
+    """
+    按输出方案选择输出列
+
+    Args:
+        data: 处理后的数据
+        data_type: 数据类型
+        profile: 输出方案
+        qc_indicators: 质量控制指标
+
+    Returns:
+        只包含输出列的数据
+    """
+    if profile == "full":
+        return data
+    columns = _match(data.columns, profile_patterns(data_type, profile, qc_indicators))
+    if "record_time" in data.columns and "record_time" not in columns:
+        columns.insert(0, "record_time")
+    return data[columns]
+
+
+def release_intermediates(data, data_type, profile, stage, qc_indicators):
+    """
+    删除在stage之后不再使用、且输出方案不包含的中间列
+
+    Args:
+        data: 当前数据
+        data_type: 数据类型
+        profile: 输出方案
+        stage: 刚执行完的阶段名称
+        qc_indicators: 质量控制指标
+
+    Returns:
+        删除中间列后的数据
+    """
+    if profile == "full" or data_type != "flux" or stage not in FLUX_INTERMEDIATE_LAST_USE:
+        return data
+    keep = set(_match(data.columns, profile_patterns(data_type, profile, qc_indicators)))
+    drop = [col for col in _match(data.columns, FLUX_INTERMEDIATE_LAST_USE[stage]) if col not in keep]
+    if drop:
+        data = data.drop(columns=drop)
+    return data
@@ -0,0 +1,116 @@
+"""
+R调用性能统计模块
+
+记录每次R调用中数据转换（py2rpy/rpy2py）、R函数整体以及REddyProc各步骤
+（sEddyProc$new、每个指标的sMDSGapFill、sEstUstarThold、sMRFluxPartition等）
+的耗时和R端gc()内存变化，输出到运行日志和JSON文件
+"""
+import json
+import time
+from contextlib import contextmanager
+
+
+class RProfiler:
+    """R调用耗时与内存统计"""
+
+    def __init__(self):
+        self.records = []
+
+    def add(self, operation, step, seconds, mem_before_mb=None, mem_after_mb=None,
+            mem_peak_mb=None):
+        """
+        添加一条记录
+
+        Args:
+            operation: R函数名称（如 r_co2_flux）
+            step: 步骤名称（如 py2rpy、sMDSGapFill:le_despiking）
+            seconds: 耗时（秒）
+            mem_before_mb: 步骤开始前R已用内存（MB）
+            mem_after_mb: 步骤结束后R已用内存（MB）
+            mem_peak_mb: 步骤期间R内存峰值（MB）
+        """
+        record = {"operation": operation, "step": step, "seconds": round(float(seconds), 4)}
+        if mem_before_mb is not None:
+            record["mem_before_mb"] = round(float(mem_before_mb), 2)
+            record["mem_after_mb"] = round(float(mem_after_mb), 2)
+            record["mem_delta_mb"] = round(float(mem_after_mb) - float(mem_before_mb), 2)
+            record["mem_peak_mb"] = round(float(mem_peak_mb), 2)
+        self.records.append(record)
+
+    @contextmanager
+    def measure(self, operation, step):
+        """
+        统计Python端代码块的耗时
+
+        Args:
+            operation: R函数名称
+            step: 步骤名称
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(operation, step, time.perf_counter() - start)
+
+    def add_r_records(self, operation, r_records):
+        """
+        添加R端 qc_profile_records() 返回的记录
+
+        Args:
+            operation: R函数名称
+            r_records: 包含label、seconds、mem_*_mb列的DataFrame
+        """
+        for row in r_records.to_dict("records"):
+            self.add(
+                operation,
+                row["label"],
+                row["seconds"],
+                mem_before_mb=row["mem_before_mb"],
+                mem_after_mb=row["mem_after_mb"],
+                mem_peak_mb=row["mem_peak_mb"],
+            )
+
+    def merge(self, records, segment=None):
+        """
+        合并其它进程中记录的统计结果（按年并行时各子进程的R调用）
+
+        Args:
+            records: 记录列表（见 add）
+            segment: 记录所属的数据段（如 2023-01-01~2024-01-01），写入每条记录
+        """
+        for record in records:
+            record = dict(record)
+            if segment is not None:
+                record["segment"] = segment
+            self.records.append(record)
+
+    def log_summary(self, logger):
+        """
+        将统计结果输出到日志
+
+        Args:
+            logger: 日志记录器
+        """
+        if not self.records:
+            return
+        logger.info("R调用耗时统计:")
+        for record in self.records:
+            line = f"  {record['operation']:<16} {record['step']:<40} {record['seconds']:9.3f} s"
+            if "mem_delta_mb" in record:
+                line += (
+                    f"  内存变化 {record['mem_delta_mb']:+9.2f} MB"
+                    f"  峰值 {record['mem_peak_mb']:9.2f} MB"
+                )
+            logger.info(line)
+        total = sum(r["seconds"] for r in self.records if r["step"] in ("py2rpy", "r_call", "rpy2py"))
+        logger.info(f"  R调用合计（含数据转换）: {total:.3f} s")
+
+    def write_json(self, path):
+        """
+        将统计结果写入JSON文件
+
+        Args:
+            path: 输出文件路径
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"records": self.records}, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,133 @@
+"""
+结果文件读写模块
+
+支持CSV、Parquet（zstd压缩）和Feather（Arrow IPC）格式。列式格式在schema元数据中
+记录数据类型、站点和处理参数，供下游读取时核对
+"""
+import os
+import json
+import pandas as pd
+
+# 输出格式及对应的文件扩展名
+OUTPUT_FORMATS = {
+    "csv": ".csv",
+    "parquet": ".parquet",
+    "feather": ".feather",
+}
+
+# 列式格式可识别的扩展名
+COLUMNAR_EXTENSIONS = {
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".feather": "feather",
+    ".arrow": "feather",
+    ".ipc": "feather",
+}
+
+# schema元数据中记录处理信息的键
+METADATA_KEY = b"qc_metadata"
+
+
+def detect_format(file_path):
+    """
+    根据扩展名判断文件格式
+
+    Args:
+        file_path: 文件路径
+
+    Returns:
+        "parquet"、"feather"、"xlsx" 或 "csv"
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in COLUMNAR_EXTENSIONS:
+        return COLUMNAR_EXTENSIONS[ext]
+    if ext in (".xlsx", ".xls"):
+        return "xlsx"
+    return "csv"
+
+
+def output_path_for(base_name, output_format="csv"):
+    """
+    生成带扩展名的输出文件路径
+
+    Args:
+        base_name: 不含扩展名的文件路径
+        output_format: 输出格式
+
+    Returns:
+        输出文件路径
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"不支持的输出格式: {output_format}，可选 {list(OUTPUT_FORMATS)}")
+    return base_name + OUTPUT_FORMATS[output_format]
+
+
+def _to_table(data, metadata):
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(data, preserve_index=False)
+    if metadata:
+        schema_metadata = dict(table.schema.metadata or {})
+        schema_metadata[METADATA_KEY] = json.dumps(metadata, ensure_ascii=False, default=str).encode("utf-8")
+        table = table.replace_schema_metadata(schema_metadata)
+    return table
+
+
+def write_result(data, file_path, output_format=None, metadata=None):
+    """
+    保存处理结果
+
+    Args:
+        data: 结果数据
+        file_path: 输出文件路径
+        output_format: 输出格式，不指定时根据扩展名判断
+        metadata: 写入schema元数据的处理信息（数据类型、站点、参数等），仅列式格式保存
+    """
+    output_format = output_format or detect_format(file_path)
+    if output_format == "parquet":
+        import pyarrow.parquet as pq
+        pq.write_table(_to_table(data, metadata), file_path, compression="zstd")
+    elif output_format == "feather":
+        import pyarrow.feather as feather
+        feather.write_feather(_to_table(data, metadata), file_path)
+    elif output_format == "xlsx":
+        data.to_excel(file_path, index=False)
+    else:
+        data.to_csv(file_path, index=False)
+
+
+def read_columnar(file_path, columns=None):
+    """
+    读取Parquet或Feather文件
+
+    Args:
+        file_path: 文件路径
+        columns: 需要读取的列，默认读取全部
+
+    Returns:
+        DataFrame
+    """
+    if detect_format(file_path) == "parquet":
+        return pd.read_parquet(file_path, columns=columns)
+    return pd.read_feather(file_path, columns=columns)
+
+
+def read_result_metadata(file_path):
+    """
+    读取列式文件中记录的处理信息
+
+    Args:
+        file_path: Parquet或Feather文件路径
+
+    Returns:
+        处理信息字典，没有记录时返回空字典
+    """
+    if detect_format(file_path) == "parquet":
+        import pyarrow.parquet as pq
+        schema = pq.read_schema(file_path)
+    else:
+        import pyarrow.ipc as ipc
+        with ipc.open_file(file_path) as reader:
+            schema = reader.schema
+    raw = (schema.metadata or {}).get(METADATA_KEY)
+    return json.loads(raw.decode("utf-8")) if raw else {}
@@ -0,0 +1,272 @@
+"""
+结果库模块
+
+处理结果按 站点/数据类型/年月 分区保存为Parquet文件。每次运行只把本次产生的行
+作为增量文件写入对应分区，同一时间的记录以最后写入的为准；index.json 记录每个
+文件所属的站点、数据类型以及时间范围，按时间范围查询时只读取相关文件。
+对索引的读写由 index.lock 文件锁串行，多个进程可以同时写入同一个结果库
+"""
+import os
+import json
+import uuid
+import tempfile
+import threading
+import contextlib
+import pandas as pd
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+INDEX_FILE = "index.json"
+LOCK_FILE = "index.lock"
+
+
+class ResultStore:
+    """按站点/数据类型/年月分区的Parquet结果库"""
+
+    def __init__(self, store_dir, logger=None):
+        """
+        初始化结果库
+
+        Args:
+            store_dir: 结果库目录
+            logger: 日志记录器，可选
+        """
+        self.store_dir = store_dir
+        self.logger = logger
+        # 线程锁只在本实例内有效，多个实例、多个进程之间由索引文件锁串行
+        self._lock = threading.Lock()
+        os.makedirs(store_dir, exist_ok=True)
+
+    def log(self, message):
+        if self.logger is not None:
+            self.logger.info(message)
+
+    # ---------- 索引 ----------
+
+    def _index_path(self):
+        return os.path.join(self.store_dir, INDEX_FILE)
+
+    @contextlib.contextmanager
+    def _index_lock(self):
+        """
+        独占索引的读取-修改-写入：同一实例内的线程由线程锁串行，
+        不同实例和进程之间由 index.lock 上的文件锁串行
+        """
+        with self._lock:
+            with open(os.path.join(self.store_dir, LOCK_FILE), "a+b") as lock_file:
+                if os.name == "nt":
+                    lock_file.seek(0)
+                    # LK_LOCK 最多重试10次，锁被长时间占用时继续等待
+                    while True:
+                        try:
+                            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                            break
+                        except OSError:
+                            continue
+                    try:
+                        yield
+                    finally:
+                        lock_file.seek(0)
+                        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+                else:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                    try:
+                        yield
+                    finally:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _load_index(self):
+        path = self._index_path()
+        if not os.path.exists(path):
+            return {"next_seq": 0, "parts": []}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_index(self, index):
+        # 临时文件名唯一，避免多个写入者共用同一个临时文件
+        fd, tmp_path = tempfile.mkstemp(dir=self.store_dir, prefix=INDEX_FILE + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(index, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self._index_path())
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @staticmethod
+    def _partition_dir(ftp, data_type, month):
+        return os.path.join(f"ftp={ftp}", f"data_type={data_type}", f"month={month}")
+
+    def _write_part(self, data, ftp, data_type, month, seq):
+        """写入一个分区文件，返回索引记录"""
+        rel_dir = self._partition_dir(ftp, data_type, month)
+        os.makedirs(os.path.join(self.store_dir, rel_dir), exist_ok=True)
+        rel_path = os.path.join(rel_dir, f"part-{seq:08d}-{uuid.uuid4().hex[:8]}.parquet")
+        full_path = os.path.join(self.store_dir, rel_path)
+        tmp_path = full_path + ".tmp"
+        data.to_parquet(tmp_path, index=False, compression="zstd")
+        os.replace(tmp_path, full_path)
+        return {
+            "path": rel_path,
+            "ftp": ftp,
+            "data_type": data_type,
+            "month": month,
+            "seq": seq,
+            "rows": len(data),
+            "min_time": str(data["record_time"].min()),
+            "max_time": str(data["record_time"].max()),
+        }
+
+    # ---------- 写入 ----------
+
+    def upsert(self, data, ftp, data_type):
+        """
+        写入处理结果，已有相同时间的记录在查询时被本次结果覆盖
+
+        Args:
+            data: 处理结果，需包含record_time列
+            ftp: 站点
+            data_type: 数据类型
+
+        Returns:
+            写入的行数
+        """
+        data = data[data["record_time"].notna()]
+        if data.empty:
+            return 0
+        months = data["record_time"].dt.strftime("%Y-%m")
+
+        with self._index_lock():
+            index = self._load_index()
+            for month, part in data.groupby(months, sort=True):
+                seq = index["next_seq"]
+                index["next_seq"] += 1
+                index["parts"].append(self._write_part(
+                    part.reset_index(drop=True), ftp, data_type, month, seq
+                ))
+            self._save_index(index)
+        self.log(f"结果库写入 {ftp}/{data_type}: {len(data)}行, {months.nunique()}个分区")
+        return len(data)
+
+    # ---------- 查询 ----------
+
+    def _select_parts(self, index, ftp, data_type, start=None, end=None):
+        start = pd.Timestamp(start) if start is not None else None
+        end = pd.Timestamp(end) if end is not None else None
+        parts = []
+        for part in index["parts"]:
+            if part["ftp"] != ftp or part["data_type"] != data_type:
+                continue
+            if start is not None and pd.Timestamp(part["max_time"]) < start:
+                continue
+            if end is not None and pd.Timestamp(part["min_time"]) > end:
+                continue
+            parts.append(part)
+        return sorted(parts, key=lambda part: part["seq"])
+
+    def _read_parts(self, parts, columns=None, start=None, end=None):
+        """
+        读取多个分区文件，同一时间保留最后写入的记录
+
+        Args:
+            parts: 索引记录
+            columns: 需要的列，默认为全部列
+            start: 开始时间（含），在读取文件时过滤
+            end: 结束时间（含），在读取文件时过滤
+
+        Returns:
+            按时间排序的数据
+        """
+        import pyarrow.parquet as pq
+
+        read_columns = None if columns is None else ["record_time"] + [
+            col for col in columns if col != "record_time"
+        ]
+        filters = []
+        if start is not None:
+            filters.append(("record_time", ">=", pd.Timestamp(start)))
+        if end is not None:
+            filters.append(("record_time", "<=", pd.Timestamp(end)))
+        frames = []
+        for part in parts:
+            path = os.path.join(self.store_dir, part["path"])
+            part_columns = None
+            if read_columns is not None:
+                # 早期写入的文件可能缺少后来增加的列，只读取文件中存在的列
+                names = set(pq.read_schema(path).names)
+                part_columns = [col for col in read_columns if col in names]
+            frame = pd.read_parquet(path, columns=part_columns, filters=filters or None)
+            if read_columns is not None:
+                frame = frame.reindex(columns=read_columns)
+            frames.append(frame)
+        data = pd.concat(frames, ignore_index=True)
+        data = data.drop_duplicates(subset="record_time", keep="last")
+        return data.sort_values("record_time").reset_index(drop=True)
+
+    def query(self, ftp, data_type, start=None, end=None, columns=None):
+        """
+        查询时间范围内的结果
+
+        Args:
+            ftp: 站点
+            data_type: 数据类型
+            start: 开始时间（含），默认不限
+            end: 结束时间（含），默认不限
+            columns: 需要的列，默认为全部列
+
+        Returns:
+            按时间排序的数据
+        """
+        with self._index_lock():
+            parts = self._select_parts(self._load_index(), ftp, data_type, start, end)
+            if not parts:
+                return pd.DataFrame(columns=["record_time"] + list(columns or []))
+            # 在锁内读取，避免读取过程中文件被合并删除
+            return self._read_parts(parts, columns, start, end)
+
+    # ---------- 合并 ----------
+
+    def compact(self, ftp=None, data_type=None):
+        """
+        将每个分区的多个增量文件合并为一个文件
+
+        Args:
+            ftp: 只合并该站点，默认为全部站点
+            data_type: 只合并该数据类型，默认为全部类型
+
+        Returns:
+            合并的分区数
+        """
+        with self._index_lock():
+            index = self._load_index()
+            groups = {}
+            for part in index["parts"]:
+                if ftp is not None and part["ftp"] != ftp:
+                    continue
+                if data_type is not None and part["data_type"] != data_type:
+                    continue
+                key = (part["ftp"], part["data_type"], part["month"])
+                groups.setdefault(key, []).append(part)
+
+            compacted = 0
+            for (part_ftp, part_type, month), parts in groups.items():
+                if len(parts) < 2:
+                    continue
+                parts = sorted(parts, key=lambda part: part["seq"])
+                data = self._read_parts(parts)
+                # 合并后的文件沿用最新的序号，保证之后的写入仍然覆盖它
+                merged = self._write_part(data, part_ftp, part_type, month, parts[-1]["seq"])
+                old_paths = {part["path"] for part in parts}
+                index["parts"] = [p for p in index["parts"] if p["path"] not in old_paths]
+                index["parts"].append(merged)
+                self._save_index(index)
+                for path in old_paths:
+                    os.remove(os.path.join(self.store_dir, path))
+                compacted += 1
+        if compacted:
+            self.log(f"结果库合并了{compacted}个分区")
+        return compacted
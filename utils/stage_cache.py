@@ -0,0 +1,169 @@
+"""
+阶段结果缓存模块
+
+按输入列内容和参数的哈希值缓存R插补/分区阶段的输出结果（Parquet格式），
+缓存总大小超过上限时按最近最少使用（LRU）原则淘汰
+"""
+import os
+import json
+import hashlib
+import pandas as pd
+from utils.logging import get_task_logger
+
+
+def content_key(stage, data, columns, params):
+    """
+    根据指定列的内容和参数计算内容哈希键
+
+    Args:
+        stage: 阶段名称
+        data: 输入数据DataFrame
+        columns: 参与计算的输入列名列表
+        params: 参数字典
+
+    Returns:
+        形如 "{stage}-{hash}" 的键字符串
+    """
+    digest = hashlib.sha256()
+    digest.update(stage.encode("utf-8"))
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode("utf-8"))
+    for col in columns:
+        digest.update(col.encode("utf-8"))
+        if col in data.columns:
+            hashed = pd.util.hash_pandas_object(data[col], index=False)
+            digest.update(hashed.values.tobytes())
+        else:
+            digest.update(b"<missing>")
+    return f"{stage}-{digest.hexdigest()[:32]}"
+
+
+class StageCache:
+    """
+    阶段结果缓存
+
+    每个缓存条目对应一个Parquet文件，文件名即缓存键。
+    命中时刷新文件的修改时间，淘汰时优先删除修改时间最早的文件。
+    """
+
+    def __init__(self, cache_dir, max_bytes=2 * 1024 * 1024 * 1024, logger=None):
+        """
+        初始化阶段结果缓存
+
+        Args:
+            cache_dir: 缓存目录
+            max_bytes: 缓存总大小上限（字节），默认为2GB
+            logger: 日志记录器，可选
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.logger = logger
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def make_key(self, stage, data, columns, params):
+        """
+        根据输入列内容和参数计算缓存键
+
+        Args:
+            stage: 阶段名称
+            data: 输入数据DataFrame
+            columns: 参与计算的输入列名列表
+            params: 参数字典（经纬度、时区、插补指标等）
+
+        Returns:
+            缓存键字符串
+        """
+        return content_key(stage, data, columns, params)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.parquet")
+
+    def get(self, key):
+        """
+        读取缓存条目
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            缓存的DataFrame，未命中时返回None
+        """
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            data = pd.read_parquet(path)
+        except Exception as e:
+            self.log(f"缓存文件损坏，已删除: {path} ({e})")
+            os.remove(path)
+            return None
+        # 刷新修改时间，作为LRU淘汰依据
+        os.utime(path, None)
+        return data
+
+    def put(self, key, data):
+        """
+        写入缓存条目并按容量上限淘汰旧条目
+
+        Args:
+            key: 缓存键
+            data: 需要缓存的DataFrame
+        """
+        path = self._path(key)
+        tmp_path = path + ".tmp"
+        data.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        """按最近最少使用原则淘汰缓存，直到总大小不超过上限"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".parquet"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            self.log(f"缓存超出上限，淘汰: {os.path.basename(path)}")
+
+    def log(self, message):
+        """输出缓存相关日志"""
+        (self.logger or get_task_logger()).info(message)
+
+
+def cached_exports(stage_cache, stage, data, columns, params, compute):
+    """
+    获取R阶段新增的输出列，优先从缓存读取
+
+    Args:
+        stage_cache: StageCache实例，为None时不使用缓存
+        stage: 阶段名称
+        data: 传入R的DataFrame
+        columns: 决定输出结果的输入列名列表
+        params: 决定输出结果的参数字典
+        compute: 无参函数，调用R并返回结果DataFrame
+
+    Returns:
+        R新增的输出列组成的DataFrame（索引已重置）
+    """
+    key = None
+    if stage_cache is not None:
+        key = stage_cache.make_key(stage, data, columns, params)
+        exports = stage_cache.get(key)
+        if exports is not None:
+            stage_cache.log(f"{stage} 命中缓存: {key}")
+            return exports
+
+    result_data = compute()
+    new_columns = [col for col in result_data.columns if col not in data.columns]
+    exports = result_data[new_columns].reset_index(drop=True)
+
+    if stage_cache is not None:
+        stage_cache.put(key, exports)
+    return exports
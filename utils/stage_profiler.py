@@ -0,0 +1,193 @@
+"""
+处理阶段性能分析模块
+
+--profile 时对DataQc的每个处理阶段分别执行cProfile和tracemalloc，记录阶段内耗时最多的
+函数（热点）、内存峰值以及新增内存最多的代码位置，报告写入日志目录（与运行日志同名，
+后缀为 _profile.txt 和 _memory.txt）。未开启时流水线不创建分析器，没有额外开销
+"""
+import io
+import os
+import time
+import pstats
+import cProfile
+import tracemalloc
+from contextlib import contextmanager
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_IGNORED_TRACES = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+def _format_frame(frame):
+    return f"{frame.filename}:{frame.lineno}"
+
+
+def _project_frame(traceback):
+    """调用栈中最内层的项目代码位置，没有时返回None"""
+    for frame in reversed(traceback):
+        if frame.filename.startswith(PROJECT_DIR) and "site-packages" not in frame.filename:
+            return frame
+    return None
+
+
+class StageProfiler:
+    """各处理阶段的cProfile热点和tracemalloc内存统计"""
+
+    def __init__(self, top_n=20, trace_frames=1):
+        """
+        初始化
+
+        Args:
+            top_n: 报告中每个阶段列出的热点函数和内存分配位置数
+            trace_frames: tracemalloc记录的调用栈深度，默认只记录分配位置本身；
+                加深后可以定位到调用pandas/numpy的项目代码，但开销成倍增加
+        """
+        self.top_n = top_n
+        self.trace_frames = trace_frames
+        self.stages = {}
+        self._own_tracing = False
+
+    @contextmanager
+    def profile(self, stage):
+        """
+        分析一个阶段的执行，同一阶段多次执行（分块）时合并统计
+
+        Args:
+            stage: 阶段名称
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.trace_frames)
+            self._own_tracing = True
+        tracemalloc.reset_peak()
+        traced_before = tracemalloc.get_traced_memory()[0]
+        snapshot_before = tracemalloc.take_snapshot().filter_traces(_IGNORED_TRACES)
+
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            seconds = time.perf_counter() - start
+            traced_after, traced_peak = tracemalloc.get_traced_memory()
+            snapshot_after = tracemalloc.take_snapshot().filter_traces(_IGNORED_TRACES)
+            self._add(stage, profile, seconds, traced_before, traced_after, traced_peak,
+                      snapshot_after.compare_to(snapshot_before, "traceback"))
+
+    def _add(self, stage, profile, seconds, traced_before, traced_after, traced_peak, diffs):
+        peak_mb = (traced_peak - traced_before) / 1024 / 1024
+        item = self.stages.get(stage)
+        if item is None:
+            item = self.stages[stage] = {
+                "runs": 0,
+                "seconds": 0.0,
+                "stats": pstats.Stats(profile),
+                "delta_mb": 0.0,
+                "peak_mb": peak_mb,
+                "allocations": [],
+            }
+        else:
+            item["stats"].add(profile)
+        item["runs"] += 1
+        item["seconds"] += seconds
+        item["delta_mb"] += (traced_after - traced_before) / 1024 / 1024
+        # 分配位置取内存峰值最高的一次执行
+        if peak_mb >= item["peak_mb"] or not item["allocations"]:
+            item["peak_mb"] = peak_mb
+            item["allocations"] = [
+                diff for diff in sorted(diffs, key=lambda d: d.size_diff, reverse=True)
+                if diff.size_diff > 0
+            ][:self.top_n]
+
+    def close(self):
+        """停止由本分析器启动的tracemalloc"""
+        if self._own_tracing and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._own_tracing = False
+
+    def hotspot_report(self):
+        """各阶段按累计耗时和自身耗时排序的热点函数报告"""
+        out = io.StringIO()
+        for stage, item in self.stages.items():
+            out.write("=" * 100 + "\n")
+            out.write(f"阶段: {stage}  执行次数: {item['runs']}  耗时: {item['seconds']:.3f} s\n")
+            out.write("=" * 100 + "\n")
+            stats = item["stats"]
+            stats.stream = out
+            out.write(f"\n按累计耗时排序（前{self.top_n}个）:\n")
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top_n)
+            out.write(f"\n按自身耗时排序（前{self.top_n}个）:\n")
+            stats.sort_stats(pstats.SortKey.TIME).print_stats(self.top_n)
+        return out.getvalue()
+
+    def memory_report(self):
+        """各阶段内存峰值和新增内存最多的分配位置报告"""
+        lines = [f"{'阶段':<28}{'次数':>6}{'耗时(s)':>12}{'峰值增量(MB)':>16}{'保留增量(MB)':>16}"]
+        for stage, item in self.stages.items():
+            lines.append(
+                f"{stage:<28}{item['runs']:>6}{item['seconds']:>12.3f}"
+                f"{item['peak_mb']:>16.1f}{item['delta_mb']:>+16.1f}"
+            )
+        lines.append("")
+        lines.append("峰值增量为阶段内Python分配内存的最高值减去阶段开始时的值，"
+                     "保留增量为阶段结束后仍未释放的内存（不包含R等非Python分配）")
+
+        for stage, item in self.stages.items():
+            lines.append("")
+            lines.append("=" * 100)
+            lines.append(f"阶段: {stage}  新增内存最多的分配位置（前{self.top_n}个，峰值最高的一次执行）")
+            lines.append("=" * 100)
+            for diff in item["allocations"]:
+                innermost = diff.traceback[-1] if len(diff.traceback) else None
+                project = _project_frame(diff.traceback)
+                lines.append(
+                    f"{diff.size_diff / 1024 / 1024:>10.2f} MB {diff.count_diff:>+9} 块  "
+                    f"{_format_frame(innermost) if innermost else '-'}"
+                )
+                if project is not None and project != innermost:
+                    lines.append(f"{'':>26}项目代码: {_format_frame(project)}")
+        return "\n".join(lines) + "\n"
+
+    def log_summary(self, logger):
+        """
+        将各阶段的热点函数和内存峰值输出到日志
+
+        Args:
+            logger: 日志记录器
+        """
+        if not self.stages:
+            return
+        logger.info("各阶段性能分析:")
+        for stage, item in self.stages.items():
+            stats = item["stats"].sort_stats(pstats.SortKey.TIME)
+            top = stats.fcn_list[0] if stats.fcn_list else None
+            hotspot = f"{top[0]}:{top[1]}({top[2]})" if top else "-"
+            logger.info(
+                f"  {stage:<28}{item['seconds']:>10.3f} s  峰值增量 {item['peak_mb']:>9.1f} MB"
+                f"  最耗时函数 {os.path.basename(hotspot)}"
+            )
+
+    def write_reports(self, base_path):
+        """
+        写入热点和内存报告
+
+        Args:
+            base_path: 报告路径前缀（一般为运行日志去掉扩展名）
+
+        Returns:
+            (热点报告路径, 内存报告路径)
+        """
+        profile_path = base_path + "_profile.txt"
+        memory_path = base_path + "_memory.txt"
+        with open(profile_path, "w", encoding="utf-8") as f:
+            f.write(self.hotspot_report())
+        with open(memory_path, "w", encoding="utf-8") as f:
+            f.write(self.memory_report())
+        return profile_path, memory_path
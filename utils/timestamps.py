@@ -0,0 +1,104 @@
+"""
+时间解析模块
+
+record_time 不指定格式调用 pd.to_datetime 时，遇到 2024/1/1 0:00 这类格式
+可能退化为逐个元素解析。这里先从样本中推断具体格式，再按该格式一次性解析为
+datetime64[ns]；已经是datetime64类型的列视为已解析，后续各处理环节直接复用
+"""
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+# README中列出的可接受格式，以及站点数据中常见的不补零写法
+CANDIDATE_FORMATS = [
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%Y/%m/%d %H:%M:%S",
+    "%Y/%m/%d %H:%M",
+    "%m-%d-%Y %H:%M:%S",
+    "%m-%d-%Y %H:%M",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%dT%H:%M",
+    "%Y-%m-%d",
+    "%Y/%m/%d",
+]
+
+
+def _sample(values, sample_size):
+    """取均匀分布的非空样本"""
+    step = max(len(values) // sample_size, 1)
+    sample = pd.concat([values.iloc[::step], values.iloc[-1:]]).dropna().astype(str)
+    return sample[sample.str.strip() != ""]
+
+
+def infer_timestamp_format(values, sample_size=500):
+    """
+    从样本推断时间格式
+
+    Args:
+        values: 时间字符串序列
+        sample_size: 样本数量
+
+    Returns:
+        strftime格式字符串，无法推断时返回None
+    """
+    sample = _sample(values, sample_size)
+    if sample.empty:
+        return None
+
+    candidates = []
+    guessed = guess_datetime_format(sample.iloc[0])
+    if guessed:
+        candidates.append(guessed)
+    candidates.extend(fmt for fmt in CANDIDATE_FORMATS if fmt not in candidates)
+
+    for fmt in candidates:
+        try:
+            pd.to_datetime(sample, format=fmt)
+        except (ValueError, TypeError):
+            continue
+        return fmt
+    return None
+
+
+def parse_timestamps(values, errors="raise"):
+    """
+    按推断出的格式解析时间
+
+    与推断格式不一致的个别值再逐个推断格式解析（format="mixed"）
+
+    Args:
+        values: 时间序列
+        errors: 无法解析时的处理方式，与 pd.to_datetime 相同
+
+    Returns:
+        datetime64[ns] 类型的Series
+    """
+    values = pd.Series(values)
+    fmt = infer_timestamp_format(values)
+    if fmt is None:
+        return pd.to_datetime(values, format="mixed", errors=errors)
+
+    parsed = pd.to_datetime(values, format=fmt, errors="coerce")
+    leftover = parsed.isna() & values.notna()
+    if leftover.any():
+        blank = values[leftover].astype(str).str.strip() == ""
+        leftover[blank[blank].index] = False
+    if leftover.any():
+        parsed[leftover] = pd.to_datetime(values[leftover], format="mixed", errors=errors)
+    return parsed
+
+
+def ensure_datetime(values, errors="raise"):
+    """
+    确保时间列为datetime64类型，已解析的列直接返回
+
+    Args:
+        values: 时间序列
+        errors: 无法解析时的处理方式，与 pd.to_datetime 相同
+
+    Returns:
+        datetime64 类型的Series
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    return parse_timestamps(values, errors=errors)
@@ -0,0 +1,50 @@
+"""
+启动耗时统计模块
+
+记录各模块导入和R环境初始化的耗时，供 --timings 参数输出
+"""
+import time
+from contextlib import contextmanager
+
+# 按记录顺序保存的 (名称, 耗时秒数)
+IMPORT_TIMINGS = []
+
+
+def record_timing(name, seconds):
+    """
+    记录一项耗时
+
+    Args:
+        name: 模块或步骤名称
+        seconds: 耗时（秒）
+    """
+    IMPORT_TIMINGS.append((name, seconds))
+
+
+@contextmanager
+def timed_import(name):
+    """
+    统计代码块（通常是import语句）的耗时
+
+    Args:
+        name: 模块名称
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(name, time.perf_counter() - start)
+
+
+def log_timings(logger):
+    """
+    将已记录的耗时输出到日志
+
+    Args:
+        logger: 日志记录器
+    """
+    logger.info("模块导入耗时:")
+    for name, seconds in IMPORT_TIMINGS:
+        logger.info(f"  {name:<32} {seconds * 1000:10.1f} ms")
+    total = sum(seconds for _, seconds in IMPORT_TIMINGS)
+    logger.info(f"  {'合计':<32} {total * 1000:10.1f} ms")
@@ -2,7 +2,8 @@
 参数验证模块
 """
 import os
-from config.constants import VALID_DATA_TYPES
+import glob
+from config.data_types import VALID_DATA_TYPES
 
 
 def validate_args(args):
@@ -19,8 +20,17 @@ def validate_args(args):
     valid = True
     error_msgs = []
     
-    # 检查文件路径
-    if not os.path.exists(args.file_path):
+    # 检查文件路径，指定数据目录时检查目录中是否有匹配的文件
+    input_dir = getattr(args, "input_dir", None)
+    if input_dir:
+        pattern = getattr(args, "input_pattern", "*.csv")
+        if not os.path.isdir(input_dir):
+            valid = False
+            error_msgs.append(f"错误：目录 {input_dir} 不存在")
+        elif not glob.glob(os.path.join(input_dir, pattern)):
+            valid = False
+            error_msgs.append(f"错误：目录 {input_dir} 中没有匹配 {pattern} 的文件")
+    elif args.file_path is not None and not os.path.exists(args.file_path):
         valid = False
         error_msgs.append(f"错误：文件 {args.file_path} 不存在")
     
@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+"""
+监视目录自动处理程序
+
+数据采集器将文件上传到FTP接收目录，每个站点一个子目录（子目录名即--ftp站点名）。
+本程序定期扫描接收目录，发现新增或修改的文件后等待文件大小和修改时间稳定（避免处理
+尚未上传完成的文件），按站点合并同一批新文件，在进程池中执行质量控制并将结果写入结果库。
+已处理文件的sha256记录在状态文件中，内容未变化的文件不会重复处理
+"""
+import os
+import sys
+import json
+import time
+import glob
+import argparse
+import concurrent.futures
+import pandas as pd
+from core.jobs import JOB_DEFAULTS, load_qc_indicators, run_qc_job, init_worker
+from utils.checkpoints import file_sha256
+from utils.result_store import ResultStore
+from utils.logging import setup_logger, close_logger
+from config.constants import OUTPUT_PROFILES
+
+STATE_FILE = ".qc_watch_state.json"
+
+
+def load_site_config(path, default_data_type):
+    """
+    读取站点配置（site, data_type, longitude, latitude, is_strg, despiking_z）
+
+    Args:
+        path: 配置文件路径（csv），为None时所有站点使用默认参数
+        default_data_type: 未配置站点的数据类型
+
+    Returns:
+        函数，输入站点名返回该站点的任务参数
+    """
+    config = {}
+    if path:
+        for row in pd.read_csv(path, dtype={"site": str, "data_type": str}).to_dict("records"):
+            config[row["site"]] = {k: v for k, v in row.items() if not pd.isna(v)}
+
+    def site_params(site):
+        params = dict(JOB_DEFAULTS)
+        params["data_type"] = default_data_type
+        params.update(config.get(site, {}))
+        params["site"] = site
+        params["longitude"] = float(params["longitude"])
+        params["latitude"] = float(params["latitude"])
+        params["is_strg"] = int(params["is_strg"])
+        params["despiking_z"] = float(params["despiking_z"])
+        return params
+
+    return site_params
+
+
+class FolderWatcher:
+    """轮询接收目录，跟踪文件状态"""
+
+    def __init__(self, watch_dir, pattern="*.csv", settle_seconds=30, state_path=None):
+        """
+        初始化
+
+        Args:
+            watch_dir: 接收目录，每个站点一个子目录
+            pattern: 文件名匹配模式
+            settle_seconds: 文件大小和修改时间保持不变多少秒后才处理
+            state_path: 状态文件路径，默认为接收目录下的 .qc_watch_state.json
+        """
+        self.watch_dir = watch_dir
+        self.pattern = pattern
+        self.settle_seconds = settle_seconds
+        self.state_path = state_path or os.path.join(watch_dir, STATE_FILE)
+        # 正在等待稳定的文件: path -> (size, mtime, 首次观察到该状态的时间)
+        self.pending = {}
+        self.state = self._load_state()
+
+    def _load_state(self):
+        if not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save_state(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.state_path)
+
+    def _site_files(self):
+        for site_dir in sorted(glob.glob(os.path.join(self.watch_dir, "*"))):
+            if not os.path.isdir(site_dir):
+                continue
+            site = os.path.basename(site_dir)
+            for path in sorted(glob.glob(os.path.join(site_dir, self.pattern))):
+                if os.path.isfile(path):
+                    yield site, path
+
+    def scan(self, now=None):
+        """
+        扫描一次接收目录
+
+        Args:
+            now: 当前时间（秒），默认为time.time()
+
+        Returns:
+            {站点: [(路径, sha256, size, mtime), ...]}，内容有变化且已稳定的文件
+        """
+        now = time.time() if now is None else now
+        ready = {}
+        touched = False
+        for site, path in self._site_files():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            key = os.path.relpath(path, self.watch_dir)
+            known = self.state.get(key)
+            if known and known["size"] == stat.st_size and known["mtime"] == stat.st_mtime:
+                self.pending.pop(path, None)
+                continue
+
+            # 大小或修改时间变化时重新计时，保持不变超过settle_seconds才认为写入完成
+            pending = self.pending.get(path)
+            if pending is None or pending[:2] != (stat.st_size, stat.st_mtime):
+                self.pending[path] = (stat.st_size, stat.st_mtime, now)
+                continue
+            if now - pending[2] < self.settle_seconds:
+                continue
+
+            digest = file_sha256([path])
+            if known and known["sha256"] == digest:
+                # 只是修改时间变化，内容相同
+                known.update(size=stat.st_size, mtime=stat.st_mtime)
+                self.pending.pop(path, None)
+                touched = True
+                continue
+            ready.setdefault(site, []).append((path, digest, stat.st_size, stat.st_mtime))
+        if touched:
+            self.save_state()
+        return ready
+
+    def mark(self, files, status):
+        """记录文件的处理结果，内容不变时不再处理（失败的文件在内容变化后重试）"""
+        for path, digest, size, mtime in files:
+            self.state[os.path.relpath(path, self.watch_dir)] = {
+                "sha256": digest,
+                "size": size,
+                "mtime": mtime,
+                "status": status,
+                "processed_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            self.pending.pop(path, None)
+        self.save_state()
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="监视接收目录，自动处理新上传的数据文件")
+    parser.add_argument("--watch-dir", type=str, required=True, help="接收目录，每个站点一个子目录")
+    parser.add_argument("--store-dir", type=str, required=True, help="结果库目录")
+    parser.add_argument("--pattern", type=str, default="*.csv", help="文件名匹配模式")
+    parser.add_argument("--sites", type=str, default=None,
+                        help="站点配置（csv: site, data_type, longitude, latitude, is_strg, despiking_z）")
+    parser.add_argument("--data-type", "-t", type=str, default="flux", help="未配置站点的数据类型")
+    parser.add_argument("--interval", type=float, default=10, help="扫描间隔（秒）")
+    parser.add_argument("--settle", type=float, default=30,
+                        help="文件大小和修改时间保持不变多少秒后才处理")
+    parser.add_argument("--workers", "-w", type=int, default=0, help="进程数，0表示CPU核数")
+    parser.add_argument(
+        "--output-profile", type=str, default="full", choices=OUTPUT_PROFILES,
+        help="输出方案：final只输出最终结果，audit额外输出中间列，full输出全部列",
+    )
+    parser.add_argument(
+        "--backend", type=str, default="r", choices=["r", "replay"],
+        help="flux插补后端：r调用REddyProc，replay读取录制的输出",
+    )
+    parser.add_argument("--fixture-dir", type=str, default=None, help="replay后端读取录制输出的目录")
+    parser.add_argument("--compact-interval", type=float, default=3600,
+                        help="合并结果库增量文件的间隔（秒），0表示不合并")
+    parser.add_argument("--once", action="store_true", help="只扫描一次，处理完当前文件后退出")
+    parser.add_argument("--log-dir", type=str, default="../logs", help="日志目录")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.watch_dir):
+        print(f"错误：目录 {args.watch_dir} 不存在")
+        sys.exit(1)
+
+    logger = setup_logger(ftp="watch", log_dir=args.log_dir)
+    success = False
+    try:
+        qc_indicators = load_qc_indicators()
+        site_params = load_site_config(args.sites, args.data_type)
+        # --once时不等待文件稳定
+        watcher = FolderWatcher(
+            args.watch_dir, args.pattern, 0 if args.once else args.settle
+        )
+        store = ResultStore(args.store_dir, logger=logger)
+        workers = args.workers or os.cpu_count() or 1
+        logger.info(f"开始监视 {args.watch_dir}（{args.pattern}），使用{workers}个进程")
+
+        running = {}  # 站点 -> (future, 文件列表)
+        last_compact = time.time()
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, initializer=init_worker, initargs=(args.backend == "r",)
+        ) as executor:
+            while True:
+                # 收集已完成的任务
+                for site, (future, files) in list(running.items()):
+                    if not future.done():
+                        continue
+                    del running[site]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {"status": "failed", "error": str(e)}
+                    if result["status"] == "ok":
+                        store.upsert(result.pop("data"), site, result["data_type"])
+                    watcher.mark(files, result["status"])
+                    if result["status"] == "ok":
+                        logger.info(f"[{site}] 处理完成: {len(files)}个文件, {result['rows']}行, "
+                                    f"{result['seconds']:.1f}s")
+                    else:
+                        logger.error(f"[{site}] 处理失败: {result['error']}")
+
+                # 同一站点上一批文件处理完之前，新文件留到之后的扫描中处理
+                for site, files in watcher.scan().items():
+                    if site in running:
+                        continue
+                    job = site_params(site)
+                    job["files"] = [path for path, _, _, _ in files]
+                    logger.info(f"[{site}] 发现{len(files)}个新文件: "
+                                f"{', '.join(os.path.basename(p) for p in job['files'])}")
+                    future = executor.submit(
+                        run_qc_job,
+                        job,
+                        qc_indicators,
+                        output_dir=None,
+                        output_profile=args.output_profile,
+                        backend_name=args.backend,
+                        fixture_dir=args.fixture_dir,
+                        log_dir=args.log_dir,
+                        # 结果库只由主进程写入，避免多个进程同时修改索引
+                        keep_data=True,
+                    )
+                    running[site] = (future, files)
+
+                if args.compact_interval and time.time() - last_compact >= args.compact_interval:
+                    store.compact()
+                    last_compact = time.time()
+
+                if args.once and not running and not watcher.pending:
+                    break
+                time.sleep(args.interval if not args.once else 0.5)
+
+        success = True
+    except KeyboardInterrupt:
+        logger.info("收到中断信号，停止监视")
+        success = True
+    except Exception as e:
+        logger.error(f"监视程序出错: {str(e)}")
+    finally:
+        close_logger(logger, success=success)
+    if not success:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()